@@ -0,0 +1,248 @@
+import asyncio
+import json
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from data_validator import DataValidator
+from metrics import bucket_index, histogram_percentile
+from redundancy_detector import RedundancyDetector
+
+FAILED = {'status': 'failed', 'message': "Record could not be stored"}
+
+class AsyncIngestService:
+    """asyncio front end that micro-batches records from concurrent producers
+    
+    Validation and hashing run inline on the event loop. Accepted records
+    wait in a bounded queue; when it is full, submit() blocks, so a slow
+    disk slows producers down instead of growing memory. One batcher task
+    drains the queue into process_batch calls of up to BATCH_SIZE records,
+    waiting at most SERVICE_BATCH_DELAY_MS to fill a batch. The detector is
+    stateful and not thread-safe, so batches run one at a time on a single
+    worker thread, keeping the event loop free for producers.
+    """
+    
+    def __init__(self, redundancy_detector=None, data_validator=None, queue_size=None, batch_size=None, batch_delay_ms=None):
+        self.redundancy_detector = redundancy_detector or RedundancyDetector()
+        self.data_validator = data_validator or DataValidator()
+        self.queue_size = queue_size or Config.SERVICE_QUEUE_SIZE
+        self.batch_size = batch_size or Config.BATCH_SIZE
+        self.batch_delay = (Config.SERVICE_BATCH_DELAY_MS if batch_delay_ms is None else batch_delay_ms) / 1000
+        self.queue = None
+        self._in_flight = {}  # content hash -> future of the queued record with that content
+        self._executor = None
+        self._batcher = None
+        self.counts = defaultdict(int)
+        self.latency_buckets = defaultdict(int)  # End-to-end submit latency histogram
+        self.enqueue_wait_buckets = defaultdict(int)  # Time spent blocked on a full queue
+        self.max_queue_depth = 0
+        self.batches = 0
+        self.batched_records = 0
+    
+    async def start(self):
+        """Create the queue and start the batcher"""
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dedup-batch')
+        self._batcher = asyncio.create_task(self._run_batches())
+    
+    async def stop(self):
+        """Finish every queued record, then stop the batcher and flush metrics"""
+        if self._batcher is None:
+            return
+        await self.queue.join()
+        self._batcher.cancel()
+        try:
+            await self._batcher
+        except asyncio.CancelledError:
+            pass
+        self._batcher = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.redundancy_detector.flush_metrics)
+        self._executor.shutdown()
+    
+    async def submit(self, data_content, data_type):
+        """Validate, hash and queue one record, returning its outcome once its batch is stored"""
+        start = time.perf_counter()
+        is_valid, message = self.data_validator.validate_data(data_content, data_type)
+        if not is_valid:
+            return self._finish(start, {'status': 'rejected', 'message': message})
+        content_hash = self.redundancy_detector.hash_data(data_content)
+        
+        # An identical record already waiting shares its outcome without another trip to the database
+        leader = self._in_flight.get(content_hash)
+        if leader is not None:
+            result = await asyncio.shield(leader)
+            if result['status'] in ('inserted', 'redundant'):
+                result = {'status': 'redundant', 'entry_id': result['entry_id']}
+            return self._finish(start, result)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[content_hash] = future
+        wait_start = time.perf_counter()
+        try:
+            await self.queue.put((data_content, data_type, content_hash, future))
+        except BaseException:
+            del self._in_flight[content_hash]
+            future.set_result(FAILED)  # Followers already waiting on it must not hang
+            raise
+        self.enqueue_wait_buckets[bucket_index((time.perf_counter() - wait_start) * 1000)] += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        # Shielded like the followers' waits: cancelling this submit must not cancel their shared outcome
+        return self._finish(start, await asyncio.shield(future))
+    
+    def _finish(self, start, result):
+        self.counts[result['status']] += 1
+        self.latency_buckets[bucket_index((time.perf_counter() - start) * 1000)] += 1
+        return result
+    
+    async def _next_batch(self):
+        """Wait for one record, then take more until the batch is full or the delay passes"""
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.batch_delay
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+    
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            records = [(data_content, data_type) for data_content, data_type, _, _ in batch]
+            content_hashes = [content_hash for _, _, content_hash, _ in batch]  # Hashed once, in submit()
+            # Any error fails this batch only; the batcher must keep running or every submit waits forever
+            try:
+                outcomes = await loop.run_in_executor(self._executor, self.redundancy_detector.process_batch,
+                                                      records, content_hashes)
+                results = [FAILED if entry is None else {'status': 'redundant' if is_redundant else 'inserted', 'entry_id': entry.id}
+                           for is_redundant, entry in outcomes]
+            except Exception as e:
+                print(f"Error processing batch: {e}")
+                results = [FAILED] * len(batch)
+            self.batches += 1
+            self.batched_records += len(batch)
+            for (_, _, content_hash, future), result in zip(batch, results):
+                self._in_flight.pop(content_hash, None)
+                if not future.done():
+                    future.set_result(result)
+                self.queue.task_done()
+    
+    def stats(self):
+        """Queue depth, batching and latency metrics for monitoring"""
+        return {
+            'queue_depth': self.queue.qsize() if self.queue is not None else 0,
+            'queue_capacity': self.queue_size,
+            'max_queue_depth': self.max_queue_depth,
+            'batches': self.batches,
+            'mean_batch_size': self.batched_records / self.batches if self.batches else 0.0,
+            'counts': dict(self.counts),
+            'latency_ms': {name: histogram_percentile(self.latency_buckets, fraction)
+                           for name, fraction in (('p50', 0.50), ('p95', 0.95), ('p99', 0.99))},
+            'enqueue_wait_ms': {name: histogram_percentile(self.enqueue_wait_buckets, fraction)
+                                for name, fraction in (('p50', 0.50), ('p99', 0.99))},
+        }
+    
+    async def handle_connection(self, reader, writer):
+        """Serve one JSON-lines client
+        
+        Each request line is {"data_content": ..., "data_type": ...} or
+        {"op": "stats"}; responses are written in request order. Up to
+        SERVICE_MAX_IN_FLIGHT requests per connection are processed at once,
+        after which the connection stops being read (TCP backpressure). If
+        the client disconnects, its unanswered requests are cancelled.
+        """
+        pending = asyncio.Queue(maxsize=Config.SERVICE_MAX_IN_FLIGHT)
+        
+        async def respond():
+            connected = True
+            while True:
+                task = await pending.get()
+                if task is None:
+                    break
+                if not connected:
+                    task.cancel()
+                    continue
+                await asyncio.wait([task])
+                if task.cancelled() or task.exception() is not None:
+                    response = {'status': 'failed', 'message': "Request could not be processed"}
+                else:
+                    response = task.result()
+                try:
+                    writer.write(json.dumps(response).encode('utf-8') + b"\n")
+                    await writer.drain()
+                except ConnectionError:
+                    # Keep taking requests so the reader never blocks on a full queue
+                    connected = False
+                    writer.close()
+        
+        responder = asyncio.create_task(respond())
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ConnectionError:
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                await pending.put(asyncio.create_task(self._handle_request(line)))
+        finally:
+            await pending.put(None)
+            await responder
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass  # Reset by the client
+    
+    async def _handle_request(self, line):
+        try:
+            request = json.loads(line)
+        except json.JSONDecodeError:
+            return {'status': 'error', 'message': "Invalid JSON"}
+        if not isinstance(request, dict):
+            return {'status': 'error', 'message': "Request must be a JSON object"}
+        if request.get('op') == 'stats':
+            return {'status': 'ok', 'stats': self.stats()}
+        return await self.submit(request.get('data_content'), request.get('data_type'))
+    
+    async def serve(self, host=None, port=None):
+        """Start listening on host:port and return the asyncio server"""
+        if self._batcher is None:
+            await self.start()
+        return await asyncio.start_server(self.handle_connection, host or Config.SERVICE_HOST,
+                                          Config.SERVICE_PORT if port is None else port)
+
+async def send_records(host, port, requests):
+    """Send requests (dicts) over one connection and return the responses in order"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for request in requests:
+            writer.write(json.dumps(request).encode('utf-8') + b"\n")
+        await writer.drain()
+        return [json.loads(await reader.readline()) for _ in requests]
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+async def run_service(host=None, port=None):
+    """Run the service until cancelled (Ctrl+C)"""
+    service = AsyncIngestService()
+    server = await service.serve(host, port)
+    print(f"Listening on {', '.join(str(sock.getsockname()) for sock in server.sockets)}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
@@ -0,0 +1,575 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import string
+import sys
+import tempfile
+import threading
+import time
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    RESOURCE_AVAILABLE = False  # Peak RSS is reported as null on Windows
+import sqlalchemy
+from sqlalchemy import event
+from config import Config
+
+MODES = ('sequential', 'batch', 'parallel')
+# SQLite settings compared by the commit benchmark; 'rollback-journal' is SQLite's default behaviour
+COMMIT_PROFILES = {
+    'rollback-journal': {'SQLITE_JOURNAL_MODE': 'delete', 'SQLITE_SYNCHRONOUS': 'full', 'SQLITE_WRITER_THREAD': False},
+    'wal-full': {'SQLITE_JOURNAL_MODE': 'wal', 'SQLITE_SYNCHRONOUS': 'full', 'SQLITE_WRITER_THREAD': False},
+    'wal': {'SQLITE_JOURNAL_MODE': 'wal', 'SQLITE_SYNCHRONOUS': 'normal', 'SQLITE_WRITER_THREAD': False},
+    'wal-writer': {'SQLITE_JOURNAL_MODE': 'wal', 'SQLITE_SYNCHRONOUS': 'normal', 'SQLITE_WRITER_THREAD': True},
+}
+# Payload storage compared by the blob benchmark, with every processed record logged
+BLOB_PROFILES = {
+    'inline': {'BLOB_STORE': False, 'PROCESSING_LOG_SAMPLE_RATE': 1.0},
+    'blob': {'BLOB_STORE': True, 'PROCESSING_LOG_SAMPLE_RATE': 1.0},
+}
+DEFAULT_TYPE_MIX = {'text': 0.6, 'mixed': 0.2, 'number': 0.1, 'date': 0.05, 'boolean': 0.05}
+TEXT_ALPHABET = string.ascii_lowercase + ' '
+MIXED_ALPHABET = string.ascii_letters + string.digits + ' -_.,:'
+
+class WorkloadGenerator:
+    """Reproducible synthetic records with controlled exact and near-duplicate rates
+    
+    Each record is an exact copy of an earlier record with probability
+    duplicate_ratio, an edited copy (1..max_edits character edits) of an
+    earlier text/mixed record with probability near_duplicate_ratio, and a
+    fresh value of a type drawn from type_mix otherwise. Earlier records
+    include the preloaded entries, so duplicates hit the database as well
+    as the current batch.
+    """
+    
+    def __init__(self, seed=0, duplicate_ratio=0.2, near_duplicate_ratio=0.1, type_mix=None,
+                 min_length=10, max_length=200, length_distribution='lognormal', max_edits=2):
+        self.rng = random.Random(seed)
+        self.duplicate_ratio = duplicate_ratio
+        self.near_duplicate_ratio = near_duplicate_ratio
+        self.type_mix = type_mix or DEFAULT_TYPE_MIX
+        self.min_length = min_length
+        self.max_length = min(max_length, Config.MAX_STRING_LENGTH)
+        self.length_distribution = length_distribution
+        self.max_edits = max_edits
+        self.history = []  # Every record generated so far
+        self.free_text = []  # Positions in history of text/mixed records
+    
+    def _length(self):
+        if self.length_distribution == 'uniform':
+            return self.rng.randint(self.min_length, self.max_length)
+        # Mostly short values with a long tail, as in typical free-text columns
+        median = (self.min_length * self.max_length) ** 0.5
+        return max(self.min_length, min(self.max_length, int(self.rng.lognormvariate(0, 0.75) * median)))
+    
+    def _fresh(self):
+        data_type = self.rng.choices(list(self.type_mix), weights=list(self.type_mix.values()))[0]
+        if data_type == 'text':
+            content = ''.join(self.rng.choices(TEXT_ALPHABET, k=self._length())).strip() or 'x'
+        elif data_type == 'mixed':
+            content = ''.join(self.rng.choices(MIXED_ALPHABET, k=self._length())).strip() or 'x'
+        elif data_type == 'number':
+            content = str(round(self.rng.uniform(-1e6, 1e6), self.rng.randint(0, 4)))
+        elif data_type == 'date':
+            content = f"{self.rng.randint(1970, 2030):04d}-{self.rng.randint(1, 12):02d}-{self.rng.randint(1, 28):02d}"
+        else:
+            content = self.rng.choice(['true', 'false', 'yes', 'no', '1', '0'])
+        return content, data_type
+    
+    def _edit(self, content):
+        """Apply 1..max_edits random substitutions, insertions or deletions"""
+        chars = list(content)
+        for _ in range(self.rng.randint(1, self.max_edits)):
+            operation = self.rng.choice(('substitute', 'insert', 'delete') if len(chars) > 1 else ('substitute', 'insert'))
+            position = self.rng.randrange(len(chars))
+            if operation == 'substitute':
+                chars[position] = self.rng.choice(TEXT_ALPHABET.strip())
+            elif operation == 'insert':
+                chars.insert(position, self.rng.choice(TEXT_ALPHABET.strip()))
+            else:
+                del chars[position]
+        return ''.join(chars)
+    
+    def next_record(self):
+        roll = self.rng.random()
+        if self.history and roll < self.duplicate_ratio:
+            record = self.rng.choice(self.history)
+        elif self.free_text and roll < self.duplicate_ratio + self.near_duplicate_ratio:
+            content, data_type = self.history[self.rng.choice(self.free_text)]
+            record = (self._edit(content), data_type)
+        else:
+            record = self._fresh()
+        if record[1] in ('text', 'mixed'):
+            self.free_text.append(len(self.history))
+        self.history.append(record)
+        return record
+    
+    def unique_records(self, count):
+        """Generate count records with distinct content, used to preload the database"""
+        seen = set()
+        records = []
+        while len(records) < count:
+            record = self._fresh()
+            if record[0] not in seen:
+                seen.add(record[0])
+                if record[1] in ('text', 'mixed'):
+                    self.free_text.append(len(self.history))
+                self.history.append(record)
+                records.append(record)
+        return records
+    
+    def records(self, count):
+        return [self.next_record() for _ in range(count)]
+
+def _percentiles(values):
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None, 'max': None}
+    values = sorted(values)
+    pick = lambda fraction: values[min(len(values) - 1, int(fraction * len(values)))]
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99), 'max': values[-1]}
+
+def _peak_rss_mb():
+    if not RESOURCE_AVAILABLE:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def prepare_database(path, existing, generator):
+    """Create a SQLite database file preloaded with existing unique entries"""
+    from database_manager import DatabaseManager
+    from fingerprint import Fingerprinter
+    db_manager = DatabaseManager(f'sqlite:///{path}')
+    fingerprinter = Fingerprinter()
+    records = generator.unique_records(existing)
+    for start in range(0, len(records), Config.BATCH_SIZE):
+        db_manager.add_data_entries([
+            {'data_content': content, 'data_type': data_type, 'content_hash': fingerprinter.hexdigest(content)}
+            for content, data_type in records[start:start + Config.BATCH_SIZE]
+        ])
+    db_manager.close()
+
+def _run_scenario(db_path, mode, records, workers):
+    """Time one detector mode against a copy of the preloaded database"""
+    from database_manager import DatabaseManager
+    from models import DataEntry
+    from parallel_detector import ParallelRedundancyDetector
+    from redundancy_detector import RedundancyDetector
+    
+    start = time.perf_counter()
+    db_manager = DatabaseManager(f'sqlite:///{db_path}')
+    round_trips = [0]
+    
+    @event.listens_for(db_manager.engine, 'before_cursor_execute')
+    def count_round_trip(*args):
+        round_trips[0] += 1
+    
+    if mode == 'parallel':
+        detector = ParallelRedundancyDetector(db_manager, num_workers=workers)
+    else:
+        detector = RedundancyDetector(db_manager)
+    detector.warm_fuzzy_indexes()  # Build the fuzzy indexes (or start the shards) before timing
+    startup_seconds = time.perf_counter() - start
+    startup_round_trips = round_trips[0]
+    
+    latencies = []
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if mode == 'sequential':
+            for content, data_type in records:
+                call_start = time.perf_counter()
+                detector.process_data(content, data_type)
+                latencies.append((time.perf_counter() - call_start) * 1000)
+        else:
+            for chunk_start in range(0, len(records), Config.BATCH_SIZE):
+                chunk = records[chunk_start:chunk_start + Config.BATCH_SIZE]
+                call_start = time.perf_counter()
+                detector.process_batch(chunk)
+                latencies.append((time.perf_counter() - call_start) * 1000)
+        detector.flush_metrics()
+    elapsed = time.perf_counter() - start
+    if mode == 'parallel':
+        detector.close()
+    session = db_manager.get_session()
+    stored = session.query(DataEntry).count()
+    session.close()
+    db_manager.close()
+    return {
+        'mode': mode,
+        'records': len(records),
+        'seconds': elapsed,
+        'records_per_sec': len(records) / elapsed if elapsed else None,
+        'latency_unit': 'record' if mode == 'sequential' else 'batch',
+        'latency_ms': _percentiles(latencies),
+        'startup_seconds': startup_seconds,
+        'db_round_trips': round_trips[0] - startup_round_trips,
+        'db_round_trips_per_record': (round_trips[0] - startup_round_trips) / len(records) if records else None,
+        'stored_entries': stored,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+def _scenario_process(connection, db_path, mode, records, workers):
+    try:
+        connection.send(_run_scenario(db_path, mode, records, workers))
+    except Exception as e:
+        connection.send({'mode': mode, 'error': repr(e)})
+    finally:
+        connection.close()
+
+def run_benchmark(existing_sizes=(10000,), num_records=2000, modes=MODES, workers=2, seed=0,
+                  generator_options=None, work_dir=None):
+    """Run every mode at every preload size and return a JSON-serializable report
+    
+    Each scenario runs in a fresh process on its own copy of the preloaded
+    database, so peak RSS and caches are not shared between scenarios.
+    """
+    generator_options = generator_options or {}
+    owned_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix='dedup-bench-')
+    context = multiprocessing.get_context()
+    results = []
+    try:
+        for existing in existing_sizes:
+            generator = WorkloadGenerator(seed=seed, **generator_options)
+            base_path = os.path.join(work_dir, f'base-{existing}.db')
+            start = time.perf_counter()
+            prepare_database(base_path, existing, generator)
+            preload_seconds = time.perf_counter() - start
+            records = generator.records(num_records)
+            for mode in modes:
+                db_path = os.path.join(work_dir, f'{mode}-{existing}.db')
+                shutil.copyfile(base_path, db_path)
+                parent_connection, child_connection = context.Pipe(duplex=False)
+                process = context.Process(target=_scenario_process,
+                                          args=(child_connection, db_path, mode, records, workers))
+                process.start()
+                child_connection.close()
+                result = parent_connection.recv()
+                process.join()
+                os.remove(db_path)
+                result.update(existing_entries=existing, preload_seconds=preload_seconds)
+                results.append(result)
+            os.remove(base_path)
+    finally:
+        if owned_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'sqlalchemy': sqlalchemy.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'parameters': {
+            'existing_sizes': list(existing_sizes),
+            'records': num_records,
+            'modes': list(modes),
+            'workers': workers,
+            'seed': seed,
+            'batch_size': Config.BATCH_SIZE,
+            'hash_algorithm': Config.HASH_ALGORITHM,
+            'similarity_engine': Config.SIMILARITY_ENGINE,
+            'generator': generator_options,
+        },
+        'results': results,
+    }
+
+def benchmark_commits(num_inserts=2000, threads=4, profiles=None, work_dir=None):
+    """Measure single-record insert commits per second under each SQLite profile
+    
+    threads producers call add_data_entry concurrently, one record per call
+    as process_data does. Without the writer thread every insert is its own
+    commit; with it, inserts queued together share one.
+    """
+    from database_manager import DatabaseManager
+    profiles = profiles or list(COMMIT_PROFILES)
+    owned_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix='dedup-commits-')
+    results = []
+    try:
+        for profile in profiles:
+            saved = {name: getattr(Config, name) for name in COMMIT_PROFILES[profile]}
+            for name, value in COMMIT_PROFILES[profile].items():
+                setattr(Config, name, value)
+            db_path = os.path.join(work_dir, f'{profile}.db')
+            try:
+                db_manager = DatabaseManager(f'sqlite:///{db_path}')
+                per_thread = num_inserts // threads
+                
+                def produce(thread_number):
+                    for i in range(per_thread):
+                        content = f"commit benchmark {thread_number} {i}"
+                        db_manager.add_data_entry(content, 'text', f"{thread_number:08x}{i:024x}")
+                
+                producers = [threading.Thread(target=produce, args=(n,)) for n in range(threads)]
+                start = time.perf_counter()
+                for producer in producers:
+                    producer.start()
+                for producer in producers:
+                    producer.join()
+                elapsed = time.perf_counter() - start
+                inserts = per_thread * threads
+                commits = db_manager.writer.commits if db_manager.writer is not None else inserts
+                results.append({
+                    'profile': profile,
+                    'settings': COMMIT_PROFILES[profile],
+                    'threads': threads,
+                    'inserts': inserts,
+                    'commits': commits,
+                    'seconds': elapsed,
+                    'inserts_per_sec': inserts / elapsed,
+                    'commits_per_sec': commits / elapsed,
+                })
+                db_manager.close()
+            finally:
+                for name, value in saved.items():
+                    setattr(Config, name, value)
+    finally:
+        if owned_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    baseline = next((result['inserts_per_sec'] for result in results if result['profile'] == 'rollback-journal'), None)
+    for result in results:
+        result['speedup_vs_rollback_journal'] = result['inserts_per_sec'] / baseline if baseline else None
+    return results
+
+def benchmark_distance(num_entries=20000, num_queries=300, max_distance=None, seed=0, generator_options=None):
+    """Time the edit-distance verification loop against the bounded kernel on the same queries
+    
+    Each method returns, per query, the first stored entry within
+    max_distance, as the full-scan fuzzy mode does: 'full' computes every
+    complete Levenshtein distance (the original loop), 'bounded' skips by
+    length and stops early through BoundedDistance, and 'batched' compares
+    each query against all entries at once with lengths and signatures
+    computed ahead of time, as FuzzyIndex keeps them. All three must agree.
+    """
+    import numpy as np
+    from edit_distance import BoundedDistance, LEVENSHTEIN_AVAILABLE, banded_distance, char_signature
+    max_distance = Config.FUZZY_DISTANCE_THRESHOLD - 1 if max_distance is None else max_distance
+    if LEVENSHTEIN_AVAILABLE:
+        from Levenshtein import distance as full_distance
+    else:
+        full_distance = lambda content, other_content: banded_distance(content, other_content,
+                                                                       max(len(content), len(other_content)))
+    options = dict(generator_options or {})
+    options['type_mix'] = options.get('type_mix') or {'text': 0.7, 'mixed': 0.3}  # Free text is what gets edit-distance checks
+    generator = WorkloadGenerator(seed=seed, **options)
+    stored = [content for content, _ in generator.unique_records(num_entries)]
+    queries = [content for content, _ in generator.records(num_queries)]
+    matcher = BoundedDistance(max_distance)
+    lengths = np.fromiter(map(len, stored), dtype=np.int64, count=len(stored))
+    signatures = np.fromiter(map(char_signature, stored), dtype=np.uint64, count=len(stored))
+    methods = {
+        'full': lambda query: next((position for position, content in enumerate(stored)
+                                    if full_distance(query, content) <= max_distance), None),
+        'bounded': lambda query: next((position for position, content in enumerate(stored)
+                                       if matcher.within(query, content)), None),
+        'batched': lambda query: matcher.first_within(query, stored, lengths, signatures),
+    }
+    results, answers = [], {}
+    for name, method in methods.items():
+        start = time.perf_counter()
+        answers[name] = [method(query) for query in queries]
+        elapsed = time.perf_counter() - start
+        results.append({'method': name, 'seconds': elapsed, 'queries_per_sec': num_queries / elapsed})
+    for result in results:
+        result['identical'] = answers[result['method']] == answers['full']
+        result['speedup_vs_full'] = results[0]['seconds'] / result['seconds']
+    return {'entries': num_entries, 'queries': num_queries, 'max_distance': max_distance,
+            'matches': sum(answer is not None for answer in answers['full']), 'results': results}
+
+def benchmark_blob_store(num_records=2000, passes=3, seed=0, generator_options=None, profiles=None, work_dir=None):
+    """Compare database size with logged payloads inline and in content_blobs
+    
+    The same records are ingested passes times into a new database per
+    profile, as when a feed is replayed, so later passes are all redundant
+    and only add ProcessingLog rows. Sizes are of the database file after
+    the manager closes (and SQLite checkpoints the WAL into it).
+    """
+    from database_manager import DatabaseManager
+    from redundancy_detector import RedundancyDetector
+    profiles = profiles or list(BLOB_PROFILES)
+    records = WorkloadGenerator(seed=seed, **(generator_options or {})).records(num_records)
+    owned_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix='dedup-blobs-')
+    results = []
+    try:
+        for profile in profiles:
+            saved = {name: getattr(Config, name) for name in BLOB_PROFILES[profile]}
+            for name, value in BLOB_PROFILES[profile].items():
+                setattr(Config, name, value)
+            db_path = os.path.join(work_dir, f'{profile}.db')
+            try:
+                db_manager = DatabaseManager(f'sqlite:///{db_path}')
+                detector = RedundancyDetector(db_manager)
+                start = time.perf_counter()
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    for _ in range(passes):
+                        for chunk_start in range(0, len(records), Config.BATCH_SIZE):
+                            detector.process_batch(records[chunk_start:chunk_start + Config.BATCH_SIZE])
+                    detector.flush_metrics()
+                elapsed = time.perf_counter() - start
+                blobs, payload_bytes, stored_bytes = db_manager.get_blob_totals()
+                db_manager.close()
+                results.append({
+                    'profile': profile,
+                    'records': len(records) * passes,
+                    'seconds': elapsed,
+                    'records_per_sec': len(records) * passes / elapsed if elapsed else None,
+                    'db_size_mb': os.path.getsize(db_path) / (1024 * 1024),
+                    'blobs': blobs,
+                    'blob_payload_mb': payload_bytes / (1024 * 1024),
+                    'blob_stored_mb': stored_bytes / (1024 * 1024),
+                })
+            finally:
+                for name, value in saved.items():
+                    setattr(Config, name, value)
+    finally:
+        if owned_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return {'passes': passes, 'compression': Config.BLOB_COMPRESSION,
+            'compression_min_bytes': Config.BLOB_COMPRESSION_MIN_BYTES, 'results': results}
+
+# Run in a fresh interpreter per start: import the CLI, open the database and
+# build a detector, then answer one exact lookup, timing each step
+_STARTUP_SCRIPT = '''
+import json, time
+start = time.perf_counter()
+import main
+from database_manager import DatabaseManager
+from redundancy_detector import RedundancyDetector
+imported = time.perf_counter()
+detector = RedundancyDetector(DatabaseManager.shared())
+ready = time.perf_counter()
+detector.is_duplicate('startup benchmark probe')
+print(json.dumps({'import_ms': (imported - start) * 1000, 'ready_ms': (ready - start) * 1000,
+                  'first_lookup_ms': (time.perf_counter() - start) * 1000}))
+'''
+
+def benchmark_startup(existing=10000, runs=5, seed=0, work_dir=None):
+    """Time process starts: a first start on a new database and warm starts on a preloaded one
+    
+    Each start is a new interpreter, so module imports and schema checks are
+    paid every time as they are for a CLI call. Reports the median of runs
+    starts for each step measured by _STARTUP_SCRIPT, plus the wall time of
+    the whole process.
+    """
+    import statistics
+    import subprocess
+    owned_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix='dedup-startup-')
+    here = os.path.dirname(os.path.abspath(__file__))
+    warm_path = os.path.join(work_dir, 'warm.db')
+    results = {}
+    try:
+        prepare_database(warm_path, existing, WorkloadGenerator(seed))
+        for scenario in ('first_start', 'warm_start'):
+            samples = []
+            for run in range(runs):
+                db_path = warm_path if scenario == 'warm_start' else os.path.join(work_dir, f'new-{run}.db')
+                env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}')
+                start = time.perf_counter()
+                output = subprocess.run([sys.executable, '-c', _STARTUP_SCRIPT], cwd=here, env=env,
+                                        capture_output=True, text=True, check=True).stdout
+                sample = json.loads(output.strip().splitlines()[-1])
+                sample['process_ms'] = (time.perf_counter() - start) * 1000
+                samples.append(sample)
+            results[scenario] = {key: round(statistics.median(sample[key] for sample in samples), 1) for key in samples[0]}
+    finally:
+        if owned_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return {'existing_entries': existing, 'runs': runs, **results}
+
+def compare(report, baseline, tolerance=0.1):
+    """Return regressions where throughput dropped by more than tolerance against a baseline report"""
+    baseline_rates = {(result['mode'], result['existing_entries']): result.get('records_per_sec')
+                      for result in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        before = baseline_rates.get((result['mode'], result['existing_entries']))
+        after = result.get('records_per_sec')
+        if before and after is not None and after < before * (1 - tolerance):
+            regressions.append({'mode': result['mode'], 'existing_entries': result['existing_entries'],
+                                'baseline_records_per_sec': before, 'records_per_sec': after})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dedup pipeline on synthetic data (local SQLite)")
+    parser.add_argument('--existing', type=int, nargs='+', default=[10000], help="Preloaded entry counts, e.g. 10000 100000 1000000")
+    parser.add_argument('--records', type=int, default=2000, help="Records processed per scenario")
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--workers', type=int, default=2, help="Shard processes for the parallel mode")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--duplicate-ratio', type=float, default=0.2)
+    parser.add_argument('--near-duplicate-ratio', type=float, default=0.1)
+    parser.add_argument('--max-edits', type=int, default=2, help="Edit-distance noise of near duplicates")
+    parser.add_argument('--type-mix', type=json.loads, default=None, help='JSON weights, e.g. \'{"text": 0.8, "number": 0.2}\'')
+    parser.add_argument('--min-length', type=int, default=10)
+    parser.add_argument('--max-length', type=int, default=200)
+    parser.add_argument('--length-distribution', choices=('lognormal', 'uniform'), default='lognormal')
+    parser.add_argument('--commits', type=int, metavar='N',
+                        help="Instead of the pipeline benchmark, compare insert commits/sec of the SQLite profiles over N inserts")
+    parser.add_argument('--threads', type=int, default=4, help="Concurrent producers for --commits")
+    parser.add_argument('--distance', type=int, metavar='N',
+                        help="Instead of the pipeline benchmark, compare edit-distance kernels over N stored entries")
+    parser.add_argument('--blobs', type=int, metavar='PASSES',
+                        help="Instead of the pipeline benchmark, compare DB size with inline and blob-stored log payloads "
+                             "over PASSES replays of --records records")
+    parser.add_argument('--startup', action='store_true',
+                        help="Instead of the pipeline benchmark, time process starts against the first --existing size")
+    parser.add_argument('--budget-ms', type=float, default=1000.0,
+                        help="Exit with status 1 when a --startup warm start reaches its first lookup slower than this")
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    parser.add_argument('--baseline', help="Earlier JSON report; exit with status 1 on throughput regressions")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="Allowed throughput drop against --baseline")
+    args = parser.parse_args()
+    
+    generator_options = {
+        'duplicate_ratio': args.duplicate_ratio,
+        'near_duplicate_ratio': args.near_duplicate_ratio,
+        'type_mix': args.type_mix,
+        'min_length': args.min_length,
+        'max_length': args.max_length,
+        'length_distribution': args.length_distribution,
+        'max_edits': args.max_edits,
+    }
+    if args.commits:
+        report = {'commit_benchmark': benchmark_commits(args.commits, args.threads)}
+    elif args.distance:
+        report = {'distance_benchmark': benchmark_distance(args.distance, args.records, seed=args.seed,
+                                                           generator_options=generator_options)}
+    elif args.blobs:
+        report = {'blob_benchmark': benchmark_blob_store(args.records, args.blobs, seed=args.seed,
+                                                         generator_options=generator_options)}
+    elif args.startup:
+        report = {'startup_benchmark': benchmark_startup(args.existing[0], seed=args.seed)}
+        report['startup_benchmark']['budget_ms'] = args.budget_ms
+    else:
+        report = run_benchmark(args.existing, args.records, args.modes, args.workers, args.seed, generator_options)
+    if args.baseline and not (args.commits or args.distance or args.blobs or args.startup):
+        with open(args.baseline, encoding='utf-8') as handle:
+            report['regressions'] = compare(report, json.load(handle), args.tolerance)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            handle.write(output + "\n")
+    else:
+        print(output)
+    if report.get('regressions'):
+        for regression in report['regressions']:
+            print(f"Regression: {regression['mode']} at {regression['existing_entries']} entries "
+                  f"{regression['baseline_records_per_sec']:,.0f} -> {regression['records_per_sec']:,.0f} records/sec",
+                  file=sys.stderr)
+        sys.exit(1)
+    if args.startup and report['startup_benchmark']['warm_start']['first_lookup_ms'] > args.budget_ms:
+        print(f"Warm start took {report['startup_benchmark']['warm_start']['first_lookup_ms']:,.0f} ms, "
+              f"over the {args.budget_ms:,.0f} ms budget", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import zlib
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+from config import Config
+
+COMPRESSIONS = ('none', 'zlib', 'zstd')
+
+def resolve_compression(name):
+    """Map a configured compression name to one that is available here"""
+    name = name.lower()
+    if name not in COMPRESSIONS:
+        raise ValueError(f"Unknown blob compression: {name}. Must be one of: {', '.join(COMPRESSIONS)}")
+    if name == 'zstd' and not ZSTD_AVAILABLE:
+        print("Warning: zstandard not installed. Using zlib for content blobs.")
+        return 'zlib'
+    return name
+
+def decode_payload(codec, payload):
+    """Return the text stored in a ContentBlob payload written with codec"""
+    if codec == 'zlib':
+        payload = zlib.decompress(payload)
+    elif codec == 'zstd':
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("This content blob is zstd-compressed; install zstandard to read it")
+        payload = zstandard.ZstdDecompressor().decompress(payload)
+    elif codec != 'raw':
+        raise ValueError(f"Unknown content blob codec: {codec}")
+    return bytes(payload).decode('utf-8')
+
+class BlobCodec:
+    """Encodes payloads for the content_blobs table
+    
+    Payloads of at least min_bytes (UTF-8) are compressed, and the
+    compressed form is kept only when it is smaller; everything else is
+    stored raw. Each row records its codec, so changing the settings never
+    affects reading blobs written before.
+    """
+    
+    def __init__(self, compression=None, min_bytes=None, level=None):
+        self.compression = resolve_compression(compression or Config.BLOB_COMPRESSION)
+        self.min_bytes = Config.BLOB_COMPRESSION_MIN_BYTES if min_bytes is None else min_bytes
+        self.level = Config.BLOB_COMPRESSION_LEVEL if level is None else level
+        if self.compression == 'zstd':
+            self._compress = zstandard.ZstdCompressor(level=self.level).compress
+        else:
+            self._compress = lambda data: zlib.compress(data, self.level)
+    
+    def encode(self, content):
+        """Return (codec, payload bytes, UTF-8 size) for content"""
+        data = content.encode('utf-8')
+        if self.compression != 'none' and len(data) >= self.min_bytes:
+            compressed = self._compress(data)
+            if len(compressed) < len(data):
+                return self.compression, compressed, len(data)
+        return 'raw', data, len(data)
@@ -0,0 +1,73 @@
+import datetime
+import re
+from decimal import MAX_EMAX, MIN_EMIN, Context, Decimal, InvalidOperation
+
+TRUE_VALUES = frozenset(['true', '1', 'yes'])
+FALSE_VALUES = frozenset(['false', '0', 'no'])
+# Same formats DataValidator accepts, captured as (year, month, day)
+DATE_FORMATS = [
+    (re.compile(r'(\d{4})-(\d{2})-(\d{2})'), (1, 2, 3)),  # YYYY-MM-DD
+    (re.compile(r'(\d{2})/(\d{2})/(\d{4})'), (3, 1, 2)),  # MM/DD/YYYY
+    (re.compile(r'(\d{2})-(\d{2})-(\d{4})'), (3, 2, 1)),  # DD-MM-YYYY
+]
+
+def canonical_number(data_content):
+    """Shortest exact decimal form: '1.0', '1', '+1e0' and '1_0E-1' all become '1'"""
+    try:
+        value = Decimal(data_content.strip())
+    except InvalidOperation:
+        return data_content.strip().lower()
+    if value.is_nan():
+        return 'nan'
+    if value.is_infinite():
+        return '-inf' if value < 0 else 'inf'
+    if value.is_zero():
+        return '0'
+    # Precision as wide as the literal, so normalizing never rounds distinct values together
+    return str(value.normalize(Context(prec=len(value.as_tuple().digits), Emax=MAX_EMAX, Emin=MIN_EMIN)))
+
+def canonical_boolean(data_content):
+    """'true' or 'false' for any accepted spelling"""
+    folded = data_content.strip().lower()
+    if folded in TRUE_VALUES:
+        return 'true'
+    if folded in FALSE_VALUES:
+        return 'false'
+    return folded
+
+def canonical_date(data_content):
+    """ISO YYYY-MM-DD for the accepted date formats; impossible dates are left as written"""
+    stripped = data_content.strip()
+    for pattern, (year, month, day) in DATE_FORMATS:
+        match = pattern.fullmatch(stripped)
+        if match:
+            try:
+                return datetime.date(int(match.group(year)), int(match.group(month)), int(match.group(day))).isoformat()
+            except ValueError:
+                return stripped
+    return stripped
+
+def canonical_text(data_content):
+    """Collapse whitespace runs and fold case"""
+    return ' '.join(data_content.split()).casefold()
+
+# data type -> (family, canonicalizer); types in one family can match each other
+CANONICALIZERS = {
+    'number': ('number', canonical_number),
+    'boolean': ('boolean', canonical_boolean),
+    'date': ('date', canonical_date),
+    'datetime': ('date', canonical_date),
+    'text': ('text', canonical_text),
+    'mixed': ('text', canonical_text),
+}
+
+def canonical_form(data_content, data_type):
+    """Type-aware normal form of data_content, prefixed by its type family
+    
+    Values that mean the same thing ('1.0' and '1' as numbers, 'TRUE' and
+    'yes' as booleans, '2023-01-01' and '01/01/2023' as dates) share a
+    canonical form, so hashing it turns those matches into exact lookups.
+    Unknown types are treated as text.
+    """
+    family, canonicalizer = CANONICALIZERS.get((data_type or 'text').lower(), CANONICALIZERS['text'])
+    return f"{family}:{canonicalizer(data_content)}"
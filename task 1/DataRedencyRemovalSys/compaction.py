@@ -0,0 +1,209 @@
+import json
+import time
+from config import Config
+from redundancy_detector import RedundancyDetector, LEVENSHTEIN_AVAILABLE
+if LEVENSHTEIN_AVAILABLE:
+    from Levenshtein import distance as levenshtein_distance
+
+CHECKPOINT_KEY = 'compaction_checkpoint'
+PASSES = ('canonical', 'edit_distance', 'minhash')
+
+class Compactor:
+    """Marks near-duplicates already stored in data_entries without comparing all pairs
+    
+    Three blocked passes each compare an entry only with entries that could
+    possibly match it, keep one survivor per cluster and set is_redundant
+    and similarity_score on the rest:
+    
+    - canonical: entries sharing a canonical_hash; the lowest id survives
+      (score 1.0);
+    - edit_distance: text/mixed entries (every type without type
+      partitioning) streamed in (length, id) order through the length
+      index, each searched against the survivors of its own type in the
+      max_distance lengths below it, so the shortest (then lowest id)
+      entry of a cluster survives;
+    - minhash: long text/mixed entries sharing an LSH bucket whose
+      estimated similarity reaches SIMILARITY_THRESHOLD, in bucket key
+      order; an entry kept in one bucket is never marked by a later one,
+      so every marked entry keeps an unmarked near-duplicate.
+    
+    Only one page of rows, plus the survivors of a few lengths in the
+    edit-distance pass, is held in memory. Marks are committed page by
+    page and the position reached is saved in schema_info, so an
+    interrupted run resumes where it stopped; rows already marked are never
+    read again.
+    """
+    
+    def __init__(self, redundancy_detector=None, batch_size=None):
+        self.redundancy_detector = redundancy_detector or RedundancyDetector()
+        self.db_manager = self.redundancy_detector.db_manager
+        self.batch_size = batch_size or Config.BATCH_SIZE
+        # Case-folded equality in the fallback mode never crosses lengths
+        self.max_distance = self.redundancy_detector.distance_threshold - 1 if LEVENSHTEIN_AVAILABLE else 0
+        self.stats = {name: 0 for name in PASSES}
+        self.stats['scanned'] = 0
+    
+    def load_checkpoint(self):
+        """Return (pass name, position) of an interrupted run, or (None, None)"""
+        value = self.db_manager.get_schema_info(CHECKPOINT_KEY)
+        if not value:
+            return None, None
+        checkpoint = json.loads(value)
+        return checkpoint['pass'], checkpoint['after']
+    
+    def save_checkpoint(self, pass_name, after):
+        self.db_manager.set_schema_info(CHECKPOINT_KEY, json.dumps({'pass': pass_name, 'after': after}))
+    
+    def run(self, restart=False):
+        """Run every pass, resuming from the saved checkpoint unless restart is set"""
+        start = time.perf_counter()
+        resume_pass, after = (None, None) if restart else self.load_checkpoint()
+        passes = {
+            'canonical': self._canonical_pass,
+            'edit_distance': self._edit_distance_pass,
+            'minhash': self._minhash_pass,
+        }
+        for name in PASSES:
+            if resume_pass is not None and PASSES.index(name) < PASSES.index(resume_pass):
+                continue  # Finished before the interruption
+            passes[name](after if name == resume_pass else None)
+        self.db_manager.set_schema_info(CHECKPOINT_KEY, '')
+        self.stats['elapsed'] = time.perf_counter() - start
+        return self.stats
+    
+    def _mark(self, pass_name, marks):
+        if marks:
+            if not self.db_manager.mark_redundant(marks):
+                raise RuntimeError("Compaction stopped: marks could not be written; rerun to resume")
+            self.stats[pass_name] += len(marks)
+    
+    def _canonical_pass(self, after_hash):
+        if not self.redundancy_detector.canonical_matching:
+            return
+        while True:
+            groups = self.db_manager.get_canonical_groups(after_hash, self.batch_size)
+            if not groups:
+                break
+            marks = [(entry_id, 1.0) for _, entry_ids in groups for entry_id in entry_ids[1:]]
+            self.stats['scanned'] += sum(len(entry_ids) for _, entry_ids in groups)
+            self._mark('canonical', marks)
+            after_hash = groups[-1][0]
+            self.save_checkpoint('canonical', after_hash)
+    
+    def _similarity(self, content, other_content):
+        """Edit similarity recorded for a marked entry"""
+        if not LEVENSHTEIN_AVAILABLE:
+            return 1.0  # The fallback only matches case-insensitively equal content
+        return 1.0 - levenshtein_distance(content, other_content) / max(len(content), len(other_content), 1)
+    
+    def _edit_distance_pass(self, resume_length):
+        """Stream entries by length, searching the survivors of the nearby shorter lengths
+        
+        Each type partition has one near-duplicate index over the survivors
+        of the current window of max_distance + 1 lengths. Lengths that drop
+        out of the window are never searched again (queries only grow
+        longer), so the index is rebuilt from the window, in id order, only
+        once such stale entries outnumber the live ones; each entry is
+        searched once and added a constant number of times on average.
+        Exact-only types (numbers, booleans, dates) are skipped. A checkpoint
+        records the last completed length. On resume the survivors of the
+        lengths just below it are reloaded (they are the unmarked entries
+        there) before searching continues.
+        """
+        detector = self.redundancy_detector
+        windows = {}  # partition -> {length -> {id: content} of its survivors}
+        indexes = {}  # partition -> near-duplicate index over its window
+        length = -1 if resume_length is None else resume_length - self.max_distance - 1
+        while True:
+            length = self.db_manager.get_next_content_length(length)
+            if length is None:
+                break
+            for partition, window in windows.items():
+                for old_length in [old for old in window if old < length - self.max_distance]:
+                    del window[old_length]
+                if len(indexes[partition]) > 2 * sum(map(len, window.values())):
+                    indexes[partition] = detector._new_fuzzy_index()
+                    for entry_id, data_content in sorted(item for contents in window.values() for item in contents.items()):
+                        detector._add_to_index(indexes[partition], entry_id, data_content)
+            reload_only = resume_length is not None and length <= resume_length
+            after_id = 0
+            while True:
+                rows = self.db_manager.get_entries_of_length(length, after_id, self.batch_size)
+                if not rows:
+                    break
+                marks = []
+                for entry_id, data_content, data_type in rows:
+                    data_content = str(data_content)
+                    if not detector.uses_fuzzy(data_type) or detector.uses_minhash(data_content, data_type):
+                        continue  # Exact-only, or left to the minhash pass
+                    partition = detector.partition(data_type)
+                    if partition not in windows:
+                        windows[partition], indexes[partition] = {}, detector._new_fuzzy_index()
+                    window, index = windows[partition], indexes[partition]
+                    match_id = None
+                    if not reload_only:
+                        self.stats['scanned'] += 1
+                        match_id = detector._search_index(index, data_content)
+                    if match_id is None:
+                        detector._add_to_index(index, entry_id, data_content)
+                        window.setdefault(length, {})[entry_id] = data_content
+                    else:
+                        other_content = next(other for other in window.values() if match_id in other)[match_id]
+                        marks.append((entry_id, self._similarity(data_content, other_content)))
+                self._mark('edit_distance', marks)
+                after_id = rows[-1][0]
+            if not reload_only:
+                self.save_checkpoint('edit_distance', length)
+    
+    def _minhash_pass(self, after_key):
+        """Compare the unmarked members of each shared LSH bucket, marking all but the survivors of each cluster
+        
+        Entries kept in an earlier bucket are survivors: they are compared
+        against first and never marked, since entries marked against them
+        would otherwise be left without an unmarked near-duplicate (a chain
+        A~B in one bucket and B~C in another). The survivor ids of the run
+        are held in memory; on resume, unmarked entries with a bucket at or
+        before the checkpoint count as survivors.
+        """
+        minhasher = self.redundancy_detector.minhasher
+        if minhasher is None:
+            return  # Long entries were covered by the edit-distance pass
+        survivors = set()
+        resume_key = after_key
+        while True:
+            buckets = self.db_manager.get_shared_buckets(after_key, self.batch_size)
+            if not buckets:
+                break
+            page_ids = {entry_id for _, entry_ids in buckets for entry_id in entry_ids}
+            if resume_key is not None:
+                survivors |= self.db_manager.get_entries_with_bucket_at_most(page_ids - survivors, resume_key)
+            signatures = {}
+            partitions = {}
+            for entry_id, (signature, data_type) in self.db_manager.get_minhash_signatures(page_ids).items():
+                signatures[entry_id] = minhasher.from_bytes(signature)
+                partitions[entry_id] = self.redundancy_detector.partition(data_type)
+            marked = {}
+            for _, entry_ids in buckets:
+                kept = [entry_id for entry_id in entry_ids if entry_id in survivors and entry_id in signatures]
+                for entry_id in entry_ids:
+                    if entry_id in marked or entry_id in survivors or entry_id not in signatures:
+                        continue
+                    self.stats['scanned'] += 1
+                    # Like the edit-distance pass, entries are only compared within their type's partition
+                    others = [other for other in kept if partitions[other] == partitions[entry_id]]
+                    scores = minhasher.similarities(signatures[entry_id], [signatures[other] for other in others])
+                    if len(scores) and scores.max() >= Config.SIMILARITY_THRESHOLD:
+                        marked[entry_id] = float(scores.max())
+                    else:
+                        kept.append(entry_id)
+                        survivors.add(entry_id)
+            self._mark('minhash', list(marked.items()))
+            after_key = buckets[-1][0]
+            self.save_checkpoint('minhash', after_key)
+
+def format_stats(stats):
+    """One-line summary of a compaction run"""
+    marked = sum(stats[name] for name in PASSES)
+    return (f"Compaction marked {marked} redundant entries in {stats.get('elapsed', 0.0):.2f}s "
+            f"(canonical {stats['canonical']}, edit distance {stats['edit_distance']}, minhash {stats['minhash']}; "
+            f"{stats['scanned']} entries compared)")
@@ -12,14 +12,34 @@ class Config:
     DATABASE_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', 5))
     DATABASE_MAX_OVERFLOW = int(os.getenv('DATABASE_MAX_OVERFLOW', 10))
     
+    # SQLite Settings (file databases only)
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'wal')  # wal lets readers run while a write commits
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'normal')  # off, normal (may lose the last commits on power loss), full, extra
+    SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 65536))  # Page cache per connection
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 268435456))  # Bytes of the file to memory-map, 0 disables
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_WRITER_THREAD = os.getenv('SQLITE_WRITER_THREAD', 'false').lower() == 'true'  # Group-commit inserts on one thread
+    SQLITE_GROUP_COMMIT_MS = float(os.getenv('SQLITE_GROUP_COMMIT_MS', 2))  # How long the writer waits to fill a group
+    
     # Redundancy Detection Settings
     SIMILARITY_THRESHOLD = float(os.getenv('SIMILARITY_THRESHOLD', 0.8))
     EXACT_MATCH_THRESHOLD = float(os.getenv('EXACT_MATCH_THRESHOLD', 1.0))
     MIN_SIMILARITY_SCORE = float(os.getenv('MIN_SIMILARITY_SCORE', 0.6))
+    FUZZY_DISTANCE_THRESHOLD = int(os.getenv('FUZZY_DISTANCE_THRESHOLD', 3))  # Edit distances below this are similar
+    FUZZY_SEARCH_MODE = os.getenv('FUZZY_SEARCH_MODE', 'index')  # index, scan (brute-force reference)
+    CANONICAL_MATCHING = os.getenv('CANONICAL_MATCHING', 'true').lower() == 'true'  # Exact lookups on canonicalized content
+    TYPE_PARTITIONING = os.getenv('TYPE_PARTITIONING', 'true').lower() == 'true'  # Fuzzy matches stay within one data_type
+    SIMILARITY_ENGINE = os.getenv('SIMILARITY_ENGINE', 'levenshtein')  # levenshtein, minhash (long text/mixed entries)
+    MINHASH_MIN_LENGTH = int(os.getenv('MINHASH_MIN_LENGTH', 100))  # Shorter entries keep using edit distance
+    MINHASH_NUM_PERM = int(os.getenv('MINHASH_NUM_PERM', 128))
+    MINHASH_BANDS = int(os.getenv('MINHASH_BANDS', 32))
+    SHINGLE_SIZE = int(os.getenv('SHINGLE_SIZE', 5))
     
     # Batch Processing Settings
     BATCH_SIZE = int(os.getenv('BATCH_SIZE', 1000))
     MAX_BATCH_RETRIES = int(os.getenv('MAX_BATCH_RETRIES', 3))
+    PARALLEL_WORKERS = int(os.getenv('PARALLEL_WORKERS', 0))  # 0 uses one worker per CPU
+    PARALLEL_BAND_WIDTH = int(os.getenv('PARALLEL_BAND_WIDTH', 8))  # Content lengths per fuzzy index shard band
     
     # Validation Settings
     MAX_STRING_LENGTH = int(os.getenv('MAX_STRING_LENGTH', 1000))
@@ -30,8 +50,31 @@ class Config:
     LOG_FILE = os.getenv('LOG_FILE', 'data_redundancy.log')
     
     # Performance Settings
-    CACHE_SIZE = int(os.getenv('CACHE_SIZE', 10000))
-    HASH_ALGORITHM = os.getenv('HASH_ALGORITHM', 'md5')
+    CACHE_SIZE = int(os.getenv('CACHE_SIZE', 10000))  # 0 disables the hash cache
+    BLOOM_FALSE_POSITIVE_RATE = float(os.getenv('BLOOM_FALSE_POSITIVE_RATE', 0.01))
+    HASH_ALGORITHM = os.getenv('HASH_ALGORITHM', 'md5')  # md5, sha1, sha256, blake2b, blake2b-64, blake2b-128, xxh64, xxh128
+    SINGLE_WRITER = os.getenv('SINGLE_WRITER', 'false').lower() == 'true'  # Only this manager inserts: trust cached misses
+    # Lookup accelerator, not a space saving: adds an indexed 64-bit column next to the unique content_hash index
+    FINGERPRINT_LOOKUP_INDEX = os.getenv('FINGERPRINT_LOOKUP_INDEX', os.getenv('COMPACT_FINGERPRINTS', 'false')).lower() == 'true'
+    
+    # Async Service Settings
+    SERVICE_HOST = os.getenv('SERVICE_HOST', '127.0.0.1')
+    SERVICE_PORT = int(os.getenv('SERVICE_PORT', 8765))
+    SERVICE_QUEUE_SIZE = int(os.getenv('SERVICE_QUEUE_SIZE', 10000))  # Queued records before producers are made to wait
+    SERVICE_BATCH_DELAY_MS = float(os.getenv('SERVICE_BATCH_DELAY_MS', 5))  # Longest wait to fill a micro-batch
+    SERVICE_MAX_IN_FLIGHT = int(os.getenv('SERVICE_MAX_IN_FLIGHT', 1000))  # Unanswered requests per connection
+    
+    # Instrumentation Settings
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 10))  # Seconds between SystemMetrics writes
+    PROCESSING_LOG_SAMPLE_RATE = float(os.getenv('PROCESSING_LOG_SAMPLE_RATE', 0.01))  # Failures are always logged
+    
+    # Content Blob Settings
+    BLOB_STORE = os.getenv('BLOB_STORE', 'true').lower() == 'true'  # Logged payloads stored once in content_blobs
+    BLOB_MIN_BYTES = int(os.getenv('BLOB_MIN_BYTES', 64))  # Shorter payloads stay inline, cheaper than a key
+    BLOB_COMPRESSION = os.getenv('BLOB_COMPRESSION', 'zlib')  # none, zlib, zstd (needs zstandard)
+    BLOB_COMPRESSION_MIN_BYTES = int(os.getenv('BLOB_COMPRESSION_MIN_BYTES', 256))  # Smaller payloads are stored raw
+    BLOB_COMPRESSION_LEVEL = int(os.getenv('BLOB_COMPRESSION_LEVEL', 6))
     
     @classmethod
     def validate(cls):
@@ -40,8 +83,38 @@ class Config:
             raise ValueError("SIMILARITY_THRESHOLD must be between 0 and 1")
         if not 0 <= cls.EXACT_MATCH_THRESHOLD <= 1:
             raise ValueError("EXACT_MATCH_THRESHOLD must be between 0 and 1")
+        if cls.FUZZY_DISTANCE_THRESHOLD <= 0:
+            raise ValueError("FUZZY_DISTANCE_THRESHOLD must be positive")
+        if cls.FUZZY_SEARCH_MODE not in ('index', 'scan'):
+            raise ValueError("FUZZY_SEARCH_MODE must be 'index' or 'scan'")
+        if cls.SIMILARITY_ENGINE not in ('levenshtein', 'minhash'):
+            raise ValueError("SIMILARITY_ENGINE must be 'levenshtein' or 'minhash'")
+        if cls.MINHASH_BANDS <= 0 or cls.MINHASH_NUM_PERM % cls.MINHASH_BANDS != 0:
+            raise ValueError("MINHASH_NUM_PERM must be a positive multiple of MINHASH_BANDS")
+        if not 0 <= cls.MIN_SIMILARITY_SCORE <= cls.SIMILARITY_THRESHOLD:
+            raise ValueError("MIN_SIMILARITY_SCORE must be between 0 and SIMILARITY_THRESHOLD")
         if cls.BATCH_SIZE <= 0:
             raise ValueError("BATCH_SIZE must be positive")
+        if cls.PARALLEL_WORKERS < 0 or cls.PARALLEL_BAND_WIDTH <= 0:
+            raise ValueError("PARALLEL_WORKERS must not be negative and PARALLEL_BAND_WIDTH must be positive")
+        if cls.SQLITE_JOURNAL_MODE.lower() not in ('delete', 'truncate', 'persist', 'memory', 'wal', 'off'):
+            raise ValueError("SQLITE_JOURNAL_MODE must be one of: delete, truncate, persist, memory, wal, off")
+        if cls.SQLITE_SYNCHRONOUS.lower() not in ('off', 'normal', 'full', 'extra'):
+            raise ValueError("SQLITE_SYNCHRONOUS must be one of: off, normal, full, extra")
+        if cls.SQLITE_GROUP_COMMIT_MS < 0:
+            raise ValueError("SQLITE_GROUP_COMMIT_MS must not be negative")
+        if cls.SERVICE_QUEUE_SIZE <= 0 or cls.SERVICE_MAX_IN_FLIGHT <= 0 or cls.SERVICE_BATCH_DELAY_MS < 0:
+            raise ValueError("SERVICE_QUEUE_SIZE and SERVICE_MAX_IN_FLIGHT must be positive and SERVICE_BATCH_DELAY_MS not negative")
+        if cls.METRICS_FLUSH_INTERVAL < 0 or not 0 <= cls.PROCESSING_LOG_SAMPLE_RATE <= 1:
+            raise ValueError("METRICS_FLUSH_INTERVAL must not be negative and PROCESSING_LOG_SAMPLE_RATE must be between 0 and 1")
+        if cls.CACHE_SIZE < 0:
+            raise ValueError("CACHE_SIZE must not be negative")
+        if not 0 < cls.BLOOM_FALSE_POSITIVE_RATE < 1:
+            raise ValueError("BLOOM_FALSE_POSITIVE_RATE must be between 0 and 1")
+        if cls.BLOB_COMPRESSION.lower() not in ('none', 'zlib', 'zstd'):
+            raise ValueError("BLOB_COMPRESSION must be one of: none, zlib, zstd")
+        if cls.BLOB_MIN_BYTES < 1 or cls.BLOB_COMPRESSION_MIN_BYTES < 0:
+            raise ValueError("BLOB_MIN_BYTES must be positive and BLOB_COMPRESSION_MIN_BYTES not negative")
         
         return True
 
@@ -1,12 +1,85 @@
 import re
 from config import Config
 
+VALID_TYPES = ('text', 'number', 'mixed', 'boolean', 'date', 'datetime')
+BOOLEAN_VALUES = frozenset(['true', 'false', '1', '0', 'yes', 'no'])
+DATE_PATTERN = re.compile(
+    r'\d{4}-\d{2}-\d{2}'  # YYYY-MM-DD
+    r'|\d{2}/\d{2}/\d{4}'  # MM/DD/YYYY
+    r'|\d{2}-\d{2}-\d{4}'  # DD-MM-YYYY
+)
+# Plain decimal/scientific literals; anything else is left to float() so results match validate_numeric_data
+NUMBER_PATTERN = re.compile(r'\s*[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?\s*')
+
+# Error codes returned by validate_batch, in the order validate_data checks them
+VALID = 0
+CONTENT_NOT_STRING = 1
+CONTENT_EMPTY = 2
+CONTENT_TOO_LONG = 3
+TYPE_NOT_STRING = 4
+TYPE_INVALID = 5
+NOT_NUMERIC = 6
+NOT_BOOLEAN = 7
+NOT_DATE = 8
+
+ERROR_MESSAGES = {
+    VALID: "Valid data",
+    CONTENT_NOT_STRING: "Data content must be a string",
+    CONTENT_EMPTY: "Data content cannot be empty",
+    CONTENT_TOO_LONG: "Data content exceeds maximum length of {max_length} characters",
+    TYPE_NOT_STRING: "Data type must be a string",
+    TYPE_INVALID: f"Invalid data type. Must be one of: {', '.join(VALID_TYPES)}",
+    NOT_NUMERIC: "Data content is not numeric",
+    NOT_BOOLEAN: "Data content is not boolean",
+    NOT_DATE: "Data content is not a valid date format",
+}
+
+def _is_float(value):
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+def _numeric_mask(contents):
+    import numpy as np
+    mask = np.fromiter(map(bool, map(NUMBER_PATTERN.fullmatch, contents)), dtype=bool, count=len(contents))
+    if not mask.all():
+        # Rare forms such as 'nan', 'inf' or '1_000' go through float() itself
+        rest = np.flatnonzero(~mask)
+        mask[rest] = [_is_float(contents[index]) for index in rest]
+    return mask
+
+def _boolean_mask(contents):
+    import numpy as np
+    return np.fromiter(map(BOOLEAN_VALUES.__contains__, map(str.lower, contents)), dtype=bool, count=len(contents))
+
+def _date_mask(contents):
+    import numpy as np
+    return np.fromiter(map(bool, map(DATE_PATTERN.fullmatch, contents)), dtype=bool, count=len(contents))
+
+# Column checks for types that constrain content: data type -> (mask function, error code)
+BATCH_CHECKS = {
+    'number': (_numeric_mask, NOT_NUMERIC),
+    'boolean': (_boolean_mask, NOT_BOOLEAN),
+    'date': (_date_mask, NOT_DATE),
+    'datetime': (_date_mask, NOT_DATE),
+}
+
 class DataValidator:
     """Validates data content and type before processing"""
     
     def __init__(self):
         self.max_length = Config.MAX_STRING_LENGTH
         self.required_fields = Config.REQUIRED_FIELDS
+        self.type_validators = {
+            'number': self.validate_numeric_data,
+            'boolean': self.validate_boolean_data,
+            'date': self.validate_date_data,
+            'datetime': self.validate_date_data,
+            'mixed': self.validate_mixed_data,
+            'text': self.validate_text_data,
+        }
     
     def validate_data_content(self, data_content):
         """Validate the data content meets requirements"""
@@ -23,44 +96,30 @@ class DataValidator:
     
     def validate_data_type(self, data_type):
         """Validate the data type"""
-        valid_types = ['text', 'number', 'mixed', 'boolean', 'date', 'datetime']
-        
         if not isinstance(data_type, str):
             return False, "Data type must be a string"
         
-        if data_type.lower() not in valid_types:
-            return False, f"Invalid data type. Must be one of: {', '.join(valid_types)}"
+        if data_type.lower() not in self.type_validators:
+            return False, ERROR_MESSAGES[TYPE_INVALID]
         
         return True, "Valid data type"
     
     def validate_numeric_data(self, data_content):
         """Validate if data content is numeric"""
-        try:
-            float(data_content)
+        if _is_float(data_content):
             return True, "Valid numeric data"
-        except ValueError:
-            return False, "Data content is not numeric"
+        return False, "Data content is not numeric"
     
     def validate_boolean_data(self, data_content):
         """Validate if data content is boolean"""
-        boolean_values = ['true', 'false', '1', '0', 'yes', 'no']
-        if data_content.lower() in boolean_values:
+        if data_content.lower() in BOOLEAN_VALUES:
             return True, "Valid boolean data"
         return False, "Data content is not boolean"
     
     def validate_date_data(self, data_content):
         """Validate if data content is a date"""
-        # Simple date pattern matching
-        date_patterns = [
-            r'\d{4}-\d{2}-\d{2}',  # YYYY-MM-DD
-            r'\d{2}/\d{2}/\d{4}',   # MM/DD/YYYY
-            r'\d{2}-\d{2}-\d{4}'    # DD-MM-YYYY
-        ]
-        
-        for pattern in date_patterns:
-            if re.fullmatch(pattern, data_content):
-                return True, "Valid date data"
-        
+        if DATE_PATTERN.fullmatch(data_content):
+            return True, "Valid date data"
         return False, "Data content is not a valid date format"
     
     def validate_mixed_data(self, data_content):
@@ -70,6 +129,10 @@ class DataValidator:
             return True, "Valid mixed data"
         return False, "Mixed data cannot be empty"
     
+    def validate_text_data(self, data_content):
+        """Validate text data content"""
+        return True, "Valid text data"  # Text data is already validated by content validation
+    
     def validate_data(self, data_content, data_type):
         """Comprehensive data validation"""
         # Validate data content
@@ -83,16 +146,64 @@ class DataValidator:
             return False, type_msg
         
         # Type-specific validation
-        data_type_lower = data_type.lower()
-        if data_type_lower == 'number':
-            return self.validate_numeric_data(data_content)
-        elif data_type_lower == 'boolean':
-            return self.validate_boolean_data(data_content)
-        elif data_type_lower == 'date' or data_type_lower == 'datetime':
-            return self.validate_date_data(data_content)
-        elif data_type_lower == 'mixed':
-            return self.validate_mixed_data(data_content)
-        elif data_type_lower == 'text':
-            return True, "Valid text data"  # Text data is already validated by content validation
+        return self.type_validators[data_type.lower()](data_content)
+    
+    def validate_batch(self, contents, data_types):
+        """Validate a column of contents against a column of types (or one type for all)
         
-        return False, "Unknown validation error"
+        Returns (mask, codes): a boolean array that is True for valid rows and
+        a uint8 array of error codes (VALID for accepted rows), giving the same
+        verdict as validate_data row by row. Each check runs once over the
+        column with C-level map() calls into precompiled patterns, and rows
+        are grouped by type so no per-row dispatch happens. Use
+        error_message() to turn a code into text when a row is reported.
+        """
+        import numpy as np  # Only batch validation needs it; imported here to keep startup light
+        contents = list(contents)
+        count = len(contents)
+        codes = np.zeros(count, dtype=np.uint8)
+        if count == 0:
+            return np.ones(0, dtype=bool), codes
+        
+        def reject(rows, code):
+            codes[rows & (codes == VALID)] = code
+        
+        if set(map(type, contents)) == {str}:
+            is_string = np.ones(count, dtype=bool)
+        else:
+            is_string = np.fromiter((isinstance(value, str) for value in contents), dtype=bool, count=count)
+        if not is_string.all():
+            reject(~is_string, CONTENT_NOT_STRING)
+            contents = [value if string else '' for value, string in zip(contents, is_string)]
+        lengths = np.fromiter(map(len, contents), dtype=np.int64, count=count)
+        reject((lengths == 0) | np.fromiter(map(str.isspace, contents), dtype=bool, count=count), CONTENT_EMPTY)
+        reject(lengths > self.max_length, CONTENT_TOO_LONG)
+        
+        # Types repeat heavily, so each distinct value is checked once and its rows handled together
+        if isinstance(data_types, str) or data_types is None:
+            data_types = [data_types] * count
+        else:
+            data_types = list(data_types)
+            if not set(map(type, data_types)) <= {str, type(None)}:
+                # Every non-string type fails the same way, and lists or dicts cannot be grouped by value
+                data_types = [data_type if isinstance(data_type, str) else None for data_type in data_types]
+        distinct = list(set(data_types))
+        type_ids = np.fromiter(map({data_type: index for index, data_type in enumerate(distinct)}.__getitem__, data_types),
+                               dtype=np.int32, count=count)
+        for type_id, data_type in enumerate(distinct):
+            rows = type_ids == type_id
+            if not isinstance(data_type, str):
+                reject(rows, TYPE_NOT_STRING)
+            elif data_type.lower() not in VALID_TYPES:
+                reject(rows, TYPE_INVALID)
+            elif data_type.lower() in BATCH_CHECKS:
+                mask_function, code = BATCH_CHECKS[data_type.lower()]
+                indexes = np.flatnonzero(rows & (codes == VALID))
+                if len(indexes):
+                    failed = ~mask_function([contents[index] for index in indexes])
+                    codes[indexes[failed]] = code
+        return codes == VALID, codes
+    
+    def error_message(self, code):
+        """Message for an error code returned by validate_batch"""
+        return ERROR_MESSAGES[code].format(max_length=self.max_length)
@@ -1,34 +1,578 @@
-from sqlalchemy import create_engine
+import sys
+import threading
+import time
+import warnings
+from contextlib import contextmanager
+from sqlalchemy import bindparam, create_engine, event, func, insert, inspect, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import SQLAlchemyError
-from models import Base, DataEntry, ProcessingLog, SystemMetrics
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError, OperationalError
+from models import Base, ContentBlob, DataEntry, MinHashBucket, ProcessingLog, SystemMetrics, SchemaInfo, schema_version
+from blob_store import BlobCodec, decode_payload
 from config import Config
+from fingerprint import to_int64
+from hash_cache import HashCache, MISS
+from sqlite_writer import SQLiteWriter
+
+_engines = {}  # database URL -> process-wide engine
+_engine_users = {}  # database URL -> number of open managers using its engine
+_initialized_urls = set()  # URLs whose schema has been created/upgraded in this process
+_engines_lock = threading.Lock()
+SCHEMA_VERSION_KEY = 'schema_version'
+
+def is_sqlite_file(database_url):
+    """Whether database_url points at a SQLite database file rather than memory or another backend"""
+    url = make_url(database_url)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:') and url.query.get('mode') != 'memory'
+
+def engine_options(database_url):
+    """Pool arguments that are valid for the database behind database_url"""
+    if make_url(database_url).get_backend_name() != 'sqlite':
+        return {'pool_size': Config.DATABASE_POOL_SIZE, 'max_overflow': Config.DATABASE_MAX_OVERFLOW, 'pool_pre_ping': True}
+    if not is_sqlite_file(database_url):
+        # Each connection to :memory: is a separate database, so every session must share one
+        return {'poolclass': StaticPool, 'connect_args': {'check_same_thread': False}}
+    # File databases use a QueuePool, which accepts the configured sizes
+    return {'pool_size': Config.DATABASE_POOL_SIZE, 'max_overflow': Config.DATABASE_MAX_OVERFLOW}
+
+def sqlite_pragmas():
+    """PRAGMA statements run on every new connection to a SQLite database file"""
+    return [
+        f"PRAGMA journal_mode={Config.SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={Config.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA cache_size=-{Config.SQLITE_CACHE_SIZE_KB}",  # Negative values are KiB
+        f"PRAGMA mmap_size={Config.SQLITE_MMAP_SIZE}",
+        f"PRAGMA busy_timeout={Config.SQLITE_BUSY_TIMEOUT_MS}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+def get_engine(database_url):
+    """Return the process-wide engine for database_url, creating it on first use"""
+    with _engines_lock:
+        engine = _engines.get(database_url)
+        if engine is None:
+            engine = _engines[database_url] = create_engine(database_url, **engine_options(database_url))
+            if is_sqlite_file(database_url):
+                pragmas = sqlite_pragmas()  # Fixed when the engine is created
+                
+                @event.listens_for(engine, 'connect')
+                def apply_pragmas(dbapi_connection, connection_record):
+                    cursor = dbapi_connection.cursor()
+                    for pragma in pragmas:
+                        cursor.execute(pragma)
+                    cursor.close()
+        return engine
+
+def acquire_engine(database_url):
+    """Return the engine for database_url and count one more user of it"""
+    engine = get_engine(database_url)
+    with _engines_lock:
+        _engine_users[database_url] = _engine_users.get(database_url, 0) + 1
+    return engine
+
+def release_engine(database_url):
+    """Count one user of database_url's engine less, disposing the engine when it was the last"""
+    with _engines_lock:
+        users = _engine_users.get(database_url, 0) - 1
+        if users > 0:
+            _engine_users[database_url] = users
+            return
+        _engine_users.pop(database_url, None)
+    dispose_engine(database_url)
+
+def dispose_engine(database_url):
+    """Close the pooled connections of database_url and forget its engine, whoever still uses it"""
+    with _engines_lock:
+        engine = _engines.pop(database_url, None)
+        _engine_users.pop(database_url, None)
+        _initialized_urls.discard(database_url)
+    if engine is not None:
+        engine.dispose()
+
+class _ScopedSession:
+    """Session handed out inside session_scope(): commits only flush and close is deferred to the scope"""
+    
+    def __init__(self, session):
+        self._session = session
+    
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+    
+    @property
+    def failed(self):
+        return self._session.info.get('failed', False)
+    
+    @property
+    def transient(self):
+        """Whether the unit failed on a locked or dropped connection, so running it again may succeed"""
+        return isinstance(self._session.info.get('error'), OperationalError)
+    
+    def commit(self):
+        self._session.flush()
+    
+    def rollback(self):
+        self._session.rollback()
+        self._session.info['failed'] = True  # The unit's earlier work is gone too
+        if self._session.info.get('error') is None:
+            self._session.info['error'] = sys.exc_info()[1]  # Manager calls roll back while handling their error
+    
+    def close(self):
+        pass
 
 class DatabaseManager:
     """Handles database operations for the Data Redundancy Removal System"""
     
-    def __init__(self):
-        self.engine = create_engine(Config.DATABASE_URL, pool_size=Config.DATABASE_POOL_SIZE, max_overflow=Config.DATABASE_MAX_OVERFLOW)
-        self.Session = sessionmaker(bind=self.engine)
-        self.create_tables()
+    _shared = {}  # database URL -> manager returned by shared()
+    
+    def __init__(self, database_url=None):
+        self.database_url = database_url or Config.DATABASE_URL
+        self.engine = acquire_engine(self.database_url)
+        self._closed = False
+        self.Session = sessionmaker(bind=self.engine, expire_on_commit=False)
+        self._local = threading.local()
+        if self.database_url not in _initialized_urls:
+            if not self.schema_is_current():
+                self.create_tables()
+            _initialized_urls.add(self.database_url)
+        self._hash_cache = None
+        self._hash_cache_lock = threading.Lock()
+        self._fingerprints_complete = True  # Cleared by check_fingerprints while entries lack a lookup fingerprint
+        self._warm_thread = None
+        self._warm_pending = None  # (hash, id, type) of entries inserted while a warm-up reads the table
+        self.writer = SQLiteWriter(self) if Config.SQLITE_WRITER_THREAD and is_sqlite_file(self.database_url) else None
+        self.blob_codec = BlobCodec() if Config.BLOB_STORE else None
+    
+    @classmethod
+    def shared(cls, database_url=None):
+        """Return the process-wide manager (and hash cache) for database_url"""
+        database_url = database_url or Config.DATABASE_URL
+        manager = cls._shared.get(database_url)
+        if manager is None:
+            manager = cls._shared[database_url] = cls(database_url)
+        return manager
+    
+    def close(self):
+        """Stop the writer thread and release this manager's use of the shared engine
+        
+        The engine's pooled connections are closed once no open manager uses
+        it; dispose_engine() closes them regardless.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self._warm_thread is not None:
+            self._warm_thread.join()
+        if DatabaseManager._shared.get(self.database_url) is self:
+            del DatabaseManager._shared[self.database_url]
+        release_engine(self.database_url)
+    
+    @property
+    def hash_cache(self):
+        """Hash cache, waiting for its warm-up to finish (None when CACHE_SIZE is 0)"""
+        if self._hash_cache is None and Config.CACHE_SIZE > 0:
+            warm_thread = self._start_warming()
+            if warm_thread is not None:
+                warm_thread.join()
+        return self._hash_cache
+    
+    def _ready_hash_cache(self):
+        """Hash cache if it is warm, else None after starting the warm-up in the background
+        
+        Warming reads every stored hash into the Bloom filter, about a second
+        per 100,000 entries on SQLite, so lookups answer from the indexed
+        table until it is done instead of holding up the start.
+        """
+        if self._hash_cache is None and Config.CACHE_SIZE > 0:
+            self._start_warming()
+        return self._hash_cache
+    
+    def _start_warming(self):
+        """Start the hash cache warm-up once, returning its thread (None when it ran in this thread)"""
+        if isinstance(self.engine.pool, StaticPool):
+            # Every session shares the one connection, so closing a warm-up session on another
+            # thread would roll back work this thread has not committed yet
+            if self._hash_cache is None:
+                self.warm_hash_cache()
+            return None
+        with self._hash_cache_lock:
+            if self._warm_thread is None:
+                self._warm_thread = threading.Thread(target=self.warm_hash_cache, name='hash-cache-warmer', daemon=True)
+                self._warm_thread.start()
+            return self._warm_thread
+    
+    def schema_is_current(self):
+        """Whether the tables were created or upgraded for the current models, with one query"""
+        try:
+            with self.engine.connect() as connection:
+                stored = connection.execute(
+                    select(SchemaInfo.value).where(SchemaInfo.key == SCHEMA_VERSION_KEY)).scalar()
+        except SQLAlchemyError:
+            return False  # No schema_info table yet
+        return stored == schema_version()
     
     def create_tables(self):
         """Create database tables if they don't exist"""
         Base.metadata.create_all(self.engine)
+        self.upgrade_schema()
+        self.set_schema_info(SCHEMA_VERSION_KEY, schema_version())
+    
+    def upgrade_schema(self):
+        """Add nullable columns and indexes introduced after a table was first created
+        
+        Columns the models now allow to be NULL have their NOT NULL
+        constraint dropped; SQLite cannot alter a column, so there the table
+        is rebuilt and its rows copied over.
+        """
+        inspector = inspect(self.engine)
+        with self.engine.begin() as connection:
+            for table in Base.metadata.sorted_tables:
+                reflected = {column['name']: column for column in inspector.get_columns(table.name)}
+                existing_columns = set(reflected)
+                relaxed = [column.name for column in table.columns if column.name in reflected and column.nullable
+                           and not column.primary_key and not reflected[column.name]['nullable']]
+                if relaxed and self.engine.dialect.name == 'sqlite':
+                    self._rebuild_sqlite_table(connection, table, existing_columns)
+                    existing_columns = {column.name for column in table.columns}
+                else:
+                    for name in relaxed:
+                        connection.execute(text(f'ALTER TABLE {table.name} ALTER COLUMN {name} DROP NOT NULL'))
+                for column in table.columns:
+                    if column.name not in existing_columns:
+                        column_type = column.type.compile(dialect=self.engine.dialect)
+                        connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                with warnings.catch_warnings():
+                    # Reflection skips expression indexes, so those may already exist below
+                    warnings.filterwarnings('ignore', message='Skipped unsupported reflection of expression-based index')
+                    existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+                for index in table.indexes:
+                    if index.name not in existing_indexes:
+                        connection.execute(CreateIndex(index, if_not_exists=True))
+            # Logs written before data_content could be NULL marked blob-stored payloads with ''
+            connection.execute(update(ProcessingLog.__table__).where(
+                ProcessingLog.data_content == '',
+                ProcessingLog.content_hash.in_(select(ContentBlob.content_key))).values(data_content=None))
+    
+    def _rebuild_sqlite_table(self, connection, table, existing_columns):
+        """Recreate table from the models and copy its rows (and existing_columns) over"""
+        index_names = connection.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table AND sql IS NOT NULL"),
+            {'table': table.name}).scalars().all()
+        for index_name in index_names:
+            connection.execute(text(f'DROP INDEX {index_name}'))
+        connection.execute(text(f'ALTER TABLE {table.name} RENAME TO {table.name}_old'))
+        table.create(connection)
+        columns = ', '.join(column.name for column in table.columns if column.name in existing_columns)
+        connection.execute(text(f'INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {table.name}_old'))
+        connection.execute(text(f'DROP TABLE {table.name}_old'))
+    
+    def get_schema_info(self, key):
+        """Read a value from the schema_info table"""
+        session = self.get_session()
+        try:
+            info = session.get(SchemaInfo, key)
+            return info.value if info is not None else None
+        except SQLAlchemyError as e:
+            print(f"Error reading schema info: {e}")
+            return None
+        finally:
+            session.close()
+    
+    def set_schema_info(self, key, value):
+        """Write a value to the schema_info table"""
+        session = self.get_session()
+        try:
+            session.merge(SchemaInfo(key=key, value=value))
+            session.commit()
+        except SQLAlchemyError as e:
+            session.rollback()
+            print(f"Error writing schema info: {e}")
+        finally:
+            session.close()
+    
+    def check_fingerprints(self, algorithm):
+        """Check that stored hashes were written with algorithm, recording it for new tables
+        
+        Returns False (after printing a warning) when stored entries need
+        migrate_fingerprints. Until then, lookups use content_hash instead of
+        fingerprints that are missing.
+        """
+        session = self.get_session()
+        try:
+            has_entries = session.query(DataEntry.id).first() is not None
+            missing_fingerprints = Config.FINGERPRINT_LOOKUP_INDEX and session.query(DataEntry.id).filter(
+                DataEntry.content_fingerprint.is_(None)).first() is not None
+        except SQLAlchemyError as e:
+            print(f"Error checking fingerprints: {e}")
+            return False
+        finally:
+            session.close()
+        self._fingerprints_complete = not missing_fingerprints
+        
+        stored_algorithm = self.get_schema_info('hash_algorithm')
+        if stored_algorithm is None:
+            # Entries written before the algorithm was recorded were always md5
+            stored_algorithm = 'md5' if has_entries else algorithm
+            self.set_schema_info('hash_algorithm', stored_algorithm)
+        if stored_algorithm != algorithm:
+            print(f"Warning: stored entries use {stored_algorithm} but HASH_ALGORITHM is {algorithm}. "
+                  f"Hashing with {stored_algorithm} until 'python fingerprint.py migrate' rehashes them.")
+            return False
+        if missing_fingerprints:
+            print("Warning: some entries have no lookup fingerprint. Run 'python fingerprint.py migrate' to backfill them.")
+            return False
+        return True
+    
+    def migrate_fingerprints(self, fingerprinter):
+        """Rehash every stored entry with fingerprinter, committing one batch at a time
+        
+        Rerunning after an interruption is safe: already rehashed rows get the
+        same values again. Returns the number of entries processed.
+        """
+        migrated = 0
+        last_id = 0
+        while True:
+            session = self.get_session()
+            try:
+                rows = session.query(DataEntry.id, DataEntry.data_content, DataEntry.content_hash).filter(
+                    DataEntry.id > last_id).order_by(DataEntry.id).limit(Config.BATCH_SIZE).all()
+                if not rows:
+                    break
+                updates = []
+                relinks = []
+                for row in rows:
+                    content_hash = fingerprinter.hexdigest(row.data_content)
+                    if content_hash != row.content_hash:
+                        relinks.append({'old_hash': row.content_hash, 'new_hash': content_hash})
+                    updates.append({
+                        'id': row.id,
+                        'content_hash': content_hash,
+                        'content_fingerprint': to_int64(content_hash) if Config.FINGERPRINT_LOOKUP_INDEX else None,
+                        'canonical_hash': None,  # Recomputed with the new algorithm by the detector's backfill
+                    })
+                session.execute(update(DataEntry), updates)
+                if relinks:
+                    # Log rows without an inline payload read it through the entry's hash
+                    log_table = ProcessingLog.__table__
+                    session.execute(update(log_table).where(
+                        log_table.c.content_hash == bindparam('old_hash'), log_table.c.data_content.is_(None)
+                    ).values(content_hash=bindparam('new_hash')), relinks)
+                session.commit()
+            except SQLAlchemyError as e:
+                session.rollback()
+                print(f"Error migrating fingerprints: {e}")
+                return migrated
+            finally:
+                session.close()
+            migrated += len(rows)
+            last_id = rows[-1].id
+        
+        self.set_schema_info('hash_algorithm', fingerprinter.algorithm)
+        self._fingerprints_complete = True
+        if self._hash_cache is not None:
+            self.warm_hash_cache()
+        return migrated
     
     def get_session(self):
-        """Get a new database session"""
-        return self.Session()
+        """Get a new database session, or the current unit of work's session inside session_scope()"""
+        scoped = getattr(self._local, 'session', None)
+        return scoped if scoped is not None else self.Session()
+    
+    def in_session_scope(self):
+        return getattr(self._local, 'session', None) is not None
+    
+    @contextmanager
+    def session_scope(self):
+        """Run a unit of work on one session, connection and transaction
+        
+        Manager calls made inside the block share the unit's session, so their
+        commits only flush. The unit commits when the outermost scope exits,
+        or rolls back if the block raised or any call inside it failed;
+        check the yielded session's failed flag afterwards.
+        """
+        scoped = getattr(self._local, 'session', None)
+        if scoped is not None:
+            yield scoped
+            return
+        session = self.Session()
+        scoped = self._local.session = _ScopedSession(session)
+        callbacks = session.info['after_commit'] = []
+        try:
+            yield scoped
+            if scoped.failed:
+                session.rollback()
+            else:
+                session.commit()
+                for callback in callbacks:
+                    callback()
+        except SQLAlchemyError as e:
+            session.rollback()
+            session.info['failed'] = True
+            session.info['error'] = e
+            print(f"Error committing unit of work: {e}")
+        except BaseException:
+            session.rollback()
+            raise
+        finally:
+            self._local.session = None
+            session.close()
+    
+    def _detached(self, entry):
+        """entry itself, or inside session_scope() a plain copy that the unit's rollback cannot expire"""
+        if entry is None or not self.in_session_scope():
+            return entry
+        return DataEntry(**{column.key: getattr(entry, column.key) for column in DataEntry.__mapper__.column_attrs})
+    
+    def _after_commit(self, callback):
+        """Run callback once the current unit of work commits, or now outside session_scope()"""
+        scoped = getattr(self._local, 'session', None)
+        if scoped is None:
+            callback()
+        else:
+            scoped.info['after_commit'].append(callback)
+    
+    def warm_hash_cache(self):
+        """(Re)build the hash cache from data_entries
+        
+        The most recent CACHE_SIZE entries are preloaded. With SINGLE_WRITER
+        every stored hash also goes into the Bloom filter, and the cache
+        assumes this manager sees every insert into the table; inserts
+        reported while the table is read are replayed into the new cache
+        before it replaces the old one. Without it only the preloaded
+        entries are read.
+        """
+        with self._hash_cache_lock:
+            self._warm_pending = []
+        session = self.get_session()
+        try:
+            total = session.query(func.count(DataEntry.id)).scalar() if Config.SINGLE_WRITER else 0
+            cache = HashCache(Config.CACHE_SIZE, bloom_capacity=max(2 * total, Config.CACHE_SIZE),
+                              false_positive_rate=Config.BLOOM_FALSE_POSITIVE_RATE, trust_negatives=Config.SINGLE_WRITER)
+            previous = self._hash_cache
+            if previous is not None:
+                cache.hits, cache.misses, cache.bloom_rejections = previous.hits, previous.misses, previous.bloom_rejections
+            rows = session.query(DataEntry.content_hash, DataEntry.id, DataEntry.data_type)
+            if Config.SINGLE_WRITER:
+                first_cached = max(total - Config.CACHE_SIZE, 0)
+                rows = rows.order_by(DataEntry.id).yield_per(Config.BATCH_SIZE)
+            else:
+                first_cached = 0
+                rows = reversed(rows.order_by(DataEntry.id.desc()).limit(Config.CACHE_SIZE).all())
+            for position, (content_hash, entry_id, data_type) in enumerate(rows):
+                cache.bloom.add(content_hash)
+                if position >= first_cached:
+                    cache.put(content_hash, (entry_id, data_type))
+            with self._hash_cache_lock:
+                for content_hash, entry_id, data_type in self._warm_pending:
+                    cache.add(content_hash, entry_id, data_type)
+                self._warm_pending = None
+                self._hash_cache = cache
+        except SQLAlchemyError as e:
+            print(f"Error warming hash cache: {e}")
+            with self._hash_cache_lock:
+                self._warm_pending = None
+                self._hash_cache = None
+        finally:
+            session.close()
+    
+    def _cache_new_entries(self, entries):
+        """Invalidate cached answers for newly inserted entries"""
+        with self._hash_cache_lock:
+            if self._warm_pending is not None:
+                self._warm_pending.extend((entry.content_hash, entry.id, entry.data_type) for entry in entries)
+            cache = self._hash_cache
+        if cache is None:
+            return  # Entries are already in the table a later warm-up reads
+        for entry in entries:
+            cache.add(entry.content_hash, entry.id, entry.data_type)
+        if cache.trust_negatives and cache.bloom.is_saturated():
+            self.warm_hash_cache()  # Regrow the Bloom filter before false positives pile up
+    
+    def _query_entry_keys(self, content_hashes):
+        """Look up {content_hash: (entry id, data type)} in the database with one query
+        
+        With FINGERPRINT_LOOKUP_INDEX the query goes through the integer
+        fingerprint index and the full hash is checked on the returned rows.
+        content_hash keeps its unique index either way, so the option trades
+        extra space for faster probes.
+        """
+        session = self.get_session()
+        try:
+            query = session.query(DataEntry.content_hash, DataEntry.id, DataEntry.data_type)
+            if Config.FINGERPRINT_LOOKUP_INDEX and self._fingerprints_complete:
+                fingerprints = {to_int64(content_hash) for content_hash in content_hashes}
+                query = query.filter(DataEntry.content_fingerprint.in_(fingerprints))
+            else:
+                query = query.filter(DataEntry.content_hash.in_(content_hashes))
+            wanted = set(content_hashes)
+            return {row.content_hash: (row.id, row.data_type) for row in query.all() if row.content_hash in wanted}
+        except SQLAlchemyError as e:
+            print(f"Error retrieving data entries: {e}")
+            return {}
+        finally:
+            session.close()
+    
+    def find_entry_key(self, content_hash):
+        """Return (entry id, data type) for a content hash, or None, serving from the cache when possible"""
+        cache = self._ready_hash_cache()
+        if cache is not None:
+            cached = cache.lookup(content_hash)
+            if cached is not MISS:
+                return cached
+        key = self._query_entry_keys([content_hash]).get(content_hash)
+        if cache is not None:
+            cache.put(content_hash, key)
+        return key
     
-    def add_data_entry(self, data_content, data_type, content_hash):
-        """Add a new data entry to the database"""
+    def find_entry_keys(self, content_hashes):
+        """Return {content_hash: (entry id, data type)} for the stored hashes, with one IN query for cache misses"""
+        cache = self._ready_hash_cache()
+        keys = {}
+        uncached = []
+        for content_hash in content_hashes:
+            cached = cache.lookup(content_hash) if cache is not None else MISS
+            if cached is MISS:
+                uncached.append(content_hash)
+            elif cached is not None:
+                keys[content_hash] = cached
+        if not uncached:
+            return keys
+        found = self._query_entry_keys(uncached)
+        keys.update(found)
+        if cache is not None:
+            for content_hash in uncached:
+                cache.put(content_hash, found.get(content_hash))
+        return keys
+    
+    def add_data_entry(self, data_content, data_type, content_hash, similarity_score=0.0, minhash_signature=None, bucket_keys=None,
+                       canonical_hash=None):
+        """Add a new data entry to the database, with its LSH buckets when bucket_keys is given"""
+        if self._uses_writer():
+            new_entries = self.add_data_entries([{
+                'data_content': data_content, 'data_type': data_type, 'content_hash': content_hash,
+                'similarity_score': similarity_score, 'minhash_signature': minhash_signature, 'bucket_keys': bucket_keys,
+                'canonical_hash': canonical_hash,
+            }])
+            return new_entries[0] if new_entries else None
         session = self.get_session()
         try:
-            new_entry = DataEntry(data_content=data_content, data_type=data_type, content_hash=content_hash)
+            new_entry = DataEntry(data_content=data_content, data_type=data_type, content_hash=content_hash,
+                                  content_fingerprint=to_int64(content_hash) if Config.FINGERPRINT_LOOKUP_INDEX else None,
+                                  similarity_score=similarity_score, minhash_signature=minhash_signature,
+                                  canonical_hash=canonical_hash)
             session.add(new_entry)
+            if bucket_keys:
+                session.flush()
+                session.add_all(MinHashBucket(entry_id=new_entry.id, bucket_key=key) for key in bucket_keys)
             session.commit()
             # Refresh the object to ensure it's fully loaded
             session.refresh(new_entry)
+            self._after_commit(lambda: self._cache_new_entries([new_entry]))
             return new_entry
         except SQLAlchemyError as e:
             session.rollback()
@@ -48,20 +592,343 @@ class DatabaseManager:
         finally:
             session.close()
     
+    def add_data_entries(self, rows):
+        """Insert many data entries with one bulk insert and commit, retrying transient errors
+        
+        rows is a list of dicts with data_content, data_type and content_hash keys,
+        plus optional DataEntry columns and a bucket_keys list of LSH bucket keys.
+        Returns the new entries in the same order, or None if the batch failed.
+        Outside a unit of work, rows whose hash another writer stored after it
+        was looked up are skipped and come back as None. Inside one, a failure
+        has already rolled the whole unit back, so retrying is left to the
+        unit's owner (see the unit's transient flag).
+        """
+        if not rows:
+            return []
+        attempts = 1 if self.in_session_scope() else Config.MAX_BATCH_RETRIES
+        for attempt in range(1, attempts + 1):
+            try:
+                new_entries = self._write_entries(rows)
+                self._after_commit(lambda: self._cache_new_entries(new_entries))
+                return new_entries
+            except IntegrityError as e:
+                stored = {} if self.in_session_scope() else self._query_entry_keys([row['content_hash'] for row in rows])
+                if not stored:
+                    print(f"Error adding data entries: {e}")
+                    return None
+                # Another writer stored some of these hashes since they were looked up; insert the rest
+                remaining = self.add_data_entries([row for row in rows if row['content_hash'] not in stored])
+                if remaining is None:
+                    return None
+                remaining = iter(remaining)
+                return [None if row['content_hash'] in stored else next(remaining) for row in rows]
+            except OperationalError as e:
+                if self.in_session_scope():
+                    print(f"Error adding data entries: {e}")
+                    return None
+                # Locked or dropped connections are transient; back off and retry
+                print(f"Error adding data entries (attempt {attempt}/{attempts}): {e}")
+                if attempt < attempts:
+                    time.sleep(0.1 * attempt)
+            except SQLAlchemyError as e:
+                print(f"Error adding data entries: {e}")
+                return None
+        return None
+    
+    def _uses_writer(self):
+        """Whether inserts go through the group-commit writer thread"""
+        return self.writer is not None and not self.in_session_scope()
+    
+    def _write_entries(self, rows):
+        """Insert and commit rows, through the writer thread when it is running"""
+        if self._uses_writer():
+            return self.writer.submit(rows).result()
+        session = self.get_session()
+        try:
+            new_entries = self._insert_entries(session, rows)
+            session.commit()
+            return new_entries
+        except SQLAlchemyError:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+    
+    def _insert_entries(self, session, rows):
+        """Bulk insert rows and their LSH buckets in session's transaction without committing"""
+        bucket_keys = [row.get('bucket_keys') for row in rows]
+        rows = [{key: value for key, value in row.items() if key != 'bucket_keys'} for row in rows]
+        if Config.FINGERPRINT_LOOKUP_INDEX:
+            rows = [dict(row, content_fingerprint=to_int64(row['content_hash'])) for row in rows]
+        new_entries = session.scalars(
+            insert(DataEntry).returning(DataEntry, sort_by_parameter_order=True),
+            rows,
+        ).all()
+        bucket_rows = [{'entry_id': entry.id, 'bucket_key': key}
+                       for entry, keys in zip(new_entries, bucket_keys) if keys for key in keys]
+        if bucket_rows:
+            session.execute(insert(MinHashBucket), bucket_rows)
+        return new_entries
+    
+    def find_canonical_entries(self, canonical_hashes):
+        """Return {canonical_hash: lowest entry id} for the stored canonical hashes with one IN query"""
+        canonical_hashes = list(canonical_hashes)
+        if not canonical_hashes:
+            return {}
+        session = self.get_session()
+        try:
+            rows = session.query(DataEntry.canonical_hash, func.min(DataEntry.id)).filter(
+                DataEntry.canonical_hash.in_(canonical_hashes)).group_by(DataEntry.canonical_hash).all()
+            return {canonical_hash: entry_id for canonical_hash, entry_id in rows}
+        except SQLAlchemyError as e:
+            print(f"Error retrieving canonical hashes: {e}")
+            return {}
+        finally:
+            session.close()
+    
+    def get_uncanonicalized_entries(self, after_id=0, limit=None):
+        """Return (id, data_content, data_type) of entries that have no canonical hash yet"""
+        session = self.get_session()
+        try:
+            return session.query(DataEntry.id, DataEntry.data_content, DataEntry.data_type).filter(
+                DataEntry.id > after_id, DataEntry.canonical_hash.is_(None),
+            ).order_by(DataEntry.id).limit(limit or Config.BATCH_SIZE).all()
+        except SQLAlchemyError as e:
+            print(f"Error retrieving entries without canonical hashes: {e}")
+            return []
+        finally:
+            session.close()
+    
+    def store_canonical_hashes(self, canonical_hashes):
+        """Persist canonical hashes for existing entries: [(entry id, canonical hash)]"""
+        if not canonical_hashes:
+            return
+        session = self.get_session()
+        try:
+            session.execute(update(DataEntry), [{'id': entry_id, 'canonical_hash': canonical_hash}
+                                                for entry_id, canonical_hash in canonical_hashes])
+            session.commit()
+        except SQLAlchemyError as e:
+            session.rollback()
+            print(f"Error storing canonical hashes: {e}")
+        finally:
+            session.close()
+    
+    def find_minhash_buckets(self, bucket_keys):
+        """Return {bucket_key: [entry ids]} for the given LSH bucket keys with one IN query"""
+        bucket_keys = list(bucket_keys)
+        if not bucket_keys:
+            return {}
+        session = self.get_session()
+        try:
+            rows = session.query(MinHashBucket.bucket_key, MinHashBucket.entry_id).filter(
+                MinHashBucket.bucket_key.in_(bucket_keys)).all()
+        except SQLAlchemyError as e:
+            print(f"Error retrieving minhash buckets: {e}")
+            return {}
+        finally:
+            session.close()
+        buckets = {}
+        for bucket_key, entry_id in rows:
+            buckets.setdefault(bucket_key, []).append(entry_id)
+        return buckets
+    
+    def get_minhash_signatures(self, entry_ids):
+        """Return {entry id: (signature bytes, data type)} for the given entries that are signed"""
+        entry_ids = list(entry_ids)
+        if not entry_ids:
+            return {}
+        session = self.get_session()
+        try:
+            rows = session.query(DataEntry.id, DataEntry.minhash_signature, DataEntry.data_type).filter(
+                DataEntry.id.in_(entry_ids), DataEntry.minhash_signature.isnot(None)).all()
+            return {entry_id: (signature, data_type) for entry_id, signature, data_type in rows}
+        except SQLAlchemyError as e:
+            print(f"Error retrieving minhash signatures: {e}")
+            return {}
+        finally:
+            session.close()
+    
+    def get_unsigned_entries(self, data_types, min_length, after_id=0, limit=None):
+        """Return (id, data_content) of entries eligible for MinHash that have no signature yet"""
+        session = self.get_session()
+        try:
+            return session.query(DataEntry.id, DataEntry.data_content).filter(
+                DataEntry.id > after_id,
+                DataEntry.minhash_signature.is_(None),
+                func.lower(DataEntry.data_type).in_(data_types),
+                func.length(DataEntry.data_content) >= min_length,
+            ).order_by(DataEntry.id).limit(limit or Config.BATCH_SIZE).all()
+        except SQLAlchemyError as e:
+            print(f"Error retrieving unsigned entries: {e}")
+            return []
+        finally:
+            session.close()
+    
+    def store_minhash_signatures(self, signed_entries):
+        """Persist signatures and LSH buckets for existing entries: [(entry id, signature bytes, bucket keys)]"""
+        if not signed_entries:
+            return
+        session = self.get_session()
+        try:
+            session.execute(update(DataEntry), [{'id': entry_id, 'minhash_signature': signature}
+                                                for entry_id, signature, _ in signed_entries])
+            session.execute(insert(MinHashBucket), [{'entry_id': entry_id, 'bucket_key': key}
+                                                    for entry_id, _, keys in signed_entries for key in keys])
+            session.commit()
+        except SQLAlchemyError as e:
+            session.rollback()
+            print(f"Error storing minhash signatures: {e}")
+        finally:
+            session.close()
+    
+    def get_canonical_groups(self, after_hash=None, limit=None):
+        """Return [(canonical_hash, [ids])] for up to limit hashes shared by unmarked entries, in hash order"""
+        session = self.get_session()
+        try:
+            unmarked = DataEntry.is_redundant.isnot(True)
+            shared = select(DataEntry.canonical_hash).where(DataEntry.canonical_hash.isnot(None), unmarked)
+            if after_hash is not None:
+                shared = shared.where(DataEntry.canonical_hash > after_hash)
+            shared = shared.group_by(DataEntry.canonical_hash).having(func.count(DataEntry.id) > 1).order_by(
+                DataEntry.canonical_hash).limit(limit or Config.BATCH_SIZE)
+            rows = session.query(DataEntry.canonical_hash, DataEntry.id).filter(
+                DataEntry.canonical_hash.in_(shared), unmarked).order_by(DataEntry.canonical_hash, DataEntry.id).all()
+        except SQLAlchemyError as e:
+            print(f"Error retrieving canonical groups: {e}")
+            return []
+        finally:
+            session.close()
+        groups = []
+        for canonical_hash, entry_id in rows:
+            if not groups or groups[-1][0] != canonical_hash:
+                groups.append((canonical_hash, []))
+            groups[-1][1].append(entry_id)
+        return groups
+    
+    def get_next_content_length(self, after_length=-1):
+        """Smallest content length above after_length among unmarked entries, or None"""
+        session = self.get_session()
+        try:
+            return session.query(func.min(func.length(DataEntry.data_content))).filter(
+                func.length(DataEntry.data_content) > after_length, DataEntry.is_redundant.isnot(True)).scalar()
+        except SQLAlchemyError as e:
+            print(f"Error retrieving content lengths: {e}")
+            return None
+        finally:
+            session.close()
+    
+    def get_entries_of_length(self, length, after_id=0, limit=None):
+        """Return (id, data_content, data_type) of unmarked entries with content of the given length, in id order"""
+        session = self.get_session()
+        try:
+            return session.query(DataEntry.id, DataEntry.data_content, DataEntry.data_type).filter(
+                func.length(DataEntry.data_content) == length, DataEntry.id > after_id, DataEntry.is_redundant.isnot(True),
+            ).order_by(DataEntry.id).limit(limit or Config.BATCH_SIZE).all()
+        except SQLAlchemyError as e:
+            print(f"Error retrieving entries by length: {e}")
+            return []
+        finally:
+            session.close()
+    
+    def get_shared_buckets(self, after_key=None, limit=None):
+        """Return [(bucket_key, [entry ids])] for up to limit LSH buckets holding several unmarked entries"""
+        session = self.get_session()
+        try:
+            shared = select(MinHashBucket.bucket_key)
+            if after_key is not None:
+                shared = shared.where(MinHashBucket.bucket_key > after_key)
+            shared = shared.group_by(MinHashBucket.bucket_key).having(func.count(MinHashBucket.id) > 1).order_by(
+                MinHashBucket.bucket_key).limit(limit or Config.BATCH_SIZE)
+            keys = session.execute(shared).scalars().all()
+            if not keys:
+                return []
+            rows = session.query(MinHashBucket.bucket_key, MinHashBucket.entry_id).join(
+                DataEntry, DataEntry.id == MinHashBucket.entry_id).filter(
+                MinHashBucket.bucket_key.in_(keys), DataEntry.is_redundant.isnot(True)).order_by(
+                MinHashBucket.bucket_key, MinHashBucket.entry_id).all()
+        except SQLAlchemyError as e:
+            print(f"Error retrieving minhash buckets: {e}")
+            return []
+        finally:
+            session.close()
+        members = {}
+        for bucket_key, entry_id in rows:
+            members.setdefault(bucket_key, []).append(entry_id)
+        # Keys whose entries are all marked still advance the caller's position
+        return [(bucket_key, members.get(bucket_key, [])) for bucket_key in keys]
+    
+    def get_entries_with_bucket_at_most(self, entry_ids, max_key):
+        """Return the ids among entry_ids that have an LSH bucket key <= max_key"""
+        if not entry_ids:
+            return set()
+        session = self.get_session()
+        try:
+            return {entry_id for (entry_id,) in session.query(MinHashBucket.entry_id).filter(
+                MinHashBucket.entry_id.in_(list(entry_ids)), MinHashBucket.bucket_key <= max_key).distinct()}
+        except SQLAlchemyError as e:
+            print(f"Error retrieving minhash buckets: {e}")
+            return set()
+        finally:
+            session.close()
+    
+    def mark_redundant(self, marks):
+        """Flag stored entries as redundant: [(entry id, similarity score)]; returns True on success"""
+        if not marks:
+            return True
+        session = self.get_session()
+        try:
+            session.execute(update(DataEntry), [{'id': entry_id, 'is_redundant': True, 'similarity_score': score}
+                                                for entry_id, score in marks])
+            session.commit()
+            return True
+        except SQLAlchemyError as e:
+            session.rollback()
+            print(f"Error marking redundant entries: {e}")
+            return False
+        finally:
+            session.close()
+    
+    def get_data_entries_by_ids(self, entry_ids):
+        """Retrieve the data entries with any of the given ids, keyed by id"""
+        entry_ids = list(entry_ids)
+        if not entry_ids:
+            return {}
+        session = self.get_session()
+        try:
+            entries = session.query(DataEntry).filter(DataEntry.id.in_(entry_ids)).all()
+            return {entry.id: self._detached(entry) for entry in entries}
+        except SQLAlchemyError as e:
+            print(f"Error retrieving data entries: {e}")
+            return {}
+        finally:
+            session.close()
+    
+    def get_data_entry_by_id(self, entry_id):
+        """Retrieve a data entry by its primary key"""
+        session = self.get_session()
+        try:
+            return self._detached(session.get(DataEntry, entry_id))
+        except SQLAlchemyError as e:
+            print(f"Error retrieving data entry: {e}")
+            return None
+        finally:
+            session.close()
+    
     def log_processing(self, operation_type, data_content, data_type, content_hash, similarity_score, is_redundant, is_false_positive):
         """Log a processing operation"""
         session = self.get_session()
         try:
-            log_entry = ProcessingLog(
-                operation_type=operation_type,
-                data_content=data_content,
-                data_type=data_type,
-                content_hash=content_hash,
-                similarity_score=similarity_score,
-                is_redundant=is_redundant,
-                is_false_positive=is_false_positive
-            )
-            session.add(log_entry)
+            log_row = {
+                'operation_type': operation_type,
+                'data_content': data_content,
+                'data_type': data_type,
+                'content_hash': content_hash,
+                'similarity_score': similarity_score,
+                'is_redundant': is_redundant,
+                'is_false_positive': is_false_positive,
+            }
+            session.add(ProcessingLog(**self._store_log_payloads(session, [log_row])[0]))
             session.commit()
         except SQLAlchemyError as e:
             session.rollback()
@@ -69,6 +936,140 @@ class DatabaseManager:
         finally:
             session.close()
     
+    def write_metrics(self, metric_rows, log_rows):
+        """Insert SystemMetrics and ProcessingLog rows in one transaction; returns True on success"""
+        session = self.get_session()
+        try:
+            if metric_rows:
+                session.execute(insert(SystemMetrics), metric_rows)
+            if log_rows:
+                session.execute(insert(ProcessingLog), self._store_log_payloads(session, log_rows))
+            session.commit()
+            return True
+        except SQLAlchemyError as e:
+            session.rollback()
+            print(f"Error writing metrics: {e}")
+            return False
+        finally:
+            session.close()
+    
+    def _store_log_payloads(self, session, log_rows):
+        """Store each ProcessingLog payload of at least BLOB_MIN_BYTES once, returning the rows to insert
+        
+        A payload whose content_hash belongs to a stored entry is read back
+        from data_entries; the rest go to content_blobs keyed by content_hash.
+        Either way the row's data_content is NULL, in copies of the rows (the
+        caller's rows are left as they are for retries). Shorter payloads cost
+        less inline than the key, and without BLOB_STORE every payload stays
+        inline.
+        """
+        if self.blob_codec is None:
+            return log_rows
+        payloads = {row['content_hash']: str(row['data_content']) for row in log_rows
+                    if len(str(row['data_content']).encode('utf-8')) >= Config.BLOB_MIN_BYTES}
+        if not payloads:
+            return log_rows
+        stored = {content_hash for (content_hash,) in session.query(DataEntry.content_hash).filter(
+            DataEntry.content_hash.in_(list(payloads)))}
+        blob_rows = []
+        for content_key, data_content in payloads.items():
+            if content_key not in stored:
+                codec, payload, size = self.blob_codec.encode(data_content)
+                blob_rows.append({'content_key': content_key, 'codec': codec, 'size': size, 'payload': payload})
+        if blob_rows:
+            self._insert_blobs(session, blob_rows)
+        return [dict(row, data_content=None) if row['content_hash'] in payloads else row for row in log_rows]
+    
+    def _insert_blobs(self, session, blob_rows):
+        """Insert ContentBlob rows, skipping keys another writer stored first"""
+        dialect = session.get_bind().dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            upsert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+            session.execute(upsert(ContentBlob).on_conflict_do_nothing(index_elements=['content_key']), blob_rows)
+            return
+        stored = {content_key for (content_key,) in session.query(ContentBlob.content_key).filter(
+            ContentBlob.content_key.in_([row['content_key'] for row in blob_rows]))}
+        blob_rows = [row for row in blob_rows if row['content_key'] not in stored]
+        if blob_rows:
+            session.execute(insert(ContentBlob), blob_rows)
+    
+    def get_processing_logs(self, after_id=0, limit=None):
+        """Return ProcessingLog rows with id > after_id in id order, without reading blob-stored payloads
+        
+        Payloads stored once under their content_hash show as data_content
+        None; get_log_contents() reads them when they are needed.
+        """
+        session = self.get_session()
+        try:
+            query = session.query(ProcessingLog).filter(ProcessingLog.id > after_id).order_by(ProcessingLog.id)
+            return query.limit(limit).all() if limit else query.all()
+        except SQLAlchemyError as e:
+            print(f"Error retrieving processing logs: {e}")
+            return []
+        finally:
+            session.close()
+    
+    def get_log_contents(self, logs):
+        """Return {log id: payload} for ProcessingLog rows, resolving payloads stored by content_hash"""
+        content_hashes = {log.content_hash for log in logs if log.data_content is None}
+        payloads = self.get_entry_contents(content_hashes)
+        payloads.update(self.get_payloads(content_hashes - payloads.keys()))
+        return {log.id: payloads.get(log.content_hash, '') if log.data_content is None else log.data_content for log in logs}
+    
+    def get_entry_contents(self, content_hashes):
+        """Return {content_hash: data_content} for the content_hashes of stored entries"""
+        if not content_hashes:
+            return {}
+        session = self.get_session()
+        try:
+            return dict(session.query(DataEntry.content_hash, DataEntry.data_content).filter(
+                DataEntry.content_hash.in_(list(content_hashes))).all())
+        except SQLAlchemyError as e:
+            print(f"Error retrieving entry contents: {e}")
+            return {}
+        finally:
+            session.close()
+    
+    def get_payloads(self, content_keys):
+        """Return {content_key: text} for the content_keys stored in content_blobs"""
+        if not content_keys:
+            return {}
+        session = self.get_session()
+        try:
+            rows = session.query(ContentBlob.content_key, ContentBlob.codec, ContentBlob.payload).filter(
+                ContentBlob.content_key.in_(list(content_keys))).all()
+            return {content_key: decode_payload(codec, payload) for content_key, codec, payload in rows}
+        except SQLAlchemyError as e:
+            print(f"Error retrieving content blobs: {e}")
+            return {}
+        finally:
+            session.close()
+    
+    def get_blob_totals(self):
+        """Return (blob count, UTF-8 bytes, stored bytes) over content_blobs"""
+        session = self.get_session()
+        try:
+            count, size, stored = session.query(func.count(ContentBlob.content_key), func.sum(ContentBlob.size),
+                                                func.sum(func.length(ContentBlob.payload))).one()
+            return count, size or 0, stored or 0
+        except SQLAlchemyError as e:
+            print(f"Error retrieving content blob totals: {e}")
+            return 0, 0, 0
+        finally:
+            session.close()
+    
+    def get_metric_totals(self):
+        """Return (metric_name, data_type, summed value) for every SystemMetrics series"""
+        session = self.get_session()
+        try:
+            return session.query(SystemMetrics.metric_name, SystemMetrics.data_type, func.sum(SystemMetrics.metric_value)).group_by(
+                SystemMetrics.metric_name, SystemMetrics.data_type).all()
+        except SQLAlchemyError as e:
+            print(f"Error retrieving metrics: {e}")
+            return []
+        finally:
+            session.close()
+    
     def get_all_data_entries(self):
         """Retrieve all data entries"""
         session = self.get_session()
@@ -79,3 +1080,44 @@ class DatabaseManager:
             return []
         finally:
             session.close()
+    
+    def get_data_types(self):
+        """Return the distinct data types of stored entries"""
+        session = self.get_session()
+        try:
+            return [data_type for data_type, in session.query(DataEntry.data_type).distinct()]
+        except SQLAlchemyError as e:
+            print(f"Error retrieving data types: {e}")
+            return []
+        finally:
+            session.close()
+    
+    def iter_data_entries(self, batch_size=None, data_type=None):
+        """Stream every data entry (of data_type, if given) in id order, fetching batch_size rows at a time"""
+        session = self.get_session()
+        try:
+            query = session.query(DataEntry)
+            if data_type is not None:
+                query = query.filter(DataEntry.data_type == data_type)
+            yield from query.order_by(DataEntry.id).yield_per(batch_size or Config.BATCH_SIZE)
+        except SQLAlchemyError as e:
+            print(f"Error streaming data entries: {e}")
+        finally:
+            session.close()
+    
+    def iter_entry_contents(self, batch_size=None, data_type=None):
+        """Stream (id, data_content) rows in id order without building ORM objects
+        
+        With data_type, only entries of that type are read, through idx_data_type.
+        """
+        session = self.get_session()
+        try:
+            query = session.query(DataEntry.id, DataEntry.data_content)
+            if data_type is not None:
+                query = query.filter(DataEntry.data_type == data_type)
+            for entry_id, data_content in query.order_by(DataEntry.id).yield_per(batch_size or Config.BATCH_SIZE):
+                yield entry_id, data_content
+        except SQLAlchemyError as e:
+            print(f"Error streaming data entries: {e}")
+        finally:
+            session.close()
@@ -0,0 +1,144 @@
+from collections import Counter
+import numpy as np
+try:
+    from Levenshtein import distance as levenshtein_distance
+    LEVENSHTEIN_AVAILABLE = True
+except ImportError:
+    LEVENSHTEIN_AVAILABLE = False
+
+SIGNATURE_BITS = 64
+# Popcount of every byte, for counting signature bits eight at a time
+_BYTE_POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+def char_signature(content):
+    """64-bit mask of the characters in content (code point modulo 64)"""
+    signature = 0
+    for char in set(content):
+        signature |= 1 << (ord(char) % SIGNATURE_BITS)
+    return signature
+
+def signature_bound(signature, other_signature):
+    """Lower bound on the edit distance of two strings from their char_signature values
+    
+    Every character present in one string and absent from the other needs
+    at least one edit, and one substitution can remove one such character
+    and introduce one. Characters sharing a bit only lower the count, so
+    the bound stays valid.
+    """
+    return max(bin(signature & ~other_signature).count('1'), bin(other_signature & ~signature).count('1'))
+
+def _popcount(values):
+    """Set bits of each uint64 in values"""
+    return _BYTE_POPCOUNT[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+def signature_bounds(signature, signatures):
+    """signature_bound of one signature against a uint64 array of signatures"""
+    signature = np.uint64(signature)
+    return np.maximum(_popcount(signatures & ~signature), _popcount(~signatures & signature))
+
+def histogram_bound(content, other_content):
+    """Lower bound on the edit distance from character counts (tighter but slower than signature_bound)"""
+    counts, other_counts = Counter(content), Counter(other_content)
+    return max(sum((counts - other_counts).values()), sum((other_counts - counts).values()))
+
+def banded_distance(content, other_content, max_distance):
+    """Levenshtein distance, or max_distance + 1 once it is known to exceed max_distance
+    
+    Ukkonen's cut-off: only cells within max_distance of the diagonal can
+    hold a value <= max_distance, so each row computes that band alone and
+    the scan stops as soon as a whole row exceeds the limit.
+    """
+    if len(content) > len(other_content):
+        content, other_content = other_content, content
+    length, other_length = len(content), len(other_content)
+    limit = max_distance + 1
+    if other_length - length > max_distance:
+        return limit
+    previous = [min(j, limit) for j in range(other_length + 1)]
+    for i in range(1, length + 1):
+        char = content[i - 1]
+        current = [limit] * (other_length + 1)
+        current[0] = min(i, limit)
+        best = current[0]
+        for j in range(max(1, i - max_distance), min(other_length, i + max_distance) + 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other_content[j - 1]), limit)
+            current[j] = value
+            if value < best:
+                best = value
+        if best >= limit:
+            return limit
+        previous = current
+    return previous[other_length]
+
+class BoundedDistance:
+    """Answers "is the edit distance at most max_distance?" without computing larger distances
+    
+    Pairs are rejected by length difference and character signature first;
+    the remaining ones run an early-exit kernel, the C Levenshtein kernel
+    with score_cutoff when python-Levenshtein is installed and
+    banded_distance otherwise. Every check is a lower bound or an exact
+    cut-off, so the verdicts are identical to comparing full distances.
+    """
+    
+    def __init__(self, max_distance):
+        self.max_distance = max_distance
+        if LEVENSHTEIN_AVAILABLE:
+            self.kernel = lambda content, other_content: levenshtein_distance(content, other_content,
+                                                                            score_cutoff=max_distance)
+        else:
+            # The pure-Python kernel costs far more than the character bound, so filter with it first
+            self.kernel = self._filtered_banded_distance
+    
+    def _filtered_banded_distance(self, content, other_content):
+        if histogram_bound(content, other_content) > self.max_distance:
+            return self.max_distance + 1
+        return banded_distance(content, other_content, self.max_distance)
+    
+    def distance(self, content, other_content):
+        """Edit distance, capped at max_distance + 1"""
+        if abs(len(content) - len(other_content)) > self.max_distance:
+            return self.max_distance + 1
+        return min(self.kernel(content, other_content), self.max_distance + 1)
+    
+    def within(self, content, other_content):
+        return self.distance(content, other_content) <= self.max_distance
+    
+    def distances(self, content, candidates, lengths=None, signatures=None):
+        """Capped distances from content to each candidate, as an int array
+        
+        lengths and signatures may hold the candidates' lengths and
+        char_signature values (int64/uint64 arrays) when the caller keeps
+        them; see survivors.
+        """
+        limit = self.max_distance + 1
+        result = np.full(len(candidates), limit, dtype=np.int64)
+        for position in self.survivors(content, self._lengths(candidates, lengths), signatures).tolist():
+            result[position] = min(self.kernel(content, candidates[position]), limit)
+        return result
+    
+    def first_within(self, content, candidates, lengths=None, signatures=None):
+        """Position of the first candidate within max_distance of content, or None"""
+        for position in self.survivors(content, self._lengths(candidates, lengths), signatures).tolist():
+            if self.kernel(content, candidates[position]) <= self.max_distance:
+                return position
+        return None
+    
+    def _lengths(self, candidates, lengths):
+        if lengths is None:
+            return np.fromiter(map(len, candidates), dtype=np.int64, count=len(candidates))
+        return lengths
+    
+    def survivors(self, content, lengths=None, signatures=None):
+        """Positions, ascending, of candidates the length and signature bounds cannot rule out
+        
+        Pass lengths=None when candidates are already known to be within the
+        length window. Signatures are only worth checking when they were
+        computed ahead of time: computing one costs more than a C kernel call.
+        """
+        if lengths is None:
+            survivors = np.arange(len(signatures))
+        else:
+            survivors = np.flatnonzero(np.abs(lengths - len(content)) <= self.max_distance)
+        if signatures is not None and len(survivors):
+            survivors = survivors[signature_bounds(char_signature(content), signatures[survivors]) <= self.max_distance]
+        return survivors
@@ -0,0 +1,135 @@
+import argparse
+import hashlib
+import os
+import random
+import sqlite3
+import string
+import tempfile
+import time
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+from config import Config
+
+def _hashlib_digest(name, **kwargs):
+    """Build a hex digest function around a hashlib constructor"""
+    constructor = getattr(hashlib, name)
+    return lambda data: constructor(data, **kwargs).hexdigest()
+
+# Algorithm name -> function from bytes to a hex digest of at most 64 characters
+FINGERPRINT_ALGORITHMS = {
+    'md5': _hashlib_digest('md5'),
+    'sha1': _hashlib_digest('sha1'),
+    'sha256': _hashlib_digest('sha256'),
+    'blake2b': _hashlib_digest('blake2b', digest_size=32),
+    'blake2b-64': _hashlib_digest('blake2b', digest_size=8),
+    'blake2b-128': _hashlib_digest('blake2b', digest_size=16),
+}
+if XXHASH_AVAILABLE:
+    FINGERPRINT_ALGORITHMS['xxh64'] = xxhash.xxh64_hexdigest
+    FINGERPRINT_ALGORITHMS['xxh128'] = xxhash.xxh3_128_hexdigest
+
+# Fast algorithms and the blake2b variant of the same width used without xxhash
+FAST_FALLBACKS = {'xxh64': 'blake2b-64', 'xxh128': 'blake2b-128'}
+
+def resolve_algorithm(name):
+    """Map a configured algorithm name to one that is available here"""
+    name = name.lower()
+    if name in FINGERPRINT_ALGORITHMS:
+        return name
+    if name in FAST_FALLBACKS:
+        fallback = FAST_FALLBACKS[name]
+        print(f"Warning: xxhash not installed. Using {fallback} instead of {name}.")
+        return fallback
+    raise ValueError(f"Unknown hash algorithm: {name}. Must be one of: "
+                     f"{', '.join(sorted(set(FINGERPRINT_ALGORITHMS) | set(FAST_FALLBACKS)))}")
+
+def to_int64(content_hash):
+    """Fold the first 64 bits of a hex digest into a signed integer for BigInteger columns"""
+    value = int(content_hash[:16], 16)
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+class Fingerprinter:
+    """Computes content fingerprints with a configurable algorithm"""
+    
+    def __init__(self, algorithm=None):
+        self.algorithm = resolve_algorithm(algorithm or Config.HASH_ALGORITHM)
+        self._digest = FINGERPRINT_ALGORITHMS[self.algorithm]
+    
+    def hexdigest(self, data_content):
+        """Return the hex fingerprint stored in content_hash"""
+        return self._digest(data_content.encode('utf-8'))
+    
+    def int64(self, data_content):
+        """Return the integer lookup fingerprint stored in content_fingerprint"""
+        return to_int64(self.hexdigest(data_content))
+
+def _index_size(values, column_type):
+    """Measure the on-disk size in bytes of a SQLite index over values"""
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        connection = sqlite3.connect(path)
+        connection.execute(f'CREATE TABLE fingerprints (value {column_type})')
+        connection.executemany('INSERT INTO fingerprints VALUES (?)', ((value,) for value in values))
+        connection.commit()
+        connection.execute('VACUUM')
+        without_index = os.path.getsize(path)
+        connection.execute('CREATE INDEX idx_value ON fingerprints (value)')
+        connection.commit()
+        connection.execute('VACUUM')
+        with_index = os.path.getsize(path)
+        connection.close()
+        return with_index - without_index
+    finally:
+        os.remove(path)
+
+def benchmark(num_items=100000, content_length=64, seed=0):
+    """Compare hash throughput and index size for every available algorithm"""
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits + ' '
+    contents = [''.join(rng.choices(alphabet, k=content_length)) for _ in range(num_items)]
+    payload_mb = sum(len(content) for content in contents) / 1e6
+    
+    results = []
+    for algorithm in sorted(FINGERPRINT_ALGORITHMS):
+        fingerprinter = Fingerprinter(algorithm)
+        start = time.perf_counter()
+        hashes = [fingerprinter.hexdigest(content) for content in contents]
+        elapsed = time.perf_counter() - start
+        results.append({
+            'algorithm': algorithm,
+            'hashes_per_sec': num_items / elapsed,
+            'mb_per_sec': payload_mb / elapsed,
+            'hex_index_bytes': _index_size(hashes, 'VARCHAR(64)'),
+            'int64_index_bytes': _index_size((to_int64(h) for h in hashes), 'BIGINT'),
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Content fingerprint tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    bench_parser = subparsers.add_parser('benchmark', help="Compare hash throughput and index size")
+    bench_parser.add_argument('--items', type=int, default=100000)
+    bench_parser.add_argument('--length', type=int, default=64)
+    
+    migrate_parser = subparsers.add_parser('migrate', help="Rehash stored entries with a new algorithm")
+    migrate_parser.add_argument('--algorithm', default=Config.HASH_ALGORITHM)
+    
+    args = parser.parse_args()
+    if args.command == 'benchmark':
+        print(f"{'algorithm':<12} {'hashes/s':>12} {'MB/s':>10} {'hex index':>12} {'int64 index':>12}")
+        for row in benchmark(args.items, args.length):
+            print(f"{row['algorithm']:<12} {row['hashes_per_sec']:>12,.0f} {row['mb_per_sec']:>10.1f} "
+                  f"{row['hex_index_bytes']:>12,} {row['int64_index_bytes']:>12,}")
+    else:
+        from database_manager import DatabaseManager
+        fingerprinter = Fingerprinter(args.algorithm)
+        migrated = DatabaseManager.shared().migrate_fingerprints(fingerprinter)
+        print(f"Rehashed {migrated} entries with {fingerprinter.algorithm}")
+
+if __name__ == "__main__":
+    main()
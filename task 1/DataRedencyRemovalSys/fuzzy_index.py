@@ -0,0 +1,213 @@
+from array import array
+from bisect import bisect_left
+import numpy as np
+from edit_distance import BoundedDistance, char_signature
+
+class ContentArena:
+    """Append-only store of (entry id, content) pairs in flat buffers
+    
+    Contents are concatenated as UTF-8 into one bytearray and addressed by
+    offsets, and ids live in a typed array, so each entry costs its encoded
+    length plus 16 bytes instead of a str object, an int object and a dict
+    slot. Entries are addressed by position, the order they were appended in.
+    While ids arrive in ascending order they are found by bisection; the
+    first out-of-order id builds an id -> position dict that is kept from
+    then on, so lookups never fall back to a linear scan.
+    """
+    
+    def __init__(self):
+        self.ids = array('q')
+        self.offsets = array('q', [0])  # Byte offset of each content; one extra for the end
+        self.data = bytearray()
+        self._positions = None  # id -> position, once ids stop arriving in ascending order
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def append(self, entry_id, content):
+        """Store content and return its position"""
+        if self._positions is None and self.ids and entry_id <= self.ids[-1]:
+            self._positions = {stored_id: position for position, stored_id in enumerate(self.ids)}
+        position = len(self.ids)
+        self.ids.append(entry_id)
+        self.data += content.encode('utf-8')
+        self.offsets.append(len(self.data))
+        if self._positions is not None:
+            self._positions.setdefault(entry_id, position)
+        return position
+    
+    def find(self, entry_id):
+        """Position of entry_id, or None"""
+        if self._positions is not None:
+            return self._positions.get(entry_id)
+        position = bisect_left(self.ids, entry_id)
+        return position if position < len(self.ids) and self.ids[position] == entry_id else None
+    
+    def content(self, position):
+        """Decode the content stored at position"""
+        return self.data[self.offsets[position]:self.offsets[position + 1]].decode('utf-8')
+    
+    def nbytes(self):
+        """Bytes held by the buffers"""
+        return len(self.data) + self.ids.itemsize * len(self.ids) + self.offsets.itemsize * len(self.offsets)
+
+class FuzzyIndex:
+    """Length-bucketed q-gram index for near-duplicate candidate generation
+    
+    Two strings within edit distance k differ in length by at most k and,
+    by the q-gram lemma, share at least max(|s|, |t|) - q + 1 - k*q q-grams
+    (counted as multisets). Candidates failing either bound can never be
+    within the threshold, so verifying only the survivors gives exactly the
+    same matches as comparing against every stored entry.
+    
+    Contents live in a ContentArena. Postings are keyed by
+    hash((length, q-gram, occurrence)) and kept in three flat NumPy arrays
+    (sorted keys, offsets, arena positions); recent adds go to a small dict
+    that is merged in once it grows past min_compaction postings and a
+    quarter of the compacted size.
+    A hash collision can only add candidates, which verification then
+    rejects, so matches stay exact.
+    
+    Verification first drops candidates whose stored character signature
+    already rules them out, then runs the early-exit BoundedDistance
+    kernel in id order.
+    """
+    
+    def __init__(self, max_distance, q=2, min_compaction=65536):
+        self.max_distance = max_distance
+        self.q = q
+        self.min_compaction = min_compaction
+        self.arena = ContentArena()
+        self.matcher = BoundedDistance(max_distance)
+        self.signatures = array('Q')  # char_signature of each arena position
+        self.length_buckets = {}  # length -> array of positions
+        self._keys = np.zeros(0, dtype=np.int64)  # Sorted posting keys
+        self._offsets = np.zeros(1, dtype=np.int64)  # Postings of _keys[i] are _positions[_offsets[i]:_offsets[i + 1]]
+        self._positions = np.zeros(0, dtype=np.int32)
+        self._recent = {}  # posting key -> array of positions added since the last compaction
+        self._recent_count = 0
+    
+    def __len__(self):
+        return len(self.arena)
+    
+    def __contains__(self, entry_id):
+        return self.arena.find(entry_id) is not None
+    
+    def _qgrams(self, content):
+        """Number each q-gram by its occurrence, so multiset overlap becomes set overlap"""
+        q = self.q
+        seen = {}
+        grams = []
+        for i in range(len(content) - q + 1):
+            gram = content[i:i + q]
+            seen[gram] = seen.get(gram, 0) + 1
+            grams.append((gram, seen[gram]))
+        return grams
+    
+    def add(self, entry_id, content):
+        """Add a stored entry to the index"""
+        if entry_id in self:
+            return
+        length = len(content)
+        position = self.arena.append(entry_id, content)
+        self.signatures.append(char_signature(content))
+        bucket = self.length_buckets.get(length)
+        if bucket is None:
+            bucket = self.length_buckets[length] = array('i')
+        bucket.append(position)
+        for gram, occurrence in self._qgrams(content):
+            key = hash((length, gram, occurrence))
+            posting = self._recent.get(key)
+            if posting is None:
+                posting = self._recent[key] = array('i')
+            posting.append(position)
+            self._recent_count += 1
+        if self._recent_count > max(len(self._positions) // 4, self.min_compaction):
+            self._compact()
+    
+    def _compact(self):
+        """Merge the recent postings into the flat arrays"""
+        if not self._recent:
+            return
+        recent_keys = np.fromiter(self._recent.keys(), dtype=np.int64, count=len(self._recent))
+        recent_counts = np.fromiter(map(len, self._recent.values()), dtype=np.int64, count=len(self._recent))
+        recent_positions = np.frombuffer(b''.join(posting.tobytes() for posting in self._recent.values()), dtype=np.int32)
+        keys = np.concatenate([np.repeat(self._keys, np.diff(self._offsets)), np.repeat(recent_keys, recent_counts)])
+        positions = np.concatenate([self._positions, recent_positions])
+        order = np.argsort(keys, kind='stable')  # Older postings stay first within a key
+        keys, self._positions = keys[order], positions[order]
+        self._keys, starts = np.unique(keys, return_index=True)
+        self._offsets = np.append(starts, len(keys)).astype(np.int64)
+        self._recent = {}
+        self._recent_count = 0
+    
+    def _postings(self, keys):
+        """Arena positions posted under each of keys (distinct int64 array), concatenated"""
+        parts = []
+        if len(self._keys):
+            slots = np.searchsorted(self._keys, keys)
+            inside = slots < len(self._keys)
+            slots = slots[inside][self._keys[slots[inside]] == keys[inside]]
+            starts = self._offsets[slots]
+            counts = self._offsets[slots + 1] - starts
+            # Flat index of every posting in the matched slices
+            parts.append(self._positions[np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())])
+        if self._recent:
+            # One conversion for all recent postings; small indexes may never compact
+            recent = [posting for posting in map(self._recent.get, keys.tolist()) if posting is not None]
+            if recent:
+                parts.append(np.frombuffer(b''.join(posting.tobytes() for posting in recent), dtype=np.int32))
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+    
+    def candidate_positions(self, content):
+        """Return arena positions of stored entries that may be within max_distance"""
+        length = len(content)
+        query_grams = self._qgrams(content)
+        positions = []
+        for other_length in range(max(0, length - self.max_distance), length + self.max_distance + 1):
+            bucket = self.length_buckets.get(other_length)
+            if not bucket:
+                continue
+            min_shared = max(length, other_length) - self.q + 1 - self.max_distance * self.q
+            if min_shared <= 0:
+                # The q-gram bound cannot rule anything out for short strings
+                positions.extend(bucket)
+                continue
+            keys = np.fromiter((hash((other_length, gram, occurrence)) for gram, occurrence in query_grams),
+                               dtype=np.int64, count=len(query_grams))
+            # Keys are distinct, so each key contributes at most once per stored entry
+            shared_positions, shared = np.unique(self._postings(keys), return_counts=True)
+            positions.extend(shared_positions[shared >= min_shared].tolist())
+        return positions
+    
+    def candidates(self, content):
+        """Return ids of stored entries that may be within max_distance, ascending"""
+        ids = self.arena.ids
+        return sorted(ids[position] for position in self.candidate_positions(content))
+    
+    def search(self, content, distance_fn=None):
+        """Return the lowest entry id within max_distance of content, or None
+        
+        distance_fn replaces the bounded Levenshtein kernel for verification;
+        it must compute a true edit distance for the signature bound to hold.
+        """
+        positions = np.array(self.candidate_positions(content), dtype=np.int64)
+        if not len(positions):
+            return None
+        ids = np.frombuffer(self.arena.ids, dtype=np.int64)[positions]
+        order = np.argsort(ids)
+        positions, ids = positions[order], ids[order]
+        signatures = np.frombuffer(self.signatures, dtype=np.uint64)[positions]
+        # Candidates come from the length window already, so only the signature bound is left to apply
+        survivors = self.matcher.survivors(content, signatures=signatures)
+        distance_fn = distance_fn or self.matcher.kernel
+        for survivor in survivors.tolist():
+            if distance_fn(content, self.arena.content(positions[survivor])) <= self.max_distance:
+                return int(ids[survivor])
+        return None
+    
+    def nbytes(self):
+        """Approximate bytes held by the arena and postings (recent postings excluding dict overhead)"""
+        return (self.arena.nbytes() + self.signatures.itemsize * len(self.signatures) + self._keys.nbytes + self._offsets.nbytes + self._positions.nbytes
+                + sum(bucket.itemsize * len(bucket) for bucket in self.length_buckets.values())
+                + 4 * self._recent_count)
@@ -0,0 +1,118 @@
+import math
+from collections import OrderedDict
+
+# Returned by HashCache.lookup when the answer has to come from the database
+MISS = object()
+
+class BloomFilter:
+    """Fixed-size Bloom filter over hex content hashes"""
+    
+    def __init__(self, capacity, false_positive_rate=0.01):
+        self.capacity = max(int(capacity), 1)
+        self.num_bits = max(int(-self.capacity * math.log(false_positive_rate) / (math.log(2) ** 2)), 8)
+        self.num_hashes = max(int(round(self.num_bits / self.capacity * math.log(2))), 1)
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+    
+    def _positions(self, content_hash):
+        """Derive bit positions from the hash itself by double hashing"""
+        value = int(content_hash, 16)
+        h1 = value & 0xFFFFFFFF
+        h2 = ((value >> 32) & 0xFFFFFFFF) | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+    
+    def add(self, content_hash):
+        """Record a hash as present"""
+        for position in self._positions(content_hash):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+    
+    def might_contain(self, content_hash):
+        """Return False only if the hash was definitely never added"""
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(content_hash))
+    
+    def is_saturated(self):
+        """Whether more hashes were added than the filter was sized for"""
+        return self.count > self.capacity
+
+class HashCache:
+    """Scan-resistant (segmented LRU) cache of content_hash -> (entry id, data type)
+    
+    New keys enter a probationary segment and are only promoted to the
+    protected segment on a second hit, so a one-off scan of unique hashes
+    cannot evict the hot duplicates. Absent hashes are cached as None, and a
+    Bloom filter over every stored hash answers "definitely new" without
+    touching either segment.
+    
+    Those negative answers are only right while every insert into the table
+    is reported through add(), so with trust_negatives=False (other writers
+    share the database) absent hashes are never cached and the Bloom filter
+    is not consulted: only found entries are served from memory.
+    """
+    
+    def __init__(self, capacity, bloom_capacity=None, false_positive_rate=0.01, trust_negatives=True):
+        self.trust_negatives = trust_negatives
+        self.capacity = max(int(capacity), 1)
+        self.protected_capacity = max(int(self.capacity * 0.8), 1)
+        self.probation = OrderedDict()
+        self.protected = OrderedDict()
+        self.bloom = BloomFilter(bloom_capacity or self.capacity, false_positive_rate)
+        self.hits = 0
+        self.misses = 0
+        self.bloom_rejections = 0
+    
+    def __len__(self):
+        return len(self.probation) + len(self.protected)
+    
+    def lookup(self, content_hash):
+        """Return (entry id, data type), None if known absent, or MISS"""
+        if self.trust_negatives and not self.bloom.might_contain(content_hash):
+            self.bloom_rejections += 1
+            return None
+        if content_hash in self.protected:
+            self.protected.move_to_end(content_hash)
+            self.hits += 1
+            return self.protected[content_hash]
+        if content_hash in self.probation:
+            value = self.probation.pop(content_hash)
+            self._protect(content_hash, value)
+            self.hits += 1
+            return value
+        self.misses += 1
+        return MISS
+    
+    def put(self, content_hash, value):
+        """Cache a database answer: (entry id, data type), or None when absent"""
+        if value is None and not self.trust_negatives:
+            return
+        if content_hash in self.protected:
+            self.protected[content_hash] = value
+            self.protected.move_to_end(content_hash)
+            return
+        self.probation[content_hash] = value
+        self.probation.move_to_end(content_hash)
+        while len(self) > self.capacity and self.probation:
+            self.probation.popitem(last=False)
+    
+    def add(self, content_hash, entry_id, data_type):
+        """Record a newly inserted entry, replacing any cached negative answer"""
+        self.bloom.add(content_hash)
+        self.put(content_hash, (entry_id, data_type))
+    
+    def _protect(self, content_hash, value):
+        """Promote a key to the protected segment, demoting its LRU key if full"""
+        self.protected[content_hash] = value
+        if len(self.protected) > self.protected_capacity:
+            demoted_hash, demoted_value = self.protected.popitem(last=False)
+            self.probation[demoted_hash] = demoted_value
+    
+    def stats(self):
+        """Return hit/miss counters"""
+        lookups = self.hits + self.misses + self.bloom_rejections
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'bloom_rejections': self.bloom_rejections,
+            'hit_rate': (self.hits + self.bloom_rejections) / lookups if lookups else 0.0,
+            'size': len(self),
+        }
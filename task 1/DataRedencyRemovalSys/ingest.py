@@ -0,0 +1,212 @@
+import importlib.util
+import json
+import os
+import sys
+import time
+TQDM_AVAILABLE = importlib.util.find_spec('tqdm') is not None  # Imported when a run starts
+from config import Config
+
+SUPPORTED_FORMATS = ('csv', 'jsonl', 'parquet')
+
+def detect_format(path):
+    """Guess the input format from a file extension"""
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension in ('json', 'ndjson'):
+        return 'jsonl'
+    if extension in SUPPORTED_FORMATS:
+        return extension
+    raise ValueError(f"Cannot detect input format of {path}. Use --format with one of: {', '.join(SUPPORTED_FORMATS)}")
+
+def _as_text(value):
+    """Convert a JSON scalar to the string form the validator expects"""
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+def _check_content_column(content_field, columns):
+    if content_field not in columns:
+        raise ValueError(f"Input has no '{content_field}' column (found: {', '.join(map(str, columns))}). "
+                         f"Use --content-column to name the column holding the content.")
+
+def _iter_csv(source, offset, chunk_size, content_field, type_field):
+    """Yield lists of raw (content, type) pairs from a CSV file with pandas"""
+    import pandas as pd
+    # Header is row 0, so records start at file row 1; a callable keeps pandas from materializing the skipped rows
+    skiprows = (lambda row: 0 < row <= offset) if offset else None
+    reader = pd.read_csv(source, chunksize=chunk_size, dtype=str, keep_default_na=False, skiprows=skiprows)
+    for frame in reader:
+        _check_content_column(content_field, frame.columns)
+        contents = frame[content_field].tolist()
+        types = frame[type_field].tolist() if type_field in frame.columns else [None] * len(contents)
+        yield list(zip(contents, types))
+
+def _iter_jsonl(source, offset, chunk_size, content_field, type_field):
+    """Yield lists of raw (content, type) pairs from a JSON-lines stream"""
+    chunk = []
+    position = 0
+    for line in source:
+        if not line.strip():
+            continue
+        position += 1
+        if position <= offset:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            record = {}
+        chunk.append((_as_text(record.get(content_field)), _as_text(record.get(type_field))))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _iter_parquet(path, offset, chunk_size, content_field, type_field):
+    """Yield lists of raw (content, type) pairs from a Parquet file, one row batch at a time"""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Reading Parquet requires pyarrow: pip install pyarrow")
+    parquet_file = pq.ParquetFile(path)
+    _check_content_column(content_field, parquet_file.schema_arrow.names)
+    columns = [content_field] + ([type_field] if type_field in parquet_file.schema_arrow.names else [])
+    skipped = 0
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+        if skipped + batch.num_rows <= offset:
+            skipped += batch.num_rows
+            continue
+        batch = batch.slice(max(offset - skipped, 0))
+        skipped = offset
+        contents = [_as_text(value) for value in batch.column(content_field).to_pylist()]
+        if type_field in batch.schema.names:
+            types = [_as_text(value) for value in batch.column(type_field).to_pylist()]
+        else:
+            types = [None] * len(contents)
+        yield list(zip(contents, types))
+
+def iter_record_chunks(path, input_format=None, offset=0, chunk_size=None,
+                       content_field='data_content', type_field='data_type'):
+    """Stream (content, type) chunks from a CSV/JSONL/Parquet file, or stdin when path is '-'
+    
+    Only one chunk is held in memory at a time. offset skips that many
+    records from the start, which is how an interrupted run resumes.
+    """
+    chunk_size = chunk_size or Config.BATCH_SIZE
+    if path == '-':
+        input_format = input_format or 'jsonl'
+        if input_format == 'parquet':
+            raise ValueError("Parquet cannot be read from stdin")
+        source = sys.stdin
+    else:
+        input_format = input_format or detect_format(path)
+        source = path
+    
+    if input_format == 'csv':
+        yield from _iter_csv(source, offset, chunk_size, content_field, type_field)
+    elif input_format == 'jsonl':
+        if source is sys.stdin:
+            yield from _iter_jsonl(source, offset, chunk_size, content_field, type_field)
+        else:
+            with open(source, encoding='utf-8') as handle:
+                yield from _iter_jsonl(handle, offset, chunk_size, content_field, type_field)
+    elif input_format == 'parquet':
+        yield from _iter_parquet(source, offset, chunk_size, content_field, type_field)
+    else:
+        raise ValueError(f"Unsupported input format: {input_format}")
+
+def load_checkpoint(checkpoint_path, source):
+    """Return the saved record offset for source, or 0"""
+    if not checkpoint_path or not os.path.exists(checkpoint_path):
+        return 0
+    with open(checkpoint_path, encoding='utf-8') as handle:
+        checkpoint = json.load(handle)
+    if checkpoint.get('source') != source:
+        print(f"Warning: checkpoint {checkpoint_path} belongs to {checkpoint.get('source')}, ignoring it.")
+        return 0
+    return int(checkpoint.get('offset', 0))
+
+def save_checkpoint(checkpoint_path, source, offset):
+    """Atomically record how many records of source have been committed"""
+    temporary_path = f"{checkpoint_path}.tmp"
+    with open(temporary_path, 'w', encoding='utf-8') as handle:
+        json.dump({'source': source, 'offset': offset}, handle)
+    os.replace(temporary_path, checkpoint_path)
+
+class IngestPipeline:
+    """Streams records through validation and batch redundancy detection"""
+    
+    def __init__(self, redundancy_detector, data_validator, default_type=None):
+        self.redundancy_detector = redundancy_detector
+        self.data_validator = data_validator
+        self.default_type = default_type
+        self.stats = {'records': 0, 'rejected': 0, 'redundant': 0, 'inserted': 0, 'failed': 0}
+        self.elapsed = 0.0
+    
+    def process_chunk(self, raw_records):
+        """Validate and store one chunk, updating the running totals; returns how many records failed to store"""
+        start = time.perf_counter()
+        contents = [data_content for data_content, _ in raw_records]
+        data_types = [data_type or self.default_type for _, data_type in raw_records]
+        mask, _ = self.data_validator.validate_batch(contents, data_types)
+        valid_records = [(contents[index], data_types[index]) for index in mask.nonzero()[0]]
+        self.stats['rejected'] += len(raw_records) - len(valid_records)
+        self.redundancy_detector.observe_stage('validate', start, len(raw_records))
+        failed = 0
+        for is_redundant, entry in self.redundancy_detector.process_batch(valid_records):
+            if entry is None:
+                failed += 1
+            elif is_redundant:
+                self.stats['redundant'] += 1
+            else:
+                self.stats['inserted'] += 1
+        self.stats['failed'] += failed
+        self.stats['records'] += len(raw_records)
+        return failed
+    
+    def run(self, path, input_format=None, content_field='data_content', type_field='data_type',
+            checkpoint_path=None, resume=False, show_progress=True):
+        """Ingest a whole file, checkpointing after every committed chunk
+        
+        process_batch has already retried a chunk that failed to store, so
+        the run stops there with the checkpoint still before that chunk;
+        --resume then starts from its first record.
+        """
+        offset = load_checkpoint(checkpoint_path, path) if resume else 0
+        if offset:
+            print(f"Resuming {path} from record {offset}")
+        progress = None
+        if TQDM_AVAILABLE:
+            from tqdm import tqdm
+            progress = tqdm(unit='rec', initial=offset, disable=not show_progress)
+        start = time.perf_counter()
+        try:
+            for raw_records in iter_record_chunks(path, input_format, offset,
+                                                  content_field=content_field, type_field=type_field):
+                failed = self.process_chunk(raw_records)
+                if failed:
+                    print(f"Stopping at record {offset}: {failed} records of this chunk could not be stored. "
+                          f"Resume from the checkpoint once the database is available.")
+                    break
+                offset += len(raw_records)
+                if checkpoint_path:
+                    save_checkpoint(checkpoint_path, path, offset)
+                if progress is not None:
+                    progress.update(len(raw_records))
+        finally:
+            self.elapsed += time.perf_counter() - start
+            self.redundancy_detector.flush_metrics()
+            if progress is not None:
+                progress.close()
+        return self.stats
+    
+    def summary(self):
+        """Format the final throughput, duplicate rate and reject counts"""
+        records = self.stats['records']
+        accepted = records - self.stats['rejected']
+        rate = records / self.elapsed if self.elapsed else 0.0
+        duplicate_rate = self.stats['redundant'] / accepted if accepted else 0.0
+        return (f"Processed {records} records in {self.elapsed:.2f}s ({rate:,.0f} records/sec)\n"
+                f"  inserted:  {self.stats['inserted']}\n"
+                f"  redundant: {self.stats['redundant']} ({duplicate_rate:.1%} of valid records)\n"
+                f"  rejected:  {self.stats['rejected']}\n"
+                f"  failed:    {self.stats['failed']}")
@@ -1,10 +1,14 @@
+import argparse
+import time
 from database_manager import DatabaseManager
 from redundancy_detector import RedundancyDetector
 from data_validator import DataValidator
+from ingest import IngestPipeline, SUPPORTED_FORMATS
+from metrics import build_report
 
-def main():
-    db_manager = DatabaseManager()
-    redundancy_detector = RedundancyDetector()
+def run_sample():
+    db_manager = DatabaseManager.shared()
+    redundancy_detector = RedundancyDetector(db_manager)
     data_validator = DataValidator()
     
     # Example data processing loop
@@ -23,7 +27,9 @@ def main():
         data_type = data["type"]
         
         # Validate data
+        start = time.perf_counter()
         is_valid, validation_msg = data_validator.validate_data(content, data_type)
+        redundancy_detector.observe_stage('validate', start)
         if not is_valid:
             print(f"Validation failed for '{content}': {validation_msg}")
             continue
@@ -34,6 +40,73 @@ def main():
             print(f"Processed data: {result.data_content} (Type: {result.data_type})")
         else:
             print(f"Data '{content}' is redundant or not added.")
+    redundancy_detector.flush_metrics()
+
+def run_ingest(args):
+    db_manager = DatabaseManager.shared()
+    if args.workers > 1:
+        from parallel_detector import ParallelRedundancyDetector  # Pulls in multiprocessing and NumPy
+        redundancy_detector = ParallelRedundancyDetector(db_manager, num_workers=args.workers)
+    else:
+        redundancy_detector = RedundancyDetector(db_manager)
+    pipeline = IngestPipeline(redundancy_detector, DataValidator(), default_type=args.default_type)
+    try:
+        pipeline.run(args.path, args.format, content_field=args.content_column, type_field=args.type_column,
+                     checkpoint_path=args.checkpoint, resume=args.resume, show_progress=not args.no_progress)
+    finally:
+        if args.workers > 1:
+            redundancy_detector.close()
+    print(pipeline.summary())
+
+def run_report():
+    print(build_report(DatabaseManager.shared().get_metric_totals()))
+
+def run_compaction(args):
+    from compaction import Compactor, format_stats
+    compactor = Compactor(RedundancyDetector(DatabaseManager.shared()), args.batch_size)
+    print(format_stats(compactor.run(restart=args.restart)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Data Redundancy Removal System")
+    subparsers = parser.add_subparsers(dest='command')
+    
+    ingest_parser = subparsers.add_parser('ingest', help="Stream records from a CSV/JSONL/Parquet file or stdin")
+    ingest_parser.add_argument('path', help="Input file, or '-' for stdin")
+    ingest_parser.add_argument('--format', choices=SUPPORTED_FORMATS, help="Input format (default: from extension, jsonl for stdin)")
+    ingest_parser.add_argument('--content-column', default='data_content')
+    ingest_parser.add_argument('--type-column', default='data_type')
+    ingest_parser.add_argument('--default-type', help="Data type for records without a type column")
+    ingest_parser.add_argument('--checkpoint', help="File recording how many records have been committed")
+    ingest_parser.add_argument('--resume', action='store_true', help="Skip records already committed per --checkpoint")
+    ingest_parser.add_argument('--workers', type=int, default=1, help="Fuzzy index shard processes (1 = single process)")
+    ingest_parser.add_argument('--no-progress', action='store_true', help="Disable the progress bar")
+    
+    serve_parser = subparsers.add_parser('serve', help="Accept JSON-lines records from concurrent producers over TCP")
+    serve_parser.add_argument('--host', help="Interface to listen on (default: SERVICE_HOST)")
+    serve_parser.add_argument('--port', type=int, help="Port to listen on (default: SERVICE_PORT)")
+    
+    compact_parser = subparsers.add_parser('compact', help="Mark near-duplicates already stored in the database")
+    compact_parser.add_argument('--batch-size', type=int, help="Rows or groups read per page (default: BATCH_SIZE)")
+    compact_parser.add_argument('--restart', action='store_true', help="Ignore the checkpoint of an interrupted run")
+    
+    subparsers.add_parser('report', help="Show stage latency percentiles and redundancy rate by data type")
+    
+    args = parser.parse_args()
+    if args.command == 'ingest':
+        run_ingest(args)
+    elif args.command == 'serve':
+        import asyncio
+        from async_service import run_service
+        try:
+            asyncio.run(run_service(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+    elif args.command == 'compact':
+        run_compaction(args)
+    elif args.command == 'report':
+        run_report()
+    else:
+        run_sample()
 
 if __name__ == "__main__":
     main()
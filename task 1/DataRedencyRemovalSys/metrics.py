@@ -0,0 +1,128 @@
+import math
+import random
+import time
+from collections import defaultdict
+from config import Config
+
+STAGES = ('validate', 'hash', 'canonical_hash', 'exact_lookup', 'canonical_lookup', 'fuzzy_search', 'insert')
+HISTOGRAM_BASE_MS = 0.001  # Upper bound of bucket 0
+HISTOGRAM_GROWTH = 1.25  # Each bucket is 25% wider than the previous one
+STAGE_METRIC_PREFIX = 'stage_ms'
+
+def bucket_index(elapsed_ms):
+    """Log-spaced histogram bucket holding elapsed_ms"""
+    if elapsed_ms <= HISTOGRAM_BASE_MS:
+        return 0
+    return int(math.ceil(math.log(elapsed_ms / HISTOGRAM_BASE_MS, HISTOGRAM_GROWTH)))
+
+def bucket_upper_bound(index):
+    """Largest duration in milliseconds counted in bucket index"""
+    return HISTOGRAM_BASE_MS * HISTOGRAM_GROWTH ** index
+
+def histogram_percentile(buckets, fraction):
+    """Upper bound of the bucket holding the given fraction of {bucket index: count}"""
+    total = sum(buckets.values())
+    if not total:
+        return 0.0
+    rank = fraction * total
+    cumulative = 0
+    for index in sorted(buckets):
+        cumulative += buckets[index]
+        if cumulative >= rank:
+            return bucket_upper_bound(index)
+    return bucket_upper_bound(max(buckets))
+
+class MetricsCollector:
+    """Aggregates stage timings and outcome counters in memory and writes them in batches
+    
+    Timings go into fixed log-spaced histogram buckets, so flushes from any
+    number of runs can be summed into one distribution by the report.
+    Nothing touches the database until flush(), which writes the buckets,
+    counters and sampled ProcessingLog rows in a single transaction.
+    """
+    
+    def __init__(self, db_manager, flush_interval=None, sample_rate=None, seed=None):
+        self.db_manager = db_manager
+        self.flush_interval = Config.METRICS_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.sample_rate = Config.PROCESSING_LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+        self._random = random.Random(seed)
+        self._reset()
+    
+    def _reset(self):
+        self.histograms = defaultdict(lambda: defaultdict(int))  # stage -> bucket index -> count
+        self.counters = defaultdict(int)  # (metric name, data type) -> count
+        self.log_rows = []
+        self._last_flush = time.monotonic()
+    
+    def observe(self, stage, elapsed_ms, count=1):
+        """Add count observations of elapsed_ms to a stage histogram"""
+        self.histograms[stage][bucket_index(elapsed_ms)] += count
+    
+    def record_outcome(self, data_content, data_type, content_hash, is_redundant, elapsed_ms,
+                       similarity_score=None, success=True, error_message=None):
+        """Count one processed record and keep a sampled ProcessingLog row for it
+        
+        Failures are always logged; other records with probability sample_rate.
+        """
+        self.counters[('records', data_type)] += 1
+        if not success:
+            self.counters[('failed', data_type)] += 1
+        elif is_redundant:
+            self.counters[('redundant', data_type)] += 1
+        if not success or self._random.random() < self.sample_rate:
+            self.log_rows.append({
+                'operation_type': 'redundant' if is_redundant else 'insert',
+                'data_content': data_content,
+                'data_type': data_type,
+                'content_hash': content_hash,
+                'similarity_score': similarity_score,
+                'is_redundant': is_redundant,
+                'is_false_positive': False,
+                'processing_time_ms': int(round(elapsed_ms)),
+                'success': success,
+                'error_message': error_message,
+            })
+    
+    def maybe_flush(self):
+        """Flush when flush_interval seconds have passed or the log buffer is full"""
+        if time.monotonic() - self._last_flush >= self.flush_interval or len(self.log_rows) >= Config.BATCH_SIZE:
+            self.flush()
+    
+    def flush(self):
+        """Write the aggregated metrics and buffered log rows, then start a new interval"""
+        metric_rows = [{'metric_name': f'{STAGE_METRIC_PREFIX}:{stage}:{index}', 'metric_value': count, 'data_type': None}
+                       for stage, buckets in self.histograms.items() for index, count in buckets.items()]
+        metric_rows.extend({'metric_name': name, 'metric_value': count, 'data_type': data_type}
+                           for (name, data_type), count in self.counters.items())
+        if metric_rows or self.log_rows:
+            if not self.db_manager.write_metrics(metric_rows, self.log_rows):
+                return  # Keep the aggregates and retry on the next flush
+        self._reset()
+
+def build_report(metric_totals):
+    """Format stage percentiles and redundancy rates from summed SystemMetrics rows
+    
+    metric_totals is a list of (metric_name, data_type, total) tuples.
+    """
+    stage_buckets = defaultdict(dict)
+    counters = defaultdict(lambda: defaultdict(float))
+    for metric_name, data_type, total in metric_totals:
+        if metric_name.startswith(STAGE_METRIC_PREFIX + ':'):
+            _, stage, index = metric_name.split(':')
+            stage_buckets[stage][int(index)] = total
+        else:
+            counters[data_type or 'all'][metric_name] += total
+    
+    lines = [f"{'stage':<14} {'count':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}"]
+    for stage in sorted(stage_buckets, key=lambda stage: STAGES.index(stage) if stage in STAGES else len(STAGES)):
+        buckets = stage_buckets[stage]
+        lines.append(f"{stage:<14} {int(sum(buckets.values())):>10} "
+                     + " ".join(f"{histogram_percentile(buckets, fraction):>10.3f}" for fraction in (0.50, 0.95, 0.99)))
+    lines.append("")
+    lines.append(f"{'data_type':<14} {'records':>10} {'redundant':>10} {'rate':>8} {'failed':>8}")
+    for data_type in sorted(counters):
+        values = counters[data_type]
+        records = values['records']
+        rate = values['redundant'] / records if records else 0.0
+        lines.append(f"{data_type:<14} {int(records):>10} {int(values['redundant']):>10} {rate:>8.1%} {int(values['failed']):>8}")
+    return "\n".join(lines)
@@ -0,0 +1,68 @@
+import hashlib
+import zlib
+import numpy as np
+from config import Config
+
+MERSENNE_PRIME = (1 << 31) - 1
+SHINGLE_BLOCK = 8192  # Shingles hashed per step, bounding memory at SHINGLE_BLOCK x num_perm
+
+class MinHasher:
+    """MinHash signatures and LSH band keys over character shingles
+    
+    The fraction of equal rows in two signatures estimates the Jaccard
+    similarity of the entries' shingle sets. The signature is cut into
+    bands and each band hashed to a bucket key; entries sharing any bucket
+    become candidates, so a pair with similarity s is found with
+    probability 1 - (1 - s^rows)^bands without comparing every entry.
+    """
+    
+    def __init__(self, num_perm=None, bands=None, shingle_size=None, seed=1):
+        self.num_perm = num_perm or Config.MINHASH_NUM_PERM
+        self.bands = bands or Config.MINHASH_BANDS
+        self.shingle_size = shingle_size or Config.SHINGLE_SIZE
+        if self.num_perm % self.bands != 0:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.rows = self.num_perm // self.bands
+        rng = np.random.RandomState(seed)
+        # Universal hashes (a*x + b) mod p; a < 2^31 and x < 2^32 keep a*x + b inside uint64
+        self._a = rng.randint(1, MERSENNE_PRIME, size=self.num_perm).astype(np.uint64)
+        self._b = rng.randint(0, MERSENNE_PRIME, size=self.num_perm).astype(np.uint64)
+    
+    def shingles(self, content):
+        """Return the set of character k-shingles of content"""
+        k = self.shingle_size
+        if len(content) <= k:
+            return {content}
+        return {content[i:i + k] for i in range(len(content) - k + 1)}
+    
+    def signature(self, content):
+        """Return the MinHash signature of content as a uint32 array"""
+        hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in self.shingles(content)),
+                             dtype=np.uint64)
+        signature = np.full(self.num_perm, MERSENNE_PRIME, dtype=np.uint64)
+        for start in range(0, len(hashes), SHINGLE_BLOCK):
+            block = hashes[start:start + SHINGLE_BLOCK, None]
+            np.minimum(signature, ((block * self._a + self._b) % MERSENNE_PRIME).min(axis=0), out=signature)
+        return signature.astype(np.uint32)
+    
+    def band_keys(self, signature):
+        """Return one signed 64-bit bucket key per band"""
+        data = signature.astype('<u4').tobytes()
+        width = self.rows * 4
+        return [int.from_bytes(hashlib.blake2b(band.to_bytes(2, 'little') + data[band * width:(band + 1) * width],
+                                               digest_size=8).digest(), 'little', signed=True)
+                for band in range(self.bands)]
+    
+    def to_bytes(self, signature):
+        """Serialize a signature for the minhash_signature column"""
+        return signature.astype('<u4').tobytes()
+    
+    def from_bytes(self, data):
+        """Load a signature stored by to_bytes"""
+        return np.frombuffer(data, dtype='<u4')
+    
+    def similarities(self, signature, others):
+        """Estimate the Jaccard similarity of signature against each row of others"""
+        if len(others) == 0:
+            return np.zeros(0)
+        return (np.asarray(others) == signature).mean(axis=1)
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Text, Index
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Float, Boolean, Text, LargeBinary, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 import datetime
+import hashlib
 
 Base = declarative_base()
 
@@ -13,30 +14,52 @@ class DataEntry(Base):
     data_content = Column(Text, nullable=False)  # The actual data content
     data_type = Column(String(50), nullable=False)  # Type of data (text, number, mixed, etc.)
     content_hash = Column(String(64), nullable=False, unique=True)  # Hash of data for quick lookup
+    content_fingerprint = Column(BigInteger)  # First 64 bits of the hash, filled with FINGERPRINT_LOOKUP_INDEX
+    canonical_hash = Column(String(64))  # Hash of the type-aware canonical form (see canonicalize.py)
     similarity_score = Column(Float, default=0.0)  # Similarity score with existing data
     is_redundant = Column(Boolean, default=False)  # Whether this data is redundant
     is_false_positive = Column(Boolean, default=False)  # Whether this was a false positive
+    minhash_signature = Column(LargeBinary)  # MinHash signature for long text/mixed entries (uint32 little-endian)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     
     # Indexes for performance
     __table_args__ = (
         Index('idx_content_hash', 'content_hash'),
+        Index('idx_content_fingerprint', 'content_fingerprint'),
+        Index('idx_canonical_hash', 'canonical_hash'),
         Index('idx_data_type', 'data_type'),
         Index('idx_similarity_score', 'similarity_score'),
         Index('idx_created_at', 'created_at'),
+        Index('idx_content_length', func.length(data_content)),  # Length-ordered scans for compaction
     )
     
     def __repr__(self):
         return f"<DataEntry(id={self.id}, type={self.data_type}, redundant={self.is_redundant})>"
 
+class MinHashBucket(Base):
+    """LSH band index over DataEntry MinHash signatures"""
+    __tablename__ = 'minhash_buckets'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    entry_id = Column(Integer, nullable=False)  # DataEntry.id owning the signature
+    bucket_key = Column(BigInteger, nullable=False)  # Hash of (band number, band rows)
+    
+    __table_args__ = (
+        Index('idx_bucket_key', 'bucket_key'),
+        Index('idx_bucket_entry_id', 'entry_id'),
+    )
+    
+    def __repr__(self):
+        return f"<MinHashBucket(entry_id={self.entry_id}, key={self.bucket_key})>"
+
 class ProcessingLog(Base):
     """Table for tracking data processing operations"""
     __tablename__ = 'processing_logs'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     operation_type = Column(String(50), nullable=False)  # insert, update, delete, validate
-    data_content = Column(Text, nullable=False)
+    data_content = Column(Text)  # Inline payload; NULL when it is stored once elsewhere under content_hash
     data_type = Column(String(50), nullable=False)
     content_hash = Column(String(64), nullable=False)
     similarity_score = Column(Float)
@@ -57,6 +80,21 @@ class ProcessingLog(Base):
     def __repr__(self):
         return f"<ProcessingLog(operation={self.operation_type}, success={self.success})>"
 
+class ContentBlob(Base):
+    """Payloads stored once, keyed by their content hash (see blob_store.py)"""
+    __tablename__ = 'content_blobs'
+    
+    content_key = Column(String(64), primary_key=True)  # content_hash of the payload
+    codec = Column(String(10), nullable=False)  # raw, zlib or zstd
+    size = Column(Integer, nullable=False)  # UTF-8 length before compression
+    payload = Column(LargeBinary, nullable=False)
+    
+    # Clustered on the key, so SQLite stores each key once instead of in a rowid table plus an index
+    __table_args__ = {'sqlite_with_rowid': False}
+    
+    def __repr__(self):
+        return f"<ContentBlob(key={self.content_key}, codec={self.codec}, size={self.size})>"
+
 class SystemMetrics(Base):
     """Table for storing system performance metrics"""
     __tablename__ = 'system_metrics'
@@ -75,3 +113,27 @@ class SystemMetrics(Base):
     
     def __repr__(self):
         return f"<SystemMetric(name={self.metric_name}, value={self.metric_value})>"
+
+class SchemaInfo(Base):
+    """Key/value table describing how the stored data was written"""
+    __tablename__ = 'schema_info'
+    
+    key = Column(String(100), primary_key=True)  # e.g., 'hash_algorithm'
+    value = Column(String(255), nullable=False)
+    
+    def __repr__(self):
+        return f"<SchemaInfo({self.key}={self.value})>"
+
+def schema_version():
+    """Digest of every table, column type and index defined above
+    
+    DatabaseManager stores it in schema_info after creating or upgrading
+    the tables, and skips that DDL and reflection on later starts while
+    it still matches.
+    """
+    parts = []
+    for table in Base.metadata.sorted_tables:
+        parts.append(table.name)
+        parts.extend(f"{column.name} {column.type!r} {column.nullable}" for column in table.columns)
+        parts.extend(sorted(index.name for index in table.indexes))
+    return hashlib.sha1("\n".join(parts).encode('utf-8')).hexdigest()
@@ -0,0 +1,167 @@
+import multiprocessing
+import os
+from config import Config
+from fuzzy_index import FuzzyIndex
+from redundancy_detector import RedundancyDetector, LEVENSHTEIN_AVAILABLE
+
+def _shard_worker(connection, max_distance):
+    """Own one shard of the near-duplicate index, split by partition, and answer searches against it"""
+    indexes = {}  # partition -> index of this shard's entries in it
+    
+    def search(index, data_content):
+        if LEVENSHTEIN_AVAILABLE:
+            return index.search(data_content)
+        return index.get(data_content.lower())
+    
+    def search_partition(partition, data_content):
+        # The unscoped partition None covers every entry, so the lowest match across partitions wins
+        indexes_searched = indexes.values() if partition is None else [indexes.get(partition)]
+        found = [search(index, data_content) for index in indexes_searched if index is not None]
+        return min((entry_id for entry_id in found if entry_id is not None), default=None)
+    
+    while True:
+        command, payload = connection.recv()
+        if command == 'add':
+            for entry_id, data_content, partition in payload:
+                if partition not in indexes:
+                    indexes[partition] = FuzzyIndex(max_distance) if LEVENSHTEIN_AVAILABLE else {}
+                if LEVENSHTEIN_AVAILABLE:
+                    indexes[partition].add(entry_id, data_content)
+                else:
+                    key = data_content.lower()
+                    if entry_id < indexes[partition].get(key, entry_id + 1):
+                        indexes[partition][key] = entry_id
+        elif command == 'search':
+            connection.send([(position, search_partition(partition, data_content))
+                             for position, data_content, partition in payload])
+        elif command == 'stop':
+            connection.close()
+            return
+
+class ParallelRedundancyDetector(RedundancyDetector):
+    """RedundancyDetector whose near-duplicate search is spread over worker processes
+    
+    Stored entries are partitioned into length bands, and each band is
+    assigned to a worker process that owns that slice of the fuzzy index.
+    A query of length L can only match entries of length L +/- max_distance,
+    so it is sent only to the workers owning those bands, and the lowest
+    matching id across them is kept. Within a shard, entries are kept per
+    type partition so typed queries only search their own type. Hashing, exact lookups, in-batch
+    dedup and every database write stay in this (coordinator) process, so
+    the content_hash unique constraint never sees concurrent inserts and
+    outcomes are identical to the single-process detector.
+    """
+    
+    def __init__(self, db_manager=None, num_workers=None, band_width=None, hash_algorithm=None):
+        super().__init__(db_manager, fuzzy_mode='index', hash_algorithm=hash_algorithm)
+        self.num_workers = num_workers or Config.PARALLEL_WORKERS or os.cpu_count() or 1
+        self.band_width = band_width or Config.PARALLEL_BAND_WIDTH
+        # Case-folded equality in the fallback mode never crosses lengths
+        self.max_distance = self.distance_threshold - 1 if LEVENSHTEIN_AVAILABLE else 0
+        self._workers = None
+        self._pending_adds = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def _partition_length(self, data_content):
+        """Length used for partitioning, matching what the comparison sees"""
+        return len(data_content) if LEVENSHTEIN_AVAILABLE else len(data_content.lower())
+    
+    def _shard_for_length(self, length):
+        return (length // self.band_width) % self.num_workers
+    
+    def _shards_for_query(self, data_content):
+        """Shards holding every length a match could have"""
+        length = self._partition_length(data_content)
+        return {self._shard_for_length(other_length)
+                for other_length in range(max(0, length - self.max_distance), length + self.max_distance + 1)}
+    
+    def _start_workers(self):
+        """Spawn the shard workers and load the stored entries into them"""
+        context = multiprocessing.get_context()
+        self._workers = []
+        for _ in range(self.num_workers):
+            parent_connection, child_connection = context.Pipe()
+            process = context.Process(target=_shard_worker, args=(child_connection, self.max_distance), daemon=True)
+            process.start()
+            child_connection.close()
+            self._workers.append((process, parent_connection))
+        self._pending_adds = [[] for _ in range(self.num_workers)]
+        # Untyped queries search every partition, so entries of exact-only types are loaded too
+        partitions = {self.partition(data_type) for data_type in self.db_manager.get_data_types()} if self.type_partitioning else [None]
+        for partition in partitions:
+            for entry_id, data_content in self.iter_partition_contents(partition):
+                self._queue_add(entry_id, str(data_content), partition)
+                if len(self._pending_adds[self._shard_for_length(self._partition_length(str(data_content)))]) >= Config.BATCH_SIZE:
+                    self._flush_adds()
+        self._flush_adds()
+    
+    def _queue_add(self, entry_id, data_content, partition):
+        shard = self._shard_for_length(self._partition_length(data_content))
+        self._pending_adds[shard].append((entry_id, data_content, partition))
+    
+    def _flush_adds(self):
+        """Send buffered index updates to their shards"""
+        for shard, adds in enumerate(self._pending_adds):
+            if adds:
+                self._workers[shard][1].send(('add', adds))
+                self._pending_adds[shard] = []
+    
+    def _index_entry(self, entry):
+        """Route a newly stored entry to the shard owning its length band"""
+        if self._workers is None:
+            return  # The workers will load the entry when they start
+        self._queue_add(entry.id, str(entry.data_content), self.partition(entry.data_type))
+    
+    def warm_fuzzy_indexes(self):
+        """Start the shard workers, which load every stored entry"""
+        if self._workers is None:
+            self._start_workers()
+    
+    def _search_shards(self, contents, data_types):
+        """Return the lowest similar stored entry id (or None) in its type's partition for each content"""
+        if self._workers is None:
+            self._start_workers()
+        self._flush_adds()
+        requests = [[] for _ in range(self.num_workers)]
+        for position, (data_content, data_type) in enumerate(zip(contents, data_types)):
+            for shard in self._shards_for_query(data_content):
+                requests[shard].append((position, data_content, self.partition(data_type)))
+        # Send every request before waiting so the shards search concurrently
+        for shard, payload in enumerate(requests):
+            if payload:
+                self._workers[shard][1].send(('search', payload))
+        similar_ids = [None] * len(contents)
+        for shard, payload in enumerate(requests):
+            if not payload:
+                continue
+            for position, entry_id in self._workers[shard][1].recv():
+                if entry_id is not None and (similar_ids[position] is None or entry_id < similar_ids[position]):
+                    similar_ids[position] = entry_id
+        return similar_ids
+    
+    def find_similar_entry_id(self, data_content, data_type=None):
+        """Return the id of the first stored entry of data_type's partition similar to data_content, or None"""
+        return self._search_shards([data_content], [data_type])[0]
+    
+    def _find_similar_entries(self, contents, data_types):
+        """Return the first similar stored entry (or None) for each content, searching its type's partition"""
+        similar_ids = self._search_shards(contents, data_types)
+        entries = self.db_manager.get_data_entries_by_ids({entry_id for entry_id in similar_ids if entry_id is not None})
+        return [entries.get(entry_id) if entry_id is not None else None for entry_id in similar_ids]
+    
+    def close(self):
+        """Stop the shard workers"""
+        if self._workers is None:
+            return
+        for process, connection in self._workers:
+            connection.send(('stop', None))
+            connection.close()
+        for process, _ in self._workers:
+            process.join()
+        self._workers = None
+        self._pending_adds = None
@@ -1,52 +1,348 @@
-import hashlib
-try:
-    from Levenshtein import distance as levenshtein_distance
-    LEVENSHTEIN_AVAILABLE = True
-except ImportError:
-    LEVENSHTEIN_AVAILABLE = False
-    print("Warning: python-Levenshtein not installed. Using simple string comparison.")
+import heapq
+import importlib.util
+import time
+from canonicalize import canonical_form
+from config import Config
 from database_manager import DatabaseManager
+from fingerprint import Fingerprinter
+from metrics import MetricsCollector
+from models import DataEntry
+
+# The near-duplicate modules (and NumPy behind them) are imported on first
+# use, so commands that never compare content start without them
+LEVENSHTEIN_AVAILABLE = importlib.util.find_spec('Levenshtein') is not None
+_fallback_warned = False
+
+def _warn_fallback():
+    global _fallback_warned
+    if not LEVENSHTEIN_AVAILABLE and not _fallback_warned:
+        print("Warning: python-Levenshtein not installed. Using simple string comparison.")
+        _fallback_warned = True
 
 class RedundancyDetector:
     """Detects redundant and false positive data entries"""
     
-    def __init__(self):
-        self.db_manager = DatabaseManager()
+    MINHASH_TYPES = ('text', 'mixed')
+    EXACT_TYPES = ('number', 'boolean', 'date', 'datetime')  # Only exact and canonical matches when partitioned
+    
+    def __init__(self, db_manager=None, fuzzy_mode=None, hash_algorithm=None, similarity_engine=None):
+        self.db_manager = db_manager or DatabaseManager.shared()
+        self.fingerprinter = Fingerprinter(hash_algorithm)
+        if not self.db_manager.check_fingerprints(self.fingerprinter.algorithm):
+            # Keep hashing like the stored entries until they are migrated, so exact duplicates still match
+            stored_algorithm = self.db_manager.get_schema_info('hash_algorithm')
+            if stored_algorithm and stored_algorithm != self.fingerprinter.algorithm:
+                self.fingerprinter = Fingerprinter(stored_algorithm)
+        self.fuzzy_mode = fuzzy_mode or Config.FUZZY_SEARCH_MODE
+        if self.fuzzy_mode not in ('index', 'scan'):
+            raise ValueError(f"Unknown fuzzy search mode: {self.fuzzy_mode}")
+        self.distance_threshold = Config.FUZZY_DISTANCE_THRESHOLD
+        _warn_fallback()
+        self.matcher = None  # Bounded edit distance for the 'scan' mode, created on its first scan
+        self.canonical_matching = Config.CANONICAL_MATCHING
+        self.type_partitioning = Config.TYPE_PARTITIONING
+        self._canonical_backfilled = False
+        self._fuzzy_indexes = {}  # partition -> near-duplicate index, each built on its first lookup
+        self.similarity_engine = similarity_engine or Config.SIMILARITY_ENGINE
+        if self.similarity_engine not in ('levenshtein', 'minhash'):
+            raise ValueError(f"Unknown similarity engine: {self.similarity_engine}")
+        self.minhasher = None
+        if self.similarity_engine == 'minhash':
+            from minhash import MinHasher
+            self.minhasher = MinHasher()
+        self._minhash_backfilled = False
+        self.metrics = MetricsCollector(self.db_manager) if Config.METRICS_ENABLED else None
+        if self.canonical_matching:
+            self._backfill_canonical()
+    
+    def observe_stage(self, stage, start, count=1):
+        """Record the time since start for a stage, spread over count records; returns the current time"""
+        now = time.perf_counter()
+        if self.metrics is not None and count:
+            self.metrics.observe(stage, (now - start) * 1000 / count, count)
+        return now
+    
+    def _record_outcome(self, data_content, data_type, content_hash, is_redundant, elapsed_ms, entry):
+        """Count a processed record, flushing aggregated metrics when an interval has passed"""
+        if self.metrics is None:
+            return
+        self.metrics.record_outcome(data_content, data_type, content_hash, is_redundant, elapsed_ms,
+                                    similarity_score=getattr(entry, 'similarity_score', None) if not is_redundant else None,
+                                    success=entry is not None or is_redundant,
+                                    error_message=None if entry is not None or is_redundant else "Insert failed")
+        self.metrics.maybe_flush()
+    
+    def flush_metrics(self):
+        """Write buffered metrics and sampled logs now"""
+        if self.metrics is not None:
+            self.metrics.flush()
     
     def hash_data(self, data_content):
         """Generate a hash for the given data content"""
-        return hashlib.md5(data_content.encode('utf-8')).hexdigest()
+        return self.fingerprinter.hexdigest(data_content)
+    
+    def canonical_hash(self, data_content, data_type):
+        """Hash of the type-aware canonical form, stored in canonical_hash"""
+        return self.fingerprinter.hexdigest(canonical_form(data_content, data_type))
+    
+    def _backfill_canonical(self):
+        """Hash the canonical form of stored entries that predate the column, once per detector
+        
+        Resumes from whatever is still NULL, so an interrupted backfill simply
+        continues on the next start.
+        """
+        if self._canonical_backfilled:
+            return
+        after_id = 0
+        while True:
+            rows = self.db_manager.get_uncanonicalized_entries(after_id)
+            if not rows:
+                break
+            self.db_manager.store_canonical_hashes([(entry_id, self.canonical_hash(str(data_content), data_type))
+                                                    for entry_id, data_content, data_type in rows])
+            after_id = rows[-1][0]
+        self._canonical_backfilled = True
+    
+    def _find_canonical_entries(self, canonical_hashes):
+        """Return {canonical_hash: stored entry} for the canonical hashes that are already stored"""
+        entry_ids = self.db_manager.find_canonical_entries(canonical_hashes)
+        entries = self.db_manager.get_data_entries_by_ids(set(entry_ids.values()))
+        return {canonical_hash: entries[entry_id] for canonical_hash, entry_id in entry_ids.items() if entry_id in entries}
+    
+    def _entry_from_key(self, data_content, content_hash, entry_key):
+        """Build a lightweight DataEntry for an exact match from its cached (id, type) key"""
+        entry_id, data_type = entry_key
+        return DataEntry(id=entry_id, data_content=data_content, data_type=data_type, content_hash=content_hash)
     
     def is_duplicate(self, data_content):
-        """Check if the data content is a duplicate"""
+        """Check if the data content is a duplicate
+        
+        Exact matches are answered from the manager's hash cache where possible,
+        so the returned entry only carries id, content, type and hash.
+        """
+        start = time.perf_counter()
         content_hash = self.hash_data(data_content)
-        existing_entry = self.db_manager.get_data_entry_by_hash(content_hash)
-        return existing_entry is not None, existing_entry
+        start = self.observe_stage('hash', start)
+        entry_key = self.db_manager.find_entry_key(content_hash)
+        self.observe_stage('exact_lookup', start)
+        if entry_key is None:
+            return False, None
+        return True, self._entry_from_key(data_content, content_hash, entry_key)
+    
+    def _new_fuzzy_index(self):
+        """Create an empty near-duplicate index for the active comparison method"""
+        if LEVENSHTEIN_AVAILABLE:
+            from fuzzy_index import FuzzyIndex
+            return FuzzyIndex(self.distance_threshold - 1)
+        # Case-insensitive equality only needs the lowest key per folded content
+        return {}
+    
+    def _add_to_index(self, index, key, data_content):
+        """Add content to a near-duplicate index under key (keys must be added in ascending order)"""
+        if LEVENSHTEIN_AVAILABLE:
+            index.add(key, data_content)
+        else:
+            index.setdefault(data_content.lower(), key)
+    
+    def _search_index(self, index, data_content):
+        """Return the lowest key in index similar to data_content, or None"""
+        if LEVENSHTEIN_AVAILABLE:
+            return index.search(data_content)
+        return index.get(data_content.lower())
+    
+    def partition(self, data_type):
+        """Near-duplicate partition searched for records of data_type
+        
+        With TYPE_PARTITIONING each type is compared only with stored entries
+        of the same type, ignoring case, which are read through
+        idx_data_type. None stands for every stored entry: the partition of
+        untyped records and of all records when partitioning is off.
+        """
+        if not self.type_partitioning or data_type is None:
+            return None
+        return data_type.lower()
+    
+    def uses_fuzzy(self, data_type):
+        """Whether records of data_type get a near-duplicate search after the exact and canonical lookups"""
+        return self.partition(data_type) not in self.EXACT_TYPES
+    
+    def stored_types(self, partition):
+        """Spellings of data_type stored for a partition, or [None] (no filter) for the unscoped one"""
+        if partition is None:
+            return [None]
+        return [data_type for data_type in self.db_manager.get_data_types() if self.partition(data_type) == partition]
+    
+    def iter_partition_contents(self, partition):
+        """Stream (id, data_content) of a partition's stored entries in id order"""
+        return heapq.merge(*(self.db_manager.iter_entry_contents(data_type=data_type)
+                             for data_type in self.stored_types(partition)))
+    
+    def _build_fuzzy_index(self, partition=None):
+        """Load the stored entries of a partition into a new near-duplicate index"""
+        index = self._new_fuzzy_index()
+        for entry_id, data_content in self.iter_partition_contents(partition):
+            self._add_to_index(index, entry_id, str(data_content))
+        return index
+    
+    def _index_entry(self, entry):
+        """Keep the near-duplicate indexes in sync with a newly stored entry"""
+        # Indexes not built yet will pick the entry up when they are
+        for partition in {None, self.partition(entry.data_type)}:
+            if partition in self._fuzzy_indexes:
+                self._add_to_index(self._fuzzy_indexes[partition], entry.id, str(entry.data_content))
+    
+    def warm_fuzzy_indexes(self):
+        """Build the near-duplicate index of every stored partition that gets fuzzy searches"""
+        for partition in {self.partition(data_type) for data_type in self.db_manager.get_data_types()}:
+            if partition not in self._fuzzy_indexes and self.uses_fuzzy(partition):
+                self._fuzzy_indexes[partition] = self._build_fuzzy_index(partition)
+    
+    def find_similar_entry_id(self, data_content, data_type=None):
+        """Return the id of the first stored entry of data_type's partition similar to data_content, or None"""
+        partition = self.partition(data_type)
+        if partition not in self._fuzzy_indexes:
+            self._fuzzy_indexes[partition] = self._build_fuzzy_index(partition)
+        return self._search_index(self._fuzzy_indexes[partition], data_content)
     
-    def classify_data(self, new_data_content):
+    def _scan_similar_entry(self, new_data_content, data_type=None):
+        """Reference full-table scan used by the 'scan' fuzzy search mode"""
+        entries = heapq.merge(*(self.db_manager.iter_data_entries(data_type=stored_type)
+                                for stored_type in self.stored_types(self.partition(data_type))), key=lambda entry: entry.id)
+        if LEVENSHTEIN_AVAILABLE:
+            if self.matcher is None:
+                from edit_distance import BoundedDistance
+                self.matcher = BoundedDistance(self.distance_threshold - 1)
+            for entry in entries:
+                if self.matcher.within(new_data_content, str(entry.data_content)):
+                    return entry  # Data is similar to an existing entry
+        else:
+            # Fallback: simple string comparison for similarity
+            folded = new_data_content.lower()
+            for entry in entries:
+                if folded == str(entry.data_content).lower():
+                    return entry  # Data is similar to an existing entry
+        return None
+    
+    def uses_minhash(self, data_content, data_type=None):
+        """Whether content is compared by MinHash/LSH rather than edit distance
+        
+        Only long free-form entries qualify; short values and numbers, booleans
+        and dates keep the exact edit-distance comparison.
+        """
+        return (self.minhasher is not None
+                and (data_type is None or data_type.lower() in self.MINHASH_TYPES)
+                and len(data_content) >= Config.MINHASH_MIN_LENGTH)
+    
+    def _backfill_minhash(self):
+        """Sign stored long entries that predate the minhash engine, once per detector"""
+        if self._minhash_backfilled:
+            return
+        after_id = 0
+        while True:
+            rows = self.db_manager.get_unsigned_entries(self.MINHASH_TYPES, Config.MINHASH_MIN_LENGTH, after_id)
+            if not rows:
+                break
+            signed_entries = []
+            for entry_id, data_content in rows:
+                signature = self.minhasher.signature(str(data_content))
+                signed_entries.append((entry_id, self.minhasher.to_bytes(signature), self.minhasher.band_keys(signature)))
+            self.db_manager.store_minhash_signatures(signed_entries)
+            after_id = rows[-1][0]
+        self._minhash_backfilled = True
+    
+    def _best_stored_matches(self, signatures, data_types):
+        """Return the (score, entry id) of the most similar stored entry for each signature
+        
+        Candidates come from shared LSH buckets, limited to the partition of
+        the signature's data type; ties go to the lowest id. Signatures
+        without any candidate get (0.0, None).
+        """
+        self._backfill_minhash()
+        keys_per_signature = [self.minhasher.band_keys(signature) for signature in signatures]
+        buckets = self.db_manager.find_minhash_buckets({key for keys in keys_per_signature for key in keys})
+        candidate_ids = [sorted({entry_id for key in keys for entry_id in buckets.get(key, ())})
+                         for keys in keys_per_signature]
+        stored = self.db_manager.get_minhash_signatures({entry_id for ids in candidate_ids for entry_id in ids})
+        matches = []
+        for signature, data_type, ids in zip(signatures, data_types, candidate_ids):
+            partition = self.partition(data_type)
+            ids = [entry_id for entry_id in ids
+                   if entry_id in stored and (partition is None or self.partition(stored[entry_id][1]) == partition)]
+            scores = self.minhasher.similarities(signature, [self.minhasher.from_bytes(stored[entry_id][0]) for entry_id in ids])
+            if len(scores) == 0:
+                matches.append((0.0, None))
+            else:
+                best = int(scores.argmax())  # argmax returns the first, i.e. lowest id, on ties
+                matches.append((float(scores[best]), ids[best]))
+        return matches
+    
+    def _stored_score(self, score):
+        """similarity_score recorded for a unique entry: its best match if notable, else 0.0"""
+        return score if score >= Config.MIN_SIMILARITY_SCORE else 0.0
+    
+    def classify_data(self, new_data_content, data_type=None):
         """Classify new data as redundant or false positive"""
+        is_redundant, entry, _, _, _ = self._classify(new_data_content, data_type)
+        return is_redundant, entry
+    
+    def _classify(self, new_data_content, data_type=None):
+        """Classify new data, returning (is_redundant, entry, best similarity score, MinHash signature or None,
+        canonical hash or None for exact duplicates)"""
         is_duplicate, existing_entry = self.is_duplicate(new_data_content)
         
         if is_duplicate:
-            return True, existing_entry  # Data is a duplicate
+            return True, existing_entry, 1.0, None, None  # Data is a duplicate
         
-        # Fuzzy matching for false positives (only if Levenshtein is available)
-        if LEVENSHTEIN_AVAILABLE:
-            for entry in self.db_manager.get_all_data_entries():
-                if levenshtein_distance(new_data_content, str(entry.data_content)) < 3:  # Threshold for similarity
-                    return True, entry  # Data is similar to an existing entry
+        start = time.perf_counter()
+        canonical_hash = self.canonical_hash(new_data_content, data_type)
+        start = self.observe_stage('canonical_hash', start)
+        # The same value written differently ('1.0' and '1', 'TRUE' and 'yes') is an exact canonical match;
+        # untyped records are canonicalized as text, as _process_chunk does
+        if self.canonical_matching:
+            canonical_entry = self._find_canonical_entries([canonical_hash]).get(canonical_hash)
+            self.observe_stage('canonical_lookup', start)
+            if canonical_entry is not None:
+                return True, canonical_entry, 1.0, None, canonical_hash
+        
+        # Numbers, booleans and dates that differ after canonicalization are different values
+        if not self.uses_fuzzy(data_type):
+            return False, None, 0.0, None, canonical_hash
+        
+        start = time.perf_counter()
+        # Long text is compared by estimated Jaccard similarity over shingles
+        if self.uses_minhash(new_data_content, data_type):
+            signature = self.minhasher.signature(new_data_content)
+            score, similar_id = self._best_stored_matches([signature], [data_type])[0]
+            similar_entry = None
+            if similar_id is not None and score >= Config.SIMILARITY_THRESHOLD:
+                similar_entry = self.db_manager.get_data_entry_by_id(similar_id)
+            self.observe_stage('fuzzy_search', start)
+            return similar_entry is not None, similar_entry, score, signature, canonical_hash
+        
+        # Fuzzy matching for false positives
+        if self.fuzzy_mode == 'scan':
+            similar_entry = self._scan_similar_entry(new_data_content, data_type)
         else:
-            # Fallback: simple string comparison for similarity
-            for entry in self.db_manager.get_all_data_entries():
-                if new_data_content.lower() == str(entry.data_content).lower():
-                    return True, entry  # Data is similar to an existing entry
+            similar_entry = None
+            similar_id = self.find_similar_entry_id(new_data_content, data_type)
+            if similar_id is not None:
+                similar_entry = self.db_manager.get_data_entry_by_id(similar_id)
+        self.observe_stage('fuzzy_search', start)
         
-        return False, None  # Data is unique
+        if similar_entry is not None:
+            return True, similar_entry, 0.0, None, canonical_hash  # Data is similar to an existing entry
+        
+        return False, None, 0.0, None, canonical_hash  # Data is unique
     
     def process_data(self, data_content, data_type):
         """Process new data content"""
-        is_redundant, existing_entry = self.classify_data(data_content)
+        record_start = time.perf_counter()
+        is_redundant, existing_entry, score, signature, canonical_hash = self._classify(data_content, data_type)
+        content_hash = self.hash_data(data_content)
         
+        if is_redundant:
+            self._record_outcome(data_content, data_type, content_hash, True,
+                                 (time.perf_counter() - record_start) * 1000, existing_entry)
         if is_redundant and existing_entry:
             print(f"Data is redundant: {existing_entry.data_content}")
             return existing_entry
@@ -55,6 +351,227 @@ class RedundancyDetector:
             return None
         
         # If data is unique, add it to the database
-        content_hash = self.hash_data(data_content)
-        new_entry = self.db_manager.add_data_entry(data_content, data_type, content_hash)
+        start = time.perf_counter()
+        if signature is not None:
+            new_entry = self.db_manager.add_data_entry(
+                data_content, data_type, content_hash, similarity_score=self._stored_score(score),
+                minhash_signature=self.minhasher.to_bytes(signature), bucket_keys=self.minhasher.band_keys(signature),
+                canonical_hash=canonical_hash)
+        else:
+            new_entry = self.db_manager.add_data_entry(data_content, data_type, content_hash, canonical_hash=canonical_hash)
+        if new_entry is None:
+            entry_key = self.db_manager.find_entry_key(content_hash)
+            if entry_key is not None:
+                # Another writer stored the same content after it was looked up
+                existing_entry = self._entry_from_key(data_content, content_hash, entry_key)
+                self._record_outcome(data_content, data_type, content_hash, True,
+                                     (time.perf_counter() - record_start) * 1000, existing_entry)
+                return existing_entry
+        else:
+            self._index_entry(new_entry)
+        self.observe_stage('insert', start)
+        self._record_outcome(data_content, data_type, content_hash, False,
+                             (time.perf_counter() - record_start) * 1000, new_entry)
         return new_entry
+    
+    def process_batch(self, records, content_hashes=None):
+        """Process an iterable of (data_content, data_type) pairs in chunks of Config.BATCH_SIZE
+        
+        Returns one (is_redundant, entry) tuple per record, in input order, with
+        the same outcome process_data would give when called record by record.
+        content_hashes, if the caller has hashed the contents already, holds
+        hash_data() of each record in the same order and is used as is.
+        """
+        known_hashes = iter(content_hashes) if content_hashes is not None else None
+        results = []
+        chunk = []
+        hashes = []
+        for record in records:
+            chunk.append(record)
+            if known_hashes is not None:
+                hashes.append(next(known_hashes))
+            if len(chunk) >= Config.BATCH_SIZE:
+                results.extend(self._process_chunk(chunk, hashes=hashes or None))
+                chunk = []
+                hashes = []
+        if chunk:
+            results.extend(self._process_chunk(chunk, hashes=hashes or None))
+        return results
+    
+    def _find_similar_entries(self, contents, data_types):
+        """Return the first similar stored entry (or None) for each content, searching its type's partition"""
+        if self.fuzzy_mode == 'scan':
+            return [self._scan_similar_entry(content, data_type) for content, data_type in zip(contents, data_types)]
+        similar_ids = [self.find_similar_entry_id(content, data_type) for content, data_type in zip(contents, data_types)]
+        entries = self.db_manager.get_data_entries_by_ids({entry_id for entry_id in similar_ids if entry_id is not None})
+        return [entries.get(entry_id) if entry_id is not None else None for entry_id in similar_ids]
+    
+    def _process_chunk(self, chunk, attempt=1, hashes=None):
+        """Classify and store one chunk with a single hash lookup and a single bulk insert
+        
+        A unit of work that failed on a locked or dropped connection is run
+        again with backoff, up to MAX_BATCH_RETRIES attempts. Any other
+        failure (typically another writer storing one of the chunk's hashes
+        between the lookup and the insert) is run once more, so the second
+        lookup sees those entries instead of losing the chunk.
+        """
+        chunk_start = start = time.perf_counter()
+        contents = [data_content for data_content, _ in chunk]
+        if hashes is None:
+            hashes = [self.hash_data(data_content) for data_content in contents]
+            start = self.observe_stage('hash', start, len(chunk))
+        canonical_hashes = [self.canonical_hash(data_content, data_type) for data_content, data_type in chunk]
+        start = self.observe_stage('canonical_hash', start, len(chunk))
+        
+        # Exact duplicates inside the chunk share the outcome of their first occurrence in the same
+        # partition; a surviving first occurrence is an exact match for every partition
+        first_positions = {}
+        first_in_partition = {}
+        for position, content_hash in enumerate(hashes):
+            first_positions.setdefault(content_hash, position)
+            first_in_partition.setdefault((content_hash, self.partition(chunk[position][1])), position)
+        partition_firsts = [first_in_partition[(content_hash, self.partition(chunk[position][1]))]
+                            for position, content_hash in enumerate(hashes)]
+        if self.minhasher is not None:
+            self._backfill_minhash()  # Commits on its own, outside the chunk's unit of work
+        # One connection and transaction serve every lookup and the insert of this chunk
+        with self.db_manager.session_scope() as unit:
+            existing = {
+                content_hash: self._entry_from_key(contents[first_positions[content_hash]], content_hash, entry_key)
+                for content_hash, entry_key in self.db_manager.find_entry_keys(first_positions).items()
+            }
+            start = self.observe_stage('exact_lookup', start, len(first_positions))
+            unmatched_positions = [position for position, content_hash in enumerate(hashes)
+                                   if content_hash not in existing and partition_firsts[position] == position]
+            canonical_entries = {}
+            if self.canonical_matching:
+                canonical_entries = self._find_canonical_entries({canonical_hashes[p] for p in unmatched_positions})
+                start = self.observe_stage('canonical_lookup', start, len(unmatched_positions))
+                # Canonical matches against stored entries never reach the similarity engines
+                unmatched_positions = [p for p in unmatched_positions if canonical_hashes[p] not in canonical_entries]
+            minhash_positions = [p for p in unmatched_positions if self.uses_minhash(contents[p], chunk[p][1])]
+            fuzzy_positions = [p for p in unmatched_positions
+                               if self.uses_fuzzy(chunk[p][1]) and not self.uses_minhash(contents[p], chunk[p][1])]
+            similar_entries = dict(zip(fuzzy_positions, self._find_similar_entries([contents[p] for p in fuzzy_positions],
+                                                                                   [chunk[p][1] for p in fuzzy_positions])))
+            signatures, stored_matches = {}, {}
+            if minhash_positions:
+                signatures = {p: self.minhasher.signature(contents[p]) for p in minhash_positions}
+                stored_matches = dict(zip(minhash_positions, self._best_stored_matches([signatures[p] for p in minhash_positions],
+                                                                                       [chunk[p][1] for p in minhash_positions])))
+                matched_ids = {entry_id for score, entry_id in stored_matches.values()
+                               if entry_id is not None and score >= Config.SIMILARITY_THRESHOLD}
+                matched_entries = self.db_manager.get_data_entries_by_ids(matched_ids)
+            
+            # Stored entries always have lower ids than this chunk's survivors, so they
+            # are checked first; survivors are matched against each other in input order
+            pending_indexes = {}  # partition -> near-duplicate index of survivor positions
+            # Untyped records search every survivor, so only then is the unscoped index kept as well
+            track_unscoped = any(self.partition(data_type) is None for _, data_type in chunk)
+            
+            def pending_index(partition):
+                if partition not in pending_indexes:
+                    pending_indexes[partition] = self._new_fuzzy_index()
+                return pending_indexes[partition]
+            
+            def add_pending(position):
+                partition = self.partition(chunk[position][1])
+                for target in ({partition, None} if track_unscoped else {partition}):
+                    self._add_to_index(pending_index(target), position, contents[position])
+            
+            pending_buckets = {}  # (partition, LSH bucket key) -> survivor positions
+            pending_canonical = {}  # canonical hash -> survivor position
+            outcomes = [None] * len(chunk)  # (is_redundant, entry) or (is_redundant, survivor position)
+            survivors = []
+            surviving_hashes = {}  # content hash -> survivor position
+            scores = {}
+            for position, content_hash in enumerate(hashes):
+                if content_hash in existing:
+                    outcomes[position] = (True, existing[content_hash])
+                elif content_hash in surviving_hashes:
+                    outcomes[position] = (True, surviving_hashes[content_hash])
+                elif partition_firsts[position] != position:
+                    outcomes[position] = (True, outcomes[partition_firsts[position]][1])
+                elif canonical_hashes[position] in canonical_entries:
+                    outcomes[position] = (True, canonical_entries[canonical_hashes[position]])
+                elif self.canonical_matching and canonical_hashes[position] in pending_canonical:
+                    outcomes[position] = (True, pending_canonical[canonical_hashes[position]])
+                elif position in signatures:
+                    signature = signatures[position]
+                    keys = self.minhasher.band_keys(signature)
+                    score, target = stored_matches[position]
+                    if target is not None:
+                        target = matched_entries.get(target)
+                    # A survivor only wins over a stored entry with a strictly higher score
+                    partition = self.partition(chunk[position][1])
+                    pending_positions = sorted({p for key in keys for p in pending_buckets.get((partition, key), ())})
+                    pending_scores = self.minhasher.similarities(signature, [signatures[p] for p in pending_positions])
+                    if len(pending_scores) and pending_scores.max() > score:
+                        best = int(pending_scores.argmax())
+                        score, target = float(pending_scores[best]), pending_positions[best]
+                    if target is not None and score >= Config.SIMILARITY_THRESHOLD:
+                        outcomes[position] = (True, target)
+                    else:
+                        for target in ({partition, None} if track_unscoped else {partition}):
+                            for key in keys:
+                                pending_buckets.setdefault((target, key), []).append(position)
+                        add_pending(position)
+                        pending_canonical.setdefault(canonical_hashes[position], position)
+                        survivors.append(position)
+                        surviving_hashes[content_hash] = position
+                        scores[position] = score
+                        outcomes[position] = (False, position)
+                elif not self.uses_fuzzy(chunk[position][1]):
+                    pending_canonical.setdefault(canonical_hashes[position], position)
+                    survivors.append(position)
+                    surviving_hashes[content_hash] = position
+                    outcomes[position] = (False, position)
+                elif similar_entries[position] is not None:
+                    outcomes[position] = (True, similar_entries[position])
+                else:
+                    similar_position = self._search_index(pending_index(self.partition(chunk[position][1])),
+                                                          contents[position])
+                    if similar_position is not None:
+                        outcomes[position] = (True, similar_position)
+                    else:
+                        add_pending(position)
+                        pending_canonical.setdefault(canonical_hashes[position], position)
+                        survivors.append(position)
+                        surviving_hashes[content_hash] = position
+                        outcomes[position] = (False, position)
+            start = self.observe_stage('fuzzy_search', start, len(unmatched_positions))
+            
+            rows = []
+            for p in survivors:
+                row = {'data_content': contents[p], 'data_type': chunk[p][1], 'content_hash': hashes[p],
+                       'canonical_hash': canonical_hashes[p], 'similarity_score': 0.0, 'minhash_signature': None,
+                       'bucket_keys': None}
+                if p in signatures:
+                    row.update(similarity_score=self._stored_score(scores[p]),
+                               minhash_signature=self.minhasher.to_bytes(signatures[p]),
+                               bucket_keys=self.minhasher.band_keys(signatures[p]))
+                rows.append(row)
+            new_entries = self.db_manager.add_data_entries(rows)
+        if unit.failed:
+            if unit.transient and attempt < Config.MAX_BATCH_RETRIES:
+                print(f"Retrying chunk (attempt {attempt + 1}/{Config.MAX_BATCH_RETRIES})")
+                time.sleep(0.1 * attempt)
+                return self._process_chunk(chunk, attempt + 1, hashes)
+            if not unit.transient and attempt == 1:
+                return self._process_chunk(chunk, attempt + 1, hashes)
+            new_entries = None
+        stored = {}
+        if new_entries is not None:
+            for position, new_entry in zip(survivors, new_entries):
+                stored[position] = new_entry
+                self._index_entry(new_entry)
+        end = self.observe_stage('insert', start, len(survivors))
+        
+        elapsed_ms = (end - chunk_start) * 1000 / len(chunk)
+        results = []
+        for position, (is_redundant, target) in enumerate(outcomes):
+            if isinstance(target, int):
+                target = stored.get(target)
+            results.append((is_redundant, target))
+            self._record_outcome(contents[position], chunk[position][1], hashes[position], is_redundant, elapsed_ms, target)
+        return results
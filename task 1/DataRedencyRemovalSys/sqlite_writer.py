@@ -0,0 +1,91 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from sqlalchemy.orm import Session
+from config import Config
+
+_STOP = object()
+
+class SQLiteWriter:
+    """Single writer thread that group-commits queued inserts on its own connection
+    
+    SQLite allows one writer at a time, so sending every insert through one
+    thread avoids lock contention between writers. Requests that arrive
+    while a commit is in progress, or within SQLITE_GROUP_COMMIT_MS of the
+    first one, are written in the same transaction, so one fsync covers all
+    of them. Readers keep using pooled connections, which WAL lets run
+    alongside the writer.
+    """
+    
+    def __init__(self, db_manager, group_commit_ms=None, max_rows=None):
+        self.db_manager = db_manager
+        self.group_commit_seconds = (Config.SQLITE_GROUP_COMMIT_MS if group_commit_ms is None else group_commit_ms) / 1000
+        self.max_rows = max_rows or Config.BATCH_SIZE
+        self.commits = 0
+        self.requests = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+        self._thread.start()
+    
+    def submit(self, rows):
+        """Queue rows for insertion; the Future resolves to the new DataEntry objects in order"""
+        future = Future()
+        self._queue.put((rows, future))
+        return future
+    
+    def close(self):
+        """Write everything already queued, then stop the thread"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+    
+    def _next_group(self, first):
+        """Collect queued requests behind first, up to max_rows or the group commit wait"""
+        group = [first]
+        rows = len(first[0])
+        deadline = time.monotonic() + self.group_commit_seconds
+        while rows < self.max_rows:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)  # Stop after this group is written
+                break
+            group.append(item)
+            rows += len(item[0])
+        return group
+    
+    def _write(self, session, group):
+        """Insert a group in one transaction; on failure retry its requests one by one"""
+        try:
+            results = [self.db_manager._insert_entries(session, rows) for rows, _ in group]
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            if len(group) == 1:
+                group[0][1].set_exception(e)
+            else:
+                # Isolate the failing request so the others still commit
+                for request in group:
+                    self._write(session, [request])
+            return
+        self.commits += 1
+        self.requests += len(group)
+        for (_, future), new_entries in zip(group, results):
+            future.set_result(new_entries)
+    
+    def _run(self):
+        connection = self.db_manager.engine.connect()
+        session = Session(bind=connection, expire_on_commit=False)
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                self._write(session, self._next_group(item))
+        finally:
+            session.close()
+            connection.close()
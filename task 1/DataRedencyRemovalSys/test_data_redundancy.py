@@ -1,9 +1,34 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
 import unittest
+import numpy as np
 from database_manager import DatabaseManager
-from redundancy_detector import RedundancyDetector
-from data_validator import DataValidator
-from models import Base
-from sqlalchemy import create_engine
+from redundancy_detector import LEVENSHTEIN_AVAILABLE, RedundancyDetector
+from data_validator import NOT_NUMERIC, VALID, DataValidator
+from config import Config
+from fingerprint import Fingerprinter, to_int64
+from blob_store import BlobCodec, decode_payload
+from edit_distance import BoundedDistance, banded_distance, char_signature, histogram_bound, signature_bound
+from fuzzy_index import FuzzyIndex
+from hash_cache import HashCache, MISS
+import parallel_detector
+from parallel_detector import ParallelRedundancyDetector
+from ingest import IngestPipeline, iter_record_chunks, save_checkpoint
+from minhash import MinHasher
+from canonicalize import canonical_form
+from compaction import CHECKPOINT_KEY, Compactor
+from benchmark import WorkloadGenerator, compare
+from async_service import AsyncIngestService, send_records
+from metrics import MetricsCollector, build_report, bucket_index, bucket_upper_bound, histogram_percentile
+from models import Base, ProcessingLog, SystemMetrics
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.engine import Engine
 
 class TestDataRedundancySystem(unittest.TestCase):
     
@@ -35,6 +60,24 @@ class TestDataRedundancySystem(unittest.TestCase):
         is_valid, msg = self.data_validator.validate_data("", "text")
         self.assertFalse(is_valid)
     
+    def test_batch_validation_matches_per_record(self):
+        """Test that validate_batch gives validate_data's verdict and message for every row"""
+        contents = ["42", " 1e3 ", "nan", "1_000", "abc", "", "   ", "YES", "maybe", "2024-01-31", "31/01/2024",
+                    "x" * (Config.MAX_STRING_LENGTH + 1), None, 7]
+        data_types = ['text', 'number', 'Boolean', 'date', 'datetime', 'mixed', 'bogus', None, 3, ['text'], {'type': 'text'}]
+        rows = [(content, data_type) for content in contents for data_type in data_types]
+        mask, codes = self.data_validator.validate_batch([row[0] for row in rows], [row[1] for row in rows])
+        self.assertEqual(codes.dtype, np.uint8)
+        for (content, data_type), is_valid, code in zip(rows, mask, codes):
+            expected_valid, expected_msg = self.data_validator.validate_data(content, data_type)
+            self.assertEqual(is_valid, expected_valid, (content, data_type))
+            if not expected_valid:
+                self.assertEqual(self.data_validator.error_message(code), expected_msg)
+        
+        mask, codes = self.data_validator.validate_batch(["1", "one"], 'number')
+        self.assertEqual(mask.tolist(), [True, False])
+        self.assertEqual(codes.tolist(), [VALID, NOT_NUMERIC])
+    
     def test_hash_generation(self):
         """Test hash generation consistency"""
         content = "test content"
@@ -104,5 +147,1196 @@ class TestDataRedundancySystem(unittest.TestCase):
         valid_results = [r for r in results if r is not None]
         self.assertEqual(len(valid_results), 4)
 
+def edit_distance(a, b):
+    """Reference Levenshtein distance"""
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+class TestFuzzyIndex(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up an isolated database file"""
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.db_manager = DatabaseManager(f'sqlite:///{self.db_path}')
+    
+    def tearDown(self):
+        """Remove the database file"""
+        self.db_manager.close()
+        os.remove(self.db_path)
+    
+    def test_candidates_respect_distance_bounds(self):
+        """Test that candidate generation never drops a true match"""
+        index = FuzzyIndex(max_distance=2)
+        stored = ["sample text", "sample txt", "other words", "ab", "abcd", "sample text data"]
+        for entry_id, content in enumerate(stored, start=1):
+            index.add(entry_id, content)
+        
+        candidates = index.candidates("sample texts")
+        self.assertIn(1, candidates)
+        self.assertIn(2, candidates)
+        self.assertNotIn(3, candidates)
+        self.assertNotIn(4, candidates)
+        self.assertIn(4, index.candidates("abc"))
+    
+    def test_compacted_postings_match_brute_force(self):
+        """Test searches across compacted and recent postings against a brute-force scan"""
+        rng = random.Random(5)
+        stored = [''.join(rng.choice("abcé ") for _ in range(rng.randint(3, 14))) for _ in range(300)]
+        index = FuzzyIndex(max_distance=2, min_compaction=40)
+        for entry_id, content in enumerate(stored, start=1):
+            index.add(entry_id, content)
+        self.assertGreater(len(index._positions), 0)
+        self.assertEqual(index.arena.content(index.arena.find(7)), stored[6])
+        
+        for query in stored[::7] + ["abcéa", "zzzz", "a b c d e"]:
+            expected = next((entry_id for entry_id, content in enumerate(stored, start=1)
+                             if edit_distance(query, content) <= 2), None)
+            self.assertEqual(index.search(query, edit_distance), expected, query)
+            self.assertEqual(index.search(query), expected, query)
+    
+    def test_bounded_distance_matches_full_distance(self):
+        """Test that the bounds never exceed the distance and the bounded kernels agree with it"""
+        rng = random.Random(8)
+        contents = [''.join(rng.choice("abcé ") for _ in range(rng.randint(0, 10))) for _ in range(120)]
+        matcher = BoundedDistance(2)
+        for content, other in zip(contents, contents[1:] + contents[:1]):
+            distance = edit_distance(content, other)
+            self.assertLessEqual(signature_bound(char_signature(content), char_signature(other)), distance)
+            self.assertLessEqual(histogram_bound(content, other), distance)
+            for max_distance in range(4):
+                self.assertEqual(banded_distance(content, other, max_distance), min(distance, max_distance + 1))
+            self.assertEqual(matcher.distance(content, other), min(distance, 3))
+        
+        query = contents[0] + "x"
+        expected = [min(edit_distance(query, content), 3) for content in contents]
+        self.assertEqual(matcher.distances(query, contents).tolist(), expected)
+        signatures = np.array([char_signature(content) for content in contents], dtype=np.uint64)
+        self.assertEqual(matcher.first_within(query, contents, signatures=signatures),
+                         next(position for position, distance in enumerate(expected) if distance <= 2))
+    
+    def test_index_matches_full_scan(self):
+        """Test that indexed fuzzy search returns the same entries as the full scan"""
+        rng = random.Random(42)
+        alphabet = "abcde "
+        base = [''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 12))) for _ in range(150)]
+        queries = []
+        for content in base:
+            chars = list(content)
+            for _ in range(rng.randint(0, 3)):
+                chars.insert(rng.randint(0, len(chars)), rng.choice(alphabet))
+            queries.append(''.join(chars))
+        
+        indexed = RedundancyDetector(self.db_manager, fuzzy_mode='index')
+        scanned = RedundancyDetector(self.db_manager, fuzzy_mode='scan')
+        for content in base[:75]:
+            indexed.process_data(content, "text")
+        
+        for content in queries + base[75:]:
+            is_redundant_scan, entry_scan = scanned.classify_data(content)
+            is_redundant_index, entry_index = indexed.classify_data(content)
+            self.assertEqual(is_redundant_scan, is_redundant_index, content)
+            if entry_scan is not None:
+                self.assertEqual(entry_scan.id, entry_index.id, content)
+
+class TestBatchProcessing(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up two isolated database files"""
+        self.db_paths = []
+        self.db_managers = []
+        for _ in range(2):
+            fd, db_path = tempfile.mkstemp(suffix='.db')
+            os.close(fd)
+            self.db_paths.append(db_path)
+            self.db_managers.append(DatabaseManager(f'sqlite:///{db_path}'))
+        self.original_batch_size = Config.BATCH_SIZE
+        Config.BATCH_SIZE = 16
+    
+    def tearDown(self):
+        """Remove the database files"""
+        Config.BATCH_SIZE = self.original_batch_size
+        for db_manager, db_path in zip(self.db_managers, self.db_paths):
+            db_manager.close()
+            os.remove(db_path)
+    
+    def test_batch_matches_sequential_processing(self):
+        """Test that process_batch gives the same outcomes as process_data"""
+        rng = random.Random(7)
+        records = []
+        for _ in range(120):
+            content = ''.join(rng.choice("abcxyz ") for _ in range(rng.randint(3, 10)))
+            if records and rng.random() < 0.3:
+                content = rng.choice(records)[0]  # Exact duplicate, possibly inside the same chunk
+            records.append((content, rng.choice(["text", "mixed"])))
+        
+        sequential = RedundancyDetector(self.db_managers[0])
+        expected = []
+        for content, data_type in records:
+            is_redundant, _ = sequential.classify_data(content, data_type)
+            entry = sequential.process_data(content, data_type)
+            expected.append((is_redundant, entry.id))
+        
+        batch = RedundancyDetector(self.db_managers[1])
+        results = batch.process_batch(records)
+        self.assertEqual(len(results), len(records))
+        self.assertEqual([(is_redundant, entry.id) for is_redundant, entry in results], expected)
+        self.assertEqual(results[0][1].data_content, records[0][0])
+        
+        # Untyped records get the same canonical lookup (as text) on both paths
+        untyped = [(entry.data_content.upper() + "  ", None) for is_redundant, entry in results[:40] if not is_redundant]
+        expected = [(is_redundant, entry.id) for is_redundant, entry in (sequential.classify_data(content) for content, _ in untyped)]
+        self.assertEqual([(is_redundant, entry.id) for is_redundant, entry in batch.process_batch(untyped)], expected)
+    
+    def test_parallel_matches_sequential_processing(self):
+        """Test that the sharded parallel detector gives the same outcomes as process_batch"""
+        rng = random.Random(11)
+        spellings = ["text", "Text", "TEXT"]  # One partition, loaded from several stored spellings
+        base = [''.join(rng.choice("abcdef ") for _ in range(rng.randint(1, 30))) for _ in range(80)]
+        records = [(content, rng.choice(spellings)) for content in base]
+        for content in base:
+            chars = list(content)
+            chars.insert(rng.randint(0, len(chars)), rng.choice("abcdef"))
+            records.append((''.join(chars), rng.choice(spellings)))
+        rng.shuffle(records)
+        
+        expected = RedundancyDetector(self.db_managers[0]).process_batch(records)
+        with ParallelRedundancyDetector(self.db_managers[1], num_workers=3, band_width=2) as parallel:
+            results = parallel.process_batch(records[:60])
+        # Fresh workers load the stored entries of every spelling before the rest
+        with ParallelRedundancyDetector(self.db_managers[1], num_workers=3, band_width=2) as parallel:
+            results += parallel.process_batch(records[60:])
+            single_results = [parallel.classify_data(content) for content, _ in records]
+        
+        self.assertEqual([(r, e.id) for r, e in results], [(r, e.id) for r, e in expected])
+        self.assertTrue(all(is_redundant for is_redundant, _ in single_results))
+    
+    def test_fallback_shard_keeps_lowest_id(self):
+        """Test that a shard without Levenshtein answers with the lowest id even when ids arrive out of order"""
+        parent_connection, child_connection = multiprocessing.Pipe()
+        parallel_detector.LEVENSHTEIN_AVAILABLE = False
+        try:
+            worker = threading.Thread(target=parallel_detector._shard_worker, args=(child_connection, 0))
+            worker.start()
+            parent_connection.send(('add', [(7, "Same Value", "text"), (3, "same value", "text"), (5, "SAME VALUE", "text")]))
+            parent_connection.send(('search', [(0, "same VALUE", "text"), (1, "same value", None)]))
+            self.assertEqual(parent_connection.recv(), [(0, 3), (1, 3)])
+            parent_connection.send(('stop', None))
+            worker.join()
+        finally:
+            parallel_detector.LEVENSHTEIN_AVAILABLE = LEVENSHTEIN_AVAILABLE
+    
+    def test_failed_chunk_returns_readable_matches(self):
+        """Test that matches loaded inside a unit of work that rolled back can still be read"""
+        detector = RedundancyDetector(self.db_managers[0])
+        stored = detector.process_data("hello world", "text")
+        db_manager = detector.db_manager
+        db_manager.add_data_entries = lambda rows: db_manager.get_session().rollback()  # The insert fails the unit
+        results = detector.process_batch([("Hello  World", "text"), ("nothing like it at all", "text")])
+        del db_manager.add_data_entries
+        self.assertTrue(results[0][0])
+        self.assertEqual((results[0][1].id, results[0][1].data_content), (stored.id, "hello world"))
+        self.assertIsNone(results[1][1])
+    
+    def test_locked_chunk_retried_with_backoff(self):
+        """Test that a chunk whose unit fails on a locked database is rerun up to MAX_BATCH_RETRIES times"""
+        detector = RedundancyDetector(self.db_managers[0])
+        db_manager = detector.db_manager
+        add_data_entries = db_manager.add_data_entries
+        locked = []
+        
+        def flaky(rows):
+            if len(locked) < failures:
+                locked.append(rows)
+                try:
+                    raise OperationalError("INSERT INTO data_entries", {}, Exception("database is locked"))
+                except OperationalError:
+                    db_manager.get_session().rollback()
+                return None
+            return add_data_entries(rows)
+        
+        db_manager.add_data_entries = flaky
+        failures = Config.MAX_BATCH_RETRIES - 1
+        results = detector.process_batch([("stored after retries", "text")])
+        self.assertEqual(len(locked), failures)
+        self.assertEqual(results[0][1].data_content, "stored after retries")
+        
+        locked.clear()
+        failures = Config.MAX_BATCH_RETRIES
+        results = detector.process_batch([("never stored", "text")])
+        del db_manager.add_data_entries
+        self.assertEqual(len(locked), Config.MAX_BATCH_RETRIES)
+        self.assertIsNone(results[0][1])
+    
+    def test_batch_detects_existing_entries(self):
+        """Test that a batch resolves exact duplicates of stored entries"""
+        detector = RedundancyDetector(self.db_managers[0])
+        stored = detector.process_data("already stored", "text")
+        results = detector.process_batch([("already stored", "text"), ("brand new value", "text")])
+        self.assertTrue(results[0][0])
+        self.assertEqual(results[0][1].id, stored.id)
+        self.assertFalse(results[1][0])
+        self.assertIsNotNone(detector.db_manager.get_data_entry_by_hash(detector.hash_data("brand new value")))
+
+class TestHashCache(unittest.TestCase):
+    
+    def test_scan_does_not_evict_hot_keys(self):
+        """Test that a stream of one-off hashes leaves promoted entries cached"""
+        cache = HashCache(capacity=10, bloom_capacity=1000)
+        for i in range(5):
+            cache.add(f"{i:032x}", i, "text")
+            cache.lookup(f"{i:032x}")  # Second touch promotes to the protected segment
+        for i in range(100, 200):
+            cache.add(f"{i:032x}", i, "text")
+        
+        for i in range(5):
+            self.assertEqual(cache.lookup(f"{i:032x}"), (i, "text"))
+        self.assertLessEqual(len(cache), 10)
+    
+    def test_negative_lookups(self):
+        """Test Bloom rejections and invalidation of cached negative answers"""
+        cache = HashCache(capacity=10, bloom_capacity=100)
+        content_hash = "ab" * 16
+        self.assertIsNone(cache.lookup(content_hash))
+        self.assertEqual(cache.stats()['bloom_rejections'], 1)
+        
+        cache.bloom.add(content_hash)
+        self.assertIs(cache.lookup(content_hash), MISS)
+        cache.put(content_hash, None)
+        self.assertIsNone(cache.lookup(content_hash))
+        
+        cache.add(content_hash, 7, "number")
+        self.assertEqual(cache.lookup(content_hash), (7, "number"))
+    
+    def test_other_writers_are_not_missed(self):
+        """Test that entries stored by another manager are found instead of inserted again"""
+        untrusting = HashCache(capacity=10, bloom_capacity=100, trust_negatives=False)
+        untrusting.put("cd" * 16, None)
+        self.assertIs(untrusting.lookup("cd" * 16), MISS)
+        
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        db_manager = DatabaseManager(f'sqlite:///{db_path}')
+        other = DatabaseManager(f'sqlite:///{db_path}')
+        try:
+            detector = RedundancyDetector(db_manager)
+            detector.metrics = None
+            self.assertEqual(detector.is_duplicate("written elsewhere"), (False, None))
+            self.assertEqual(detector.process_batch([("batch elsewhere", "text")])[0][0], False)
+            stored = other.add_data_entry("written elsewhere", "text", detector.hash_data("written elsewhere"))
+            self.assertEqual(detector.process_data("written elsewhere", "text").id, stored.id)
+            
+            # A row stored since it was looked up is skipped rather than failing the whole insert
+            rows = [{'data_content': content, 'data_type': "text", 'content_hash': detector.hash_data(content)}
+                    for content in ("batch elsewhere", "only here")]
+            new_entries = db_manager.add_data_entries(rows)
+            self.assertIsNone(new_entries[0])
+            self.assertEqual(new_entries[1].data_content, "only here")
+        finally:
+            other.close()
+            db_manager.close()
+            os.remove(db_path)
+    
+    def test_duplicate_stream_served_from_memory(self):
+        """Test that repeated duplicates do not reach the database"""
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        db_manager = DatabaseManager(f'sqlite:///{db_path}')
+        try:
+            detector = RedundancyDetector(db_manager)
+            first = detector.process_data("hot duplicate", "text")
+            misses = db_manager.hash_cache.stats()['misses']
+            for _ in range(50):
+                is_duplicate, entry = detector.is_duplicate("hot duplicate")
+                self.assertTrue(is_duplicate)
+                self.assertEqual(entry.id, first.id)
+            self.assertEqual(db_manager.hash_cache.stats()['misses'], misses)
+            
+            # A fresh manager warms its cache from the table
+            warmed = DatabaseManager(f'sqlite:///{db_path}')
+            self.assertEqual(warmed.find_entry_key(detector.hash_data("hot duplicate")), (first.id, "text"))
+            self.assertEqual(warmed.hash_cache.stats()['misses'], 0)
+            warmed.close()
+        finally:
+            db_manager.close()
+            os.remove(db_path)
+
+class TestFingerprints(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up an isolated database file"""
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.original_lookup_index = Config.FINGERPRINT_LOOKUP_INDEX
+    
+    def tearDown(self):
+        """Remove the database file"""
+        Config.FINGERPRINT_LOOKUP_INDEX = self.original_lookup_index
+        os.remove(self.db_path)
+    
+    def test_algorithms(self):
+        """Test digest lengths and the integer fold"""
+        self.assertEqual(len(Fingerprinter('md5').hexdigest("abc")), 32)
+        self.assertEqual(len(Fingerprinter('sha1').hexdigest("abc")), 40)
+        self.assertEqual(len(Fingerprinter('blake2b').hexdigest("abc")), 64)
+        self.assertEqual(len(Fingerprinter('xxh64').hexdigest("abc")), 16)
+        self.assertEqual(to_int64('f' * 16), -1)
+        self.assertEqual(to_int64('0' * 15 + '1'), 1)
+        with self.assertRaises(ValueError):
+            Fingerprinter('crc32')
+    
+    def test_migrate_legacy_md5_rows(self):
+        """Test that a pre-existing md5 table is upgraded and rehashed"""
+        legacy_engine = create_engine(f'sqlite:///{self.db_path}')
+        with legacy_engine.begin() as connection:
+            connection.execute(text(
+                "CREATE TABLE data_entries (id INTEGER PRIMARY KEY, data_content TEXT NOT NULL, "
+                "data_type VARCHAR(50) NOT NULL, content_hash VARCHAR(64) NOT NULL UNIQUE, "
+                "similarity_score FLOAT, is_redundant BOOLEAN, is_false_positive BOOLEAN, "
+                "created_at DATETIME, updated_at DATETIME)"))
+            connection.execute(text(
+                "INSERT INTO data_entries (data_content, data_type, content_hash) "
+                "VALUES ('legacy row', 'text', :content_hash)"), {'content_hash': Fingerprinter('md5').hexdigest('legacy row')})
+        legacy_engine.dispose()
+        
+        Config.FINGERPRINT_LOOKUP_INDEX = True
+        db_manager = DatabaseManager(f'sqlite:///{self.db_path}')
+        try:
+            self.assertFalse(db_manager.check_fingerprints('sha1'))
+            self.assertEqual(db_manager.get_schema_info('hash_algorithm'), 'md5')
+            
+            # Until the migration runs, the detector keeps hashing with the stored algorithm
+            legacy_detector = RedundancyDetector(db_manager, hash_algorithm='sha1')
+            self.assertEqual(legacy_detector.fingerprinter.algorithm, 'md5')
+            is_duplicate, entry = legacy_detector.is_duplicate('legacy row')
+            self.assertTrue(is_duplicate)
+            self.assertEqual(entry.id, 1)
+            
+            self.assertEqual(db_manager.migrate_fingerprints(Fingerprinter('sha1')), 1)
+            self.assertTrue(db_manager.check_fingerprints('sha1'))
+            detector = RedundancyDetector(db_manager, hash_algorithm='sha1')
+            self.assertEqual(detector.fingerprinter.algorithm, 'sha1')
+            is_duplicate, entry = detector.is_duplicate('legacy row')
+            self.assertTrue(is_duplicate)
+            self.assertEqual(entry.id, 1)
+            
+            new_entry = detector.process_data('fresh row', 'text')
+            self.assertEqual(new_entry.content_fingerprint, to_int64(detector.hash_data('fresh row')))
+        finally:
+            db_manager.close()
+
+class TestStreamingIngest(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up an isolated database and working directory"""
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.db_manager = DatabaseManager(f'sqlite:///{os.path.join(self.work_dir.name, "ingest.db")}')
+    
+    def tearDown(self):
+        """Remove the working directory"""
+        self.db_manager.close()
+        self.work_dir.cleanup()
+    
+    def _pipeline(self):
+        return IngestPipeline(RedundancyDetector(self.db_manager), DataValidator())
+    
+    def test_csv_and_jsonl_readers(self):
+        """Test that both readers stream the same records in chunks"""
+        csv_path = os.path.join(self.work_dir.name, 'records.csv')
+        jsonl_path = os.path.join(self.work_dir.name, 'records.jsonl')
+        with open(csv_path, 'w') as handle:
+            handle.write('data_content,data_type\n"a, b",text\n1.0,number\ntrue,boolean\n')
+        with open(jsonl_path, 'w') as handle:
+            handle.write('{"data_content": "a, b", "data_type": "text"}\n\n')
+            handle.write('{"data_content": "1.0", "data_type": "number"}\n{"data_content": true, "data_type": "boolean"}\n')
+        
+        expected = [("a, b", "text"), ("1.0", "number"), ("true", "boolean")]
+        for path in (csv_path, jsonl_path):
+            chunks = list(iter_record_chunks(path, chunk_size=2))
+            self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+            self.assertEqual([record for chunk in chunks for record in chunk], expected)
+            self.assertEqual([record for chunk in iter_record_chunks(path, offset=2) for record in chunk], expected[2:])
+        with self.assertRaisesRegex(ValueError, "'body' column"):
+            list(iter_record_chunks(csv_path, content_field='body'))
+    
+    def test_ingest_summary_and_resume(self):
+        """Test totals and that a resumed run skips committed records"""
+        path = os.path.join(self.work_dir.name, 'records.jsonl')
+        checkpoint_path = os.path.join(self.work_dir.name, 'records.checkpoint')
+        records = [("first record", "text"), ("first record", "text"), ("", "text"), ("second record", "mixed")]
+        with open(path, 'w') as handle:
+            for content, data_type in records:
+                handle.write(json.dumps({"data_content": content, "data_type": data_type}) + "\n")
+        
+        save_checkpoint(checkpoint_path, path, 1)
+        pipeline = self._pipeline()
+        stats = pipeline.run(path, checkpoint_path=checkpoint_path, resume=True, show_progress=False)
+        self.assertEqual(stats, {'records': 3, 'rejected': 1, 'redundant': 0, 'inserted': 2, 'failed': 0})
+        self.assertIn("3 records", pipeline.summary())
+        
+        stats = self._pipeline().run(path, checkpoint_path=checkpoint_path, show_progress=False)
+        self.assertEqual(stats['redundant'], 3)
+        with open(checkpoint_path) as handle:
+            self.assertEqual(json.load(handle)['offset'], 4)
+    
+    def test_failed_chunk_does_not_advance_checkpoint(self):
+        """Test that a run stops before a chunk that was not stored, so a resume retries it"""
+        path = os.path.join(self.work_dir.name, 'records.jsonl')
+        checkpoint_path = os.path.join(self.work_dir.name, 'records.checkpoint')
+        with open(path, 'w') as handle:
+            for n in range(5):
+                handle.write(json.dumps({"data_content": f"{n} record " * 3, "data_type": "text"}) + "\n")
+        original_batch_size = Config.BATCH_SIZE
+        Config.BATCH_SIZE = 2
+        pipeline = self._pipeline()
+        process_batch = pipeline.redundancy_detector.process_batch
+        calls = []
+        
+        def failing_second_chunk(records):
+            calls.append(records)
+            return [(False, None)] * len(records) if len(calls) == 2 else process_batch(records)
+        
+        pipeline.redundancy_detector.process_batch = failing_second_chunk
+        try:
+            stats = pipeline.run(path, checkpoint_path=checkpoint_path, show_progress=False)
+            self.assertEqual((stats['inserted'], stats['failed'], len(calls)), (2, 2, 2))
+            with open(checkpoint_path) as handle:
+                self.assertEqual(json.load(handle)['offset'], 2)
+            
+            stats = self._pipeline().run(path, checkpoint_path=checkpoint_path, resume=True, show_progress=False)
+            self.assertEqual((stats['records'], stats['inserted'], stats['failed']), (3, 3, 0))
+        finally:
+            Config.BATCH_SIZE = original_batch_size
+
+class TestMinHash(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up an isolated database file"""
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        rng = random.Random(3)
+        words = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "theta", "kappa", "lambda", "sigma"]
+        self.article = " ".join(rng.choice(words) for _ in range(60))
+        self.edited = self.article.replace("kappa", "kapa", 1) + " omega"
+        self.other = " ".join(rng.choice(words) for _ in range(60))
+    
+    def tearDown(self):
+        """Remove the database file"""
+        os.remove(self.db_path)
+    
+    def test_signature_similarity(self):
+        """Test that estimated similarity tracks shingle overlap"""
+        minhasher = MinHasher(num_perm=128, bands=32, shingle_size=5)
+        signature = minhasher.signature(self.article)
+        self.assertEqual(len(minhasher.band_keys(signature)), 32)
+        stored = minhasher.to_bytes(signature)
+        self.assertTrue((minhasher.from_bytes(stored) == signature).all())
+        scores = minhasher.similarities(signature, [minhasher.signature(self.edited), minhasher.signature("x" * 200)])
+        self.assertGreater(scores[0], 0.8)
+        self.assertLess(scores[1], 0.1)
+    
+    def test_near_duplicate_long_text(self):
+        """Test sequential and batch detection of long near-duplicates and their stored scores"""
+        sequential = RedundancyDetector(DatabaseManager(f'sqlite:///{self.db_path}'), similarity_engine='minhash')
+        first = sequential.process_data(self.article, "text")
+        self.assertIsNotNone(first.minhash_signature)
+        is_redundant, entry = sequential.classify_data(self.edited, "text")
+        self.assertTrue(is_redundant)
+        self.assertEqual(entry.id, first.id)
+        # Numbers are never compared by MinHash
+        self.assertFalse(sequential.uses_minhash("1" * 200, "number"))
+        
+        fd, batch_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        try:
+            batch = RedundancyDetector(DatabaseManager(f'sqlite:///{batch_path}'), similarity_engine='minhash')
+            results = batch.process_batch([(self.article, "text"), (self.edited, "text"), (self.other, "mixed")])
+            self.assertEqual([is_redundant for is_redundant, _ in results], [False, True, False])
+            self.assertEqual(results[1][1].id, results[0][1].id)
+            self.assertLess(results[2][1].similarity_score, Config.SIMILARITY_THRESHOLD)
+            self.assertEqual(len(batch.db_manager.find_minhash_buckets(batch.minhasher.band_keys(
+                batch.minhasher.signature(self.article)))), 32)
+            batch.db_manager.close()
+        finally:
+            os.remove(batch_path)
+        sequential.db_manager.close()
+    
+    def test_minhash_stays_within_type_partition(self):
+        """Test that long records only match MinHash candidates of their own type, unless untyped"""
+        db_manager = DatabaseManager(f'sqlite:///{self.db_path}')
+        try:
+            sequential = RedundancyDetector(db_manager, similarity_engine='minhash')
+            first = sequential.process_data(self.article, "mixed")
+            self.assertEqual(sequential.classify_data(self.edited, "text"), (False, None))
+            self.assertEqual(sequential.classify_data(self.edited)[1].id, first.id)
+            
+            reworded = self.article + " omega omega"
+            results = RedundancyDetector(db_manager, similarity_engine='minhash').process_batch(
+                [(self.edited, "text"), (reworded, "mixed"), (reworded + " omega", "text")])
+            self.assertEqual([is_redundant for is_redundant, _ in results], [False, True, True])
+            self.assertEqual(results[1][1].id, first.id)
+            self.assertEqual(results[2][1].id, results[0][1].id)  # The text survivor of this batch, not the mixed entry
+        finally:
+            db_manager.close()
+    
+    def test_backfill_existing_entries(self):
+        """Test that entries stored before the engine was enabled are signed and matched"""
+        db_manager = DatabaseManager(f'sqlite:///{self.db_path}')
+        first = RedundancyDetector(db_manager).process_data(self.article, "text")
+        self.assertIsNone(first.minhash_signature)
+        is_redundant, entry = RedundancyDetector(db_manager, similarity_engine='minhash').classify_data(self.edited)
+        self.assertTrue(is_redundant)
+        self.assertEqual(entry.id, first.id)
+        self.assertIn(first.id, db_manager.get_minhash_signatures([first.id]))
+        db_manager.close()
+
+class TestMetrics(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up an isolated database file"""
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.db_manager = DatabaseManager(f'sqlite:///{self.db_path}')
+    
+    def tearDown(self):
+        """Remove the database file"""
+        self.db_manager.close()
+        os.remove(self.db_path)
+    
+    def test_histogram_percentiles(self):
+        """Test that bucketed percentiles stay within one bucket of the true value"""
+        for value in (0.0005, 0.02, 1.0, 37.5):
+            self.assertLessEqual(value, bucket_upper_bound(bucket_index(value)))
+            self.assertLess(bucket_upper_bound(bucket_index(value)), max(value, 0.001) * 1.25 + 1e-12)
+        buckets = {}
+        for ms in range(1, 101):
+            buckets[bucket_index(float(ms))] = buckets.get(bucket_index(float(ms)), 0) + 1
+        self.assertAlmostEqual(histogram_percentile(buckets, 0.5), 50, delta=50 * 0.25)
+        self.assertAlmostEqual(histogram_percentile(buckets, 0.99), 99, delta=99 * 0.25)
+    
+    def test_batched_flush_and_report(self):
+        """Test that nothing is written until a flush, which writes counters and sampled logs together"""
+        detector = RedundancyDetector(self.db_manager)
+        detector.metrics = MetricsCollector(self.db_manager, flush_interval=3600, sample_rate=1.0)
+        detector.process_batch([("alpha", "text"), ("alpha", "text"), ("42", "number")])
+        detector.process_data("beta", "text")
+        session = self.db_manager.get_session()
+        self.assertEqual(session.query(SystemMetrics).count(), 0)
+        
+        detector.flush_metrics()
+        self.assertEqual(session.query(ProcessingLog).count(), 4)
+        self.assertEqual(session.query(ProcessingLog).filter_by(is_redundant=True).count(), 1)
+        session.close()
+        totals = {(name, data_type): value for name, data_type, value in self.db_manager.get_metric_totals()}
+        self.assertEqual(totals[('records', 'text')], 3)
+        self.assertEqual(totals[('redundant', 'text')], 1)
+        self.assertEqual(sum(value for (name, _), value in totals.items() if name.startswith('stage_ms:insert:')), 3)
+        # Every record is timed once per hashing stage, on both paths
+        for stage in ('hash', 'canonical_hash'):
+            self.assertEqual(sum(value for (name, _), value in totals.items() if name.startswith(f'stage_ms:{stage}:')), 4)
+        canonical_hashes = []
+        canonical_hash = detector.canonical_hash
+        detector.canonical_hash = lambda *args: canonical_hashes.append(args) or canonical_hash(*args)
+        detector.process_data("gamma", "text")
+        self.assertEqual(len(canonical_hashes), 1)
+        
+        report = build_report(self.db_manager.get_metric_totals())
+        self.assertIn("fuzzy_search", report)
+        self.assertIn("33.3%", report)
+
+class TestBenchmarkWorkload(unittest.TestCase):
+    
+    def test_generator_is_reproducible(self):
+        """Test that a seed fixes the workload and the ratios are respected"""
+        first = WorkloadGenerator(seed=5, duplicate_ratio=0.3, near_duplicate_ratio=0.0)
+        second = WorkloadGenerator(seed=5, duplicate_ratio=0.3, near_duplicate_ratio=0.0)
+        self.assertEqual(first.unique_records(100), second.unique_records(100))
+        records = first.records(2000)
+        self.assertEqual(records, second.records(2000))
+        
+        validator = DataValidator()
+        self.assertTrue(all(validator.validate_data(content, data_type)[0] for content, data_type in records))
+        seen = {content for content, _ in first.history[:100]}
+        repeats = 0
+        for content, _ in records:
+            repeats += content in seen
+            seen.add(content)
+        self.assertAlmostEqual(repeats / len(records), 0.3, delta=0.05)
+    
+    def test_compare_flags_regressions(self):
+        """Test that only throughput drops beyond the tolerance are reported"""
+        baseline = {'results': [{'mode': 'batch', 'existing_entries': 10, 'records_per_sec': 100.0}]}
+        self.assertEqual(compare({'results': [{'mode': 'batch', 'existing_entries': 10, 'records_per_sec': 95.0}]}, baseline), [])
+        self.assertEqual(len(compare({'results': [{'mode': 'batch', 'existing_entries': 10, 'records_per_sec': 80.0}]}, baseline)), 1)
+
+class TestSessionLifecycle(unittest.TestCase):
+    
+    def test_in_memory_database_is_shared(self):
+        """Test that SQLite :memory: works with the pool settings and keeps data across sessions and managers"""
+        db_manager = DatabaseManager('sqlite:///:memory:')
+        try:
+            entry = RedundancyDetector(db_manager).process_data("kept in memory", "text")
+            self.assertEqual(db_manager.get_data_entry_by_id(entry.id).data_content, "kept in memory")
+            other = DatabaseManager('sqlite:///:memory:')
+            self.assertIs(other.engine, db_manager.engine)
+            other.close()
+            other.close()  # Closing twice releases the engine once
+            # The engine stays open while another manager uses it
+            self.assertEqual(db_manager.get_data_entry_by_id(entry.id).data_content, "kept in memory")
+        finally:
+            db_manager.close()
+        reopened = DatabaseManager('sqlite:///:memory:')
+        self.assertIsNone(reopened.get_data_entry_by_id(entry.id))
+        reopened.close()
+    
+    def test_in_memory_cache_warms_without_losing_a_unit(self):
+        """Test that warming the hash cache of a :memory: database never rolls back a batch in progress"""
+        db_manager = DatabaseManager('sqlite:///:memory:')
+        try:
+            with db_manager.session_scope() as unit:
+                new_entries = db_manager.add_data_entries([{'data_content': f"in memory {n}", 'data_type': "text",
+                                                            'content_hash': f"{n:032x}"} for n in range(50)])
+                self.assertIsNotNone(db_manager.hash_cache)  # Warmed while the inserts are uncommitted
+            self.assertFalse(unit.failed)
+            self.assertIsNone(db_manager._warm_thread)
+            self.assertEqual(len(db_manager.get_all_data_entries()), 50)
+            self.assertEqual(db_manager.find_entry_key(f"{0:032x}"), (new_entries[0].id, "text"))
+        finally:
+            db_manager.close()
+    
+    def test_batch_uses_one_connection(self):
+        """Test that a batch checks out a single pooled connection and a failed unit rolls back"""
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        db_manager = DatabaseManager.shared(f'sqlite:///{db_path}')
+        try:
+            self.assertIs(DatabaseManager.shared(f'sqlite:///{db_path}'), db_manager)
+            detector = RedundancyDetector(db_manager)
+            detector.metrics = None
+            detector.find_similar_entry_id("")  # Build the fuzzy index up front
+            db_manager.hash_cache  # Finish the hash cache warm-up, which reads on its own connection
+            checkouts = []
+            event.listen(db_manager.engine, 'checkout', lambda *args: checkouts.append(1))
+            results = detector.process_batch([(letter * 12, "text") for letter in "abcdefghij"])
+            self.assertEqual(len(checkouts), 1)
+            self.assertEqual([is_redundant for is_redundant, _ in results], [False] * 10)
+            
+            with db_manager.session_scope() as unit:
+                db_manager.add_data_entries([{'data_content': "rolled back", 'data_type': "text", 'content_hash': "0" * 32}])
+                unit.rollback()
+            self.assertTrue(unit.failed)
+            self.assertIsNone(db_manager.find_entry_key("0" * 32))
+            self.assertEqual([entry_id for entry_id, _ in db_manager.iter_entry_contents(batch_size=3)],
+                             [entry.id for _, entry in results])
+        finally:
+            db_manager.close()
+            os.remove(db_path)
+    
+    def test_warm_start_skips_schema_and_cache_reads(self):
+        """Test that reopening a current database runs one schema query and warms the hash cache lazily"""
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        db_manager = DatabaseManager(f'sqlite:///{db_path}')
+        entry = db_manager.add_data_entry("stored once", "text", "1" * 32)
+        db_manager.close()
+        statements = []
+        record = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(Engine, 'before_cursor_execute', record)
+        try:
+            restarted = DatabaseManager(f'sqlite:///{db_path}')
+        finally:
+            event.remove(Engine, 'before_cursor_execute', record)
+        try:
+            self.assertEqual(len(statements), 1)
+            self.assertTrue(restarted.schema_is_current())
+            self.assertIsNone(restarted._hash_cache)
+            self.assertEqual(restarted.find_entry_key("1" * 32), (entry.id, "text"))
+            self.assertEqual(restarted.hash_cache.lookup("1" * 32), (entry.id, "text"))
+        finally:
+            restarted.close()
+            os.remove(db_path)
+    
+    def test_wal_writer_group_commit(self):
+        """Test WAL pragmas and that concurrent inserts through the writer thread share commits"""
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        original_writer = Config.SQLITE_WRITER_THREAD
+        Config.SQLITE_WRITER_THREAD = True
+        db_manager = DatabaseManager(f'sqlite:///{db_path}')
+        try:
+            with db_manager.engine.connect() as connection:
+                self.assertEqual(connection.execute(text("PRAGMA journal_mode")).scalar(), "wal")
+            db_manager.writer.group_commit_seconds = 0.05
+            futures = [db_manager.writer.submit([{'data_content': f"queued {i}", 'data_type': "text", 'content_hash': f"{i:032x}"}])
+                       for i in range(20)]
+            entries = [future.result()[0] for future in futures]
+            self.assertEqual([entry.data_content for entry in entries], [f"queued {i}" for i in range(20)])
+            self.assertLess(db_manager.writer.commits, 20)
+            
+            # A conflicting request fails alone; the rest of its group still commits
+            duplicate = db_manager.writer.submit([{'data_content': "dup", 'data_type': "text", 'content_hash': f"{0:032x}"}])
+            fresh = db_manager.writer.submit([{'data_content': "fresh", 'data_type': "text", 'content_hash': "f" * 32}])
+            self.assertEqual(fresh.result()[0].data_content, "fresh")
+            self.assertIsNotNone(duplicate.exception())
+            self.assertEqual(db_manager.add_data_entry("single", "text", "e" * 32).data_content, "single")
+            self.assertEqual(db_manager.find_entry_key("e" * 32)[1], "text")
+        finally:
+            db_manager.close()
+            Config.SQLITE_WRITER_THREAD = original_writer
+            os.remove(db_path)
+
+class TestAsyncService(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up an isolated database file"""
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.db_manager = DatabaseManager(f'sqlite:///{self.db_path}')
+    
+    def tearDown(self):
+        """Remove the database file"""
+        self.db_manager.close()
+        os.remove(self.db_path)
+    
+    def test_concurrent_producers_over_localhost(self):
+        """Test micro-batched ingestion from several connections and the stats request"""
+        async def scenario():
+            service = AsyncIngestService(RedundancyDetector(self.db_manager), queue_size=8, batch_delay_ms=20)
+            server = await service.serve('127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            producers = [[{'data_content': f"{letter * 10} {n}", 'data_type': "text"} for letter in "pqrstuvwxy"]
+                         for n in ("one", "two", "three")]
+            producers.append([{'data_content': "pppppppppp one", 'data_type': "text"},
+                              {'data_content': "", 'data_type': "text"}, {'data_content': "abc", 'data_type': "number"}])
+            responses = await asyncio.gather(*(send_records('127.0.0.1', port, requests) for requests in producers))
+            stats = (await send_records('127.0.0.1', port, [{'op': 'stats'}]))[0]['stats']
+            server.close()
+            await server.wait_closed()
+            await service.stop()
+            return responses, stats
+        
+        responses, stats = asyncio.run(scenario())
+        statuses = [response['status'] for producer in responses[:3] for response in producer]
+        self.assertEqual(statuses.count('inserted'), 30)
+        self.assertEqual(responses[3][0]['status'], 'redundant')
+        self.assertEqual([response['status'] for response in responses[3][1:]], ['rejected', 'rejected'])
+        self.assertLess(stats['batches'], 31)
+        self.assertLessEqual(stats['max_queue_depth'], 8)
+        self.assertEqual(stats['counts']['rejected'], 2)
+    
+    def test_identical_records_in_flight_share_one_insert(self):
+        """Test that duplicates submitted together are coalesced before reaching the database"""
+        detector = RedundancyDetector(self.db_manager)
+        hashed = []
+        hash_data = detector.hash_data
+        detector.hash_data = lambda data_content: hashed.append(data_content) or hash_data(data_content)
+        
+        async def scenario():
+            service = AsyncIngestService(detector, batch_delay_ms=20)
+            await service.start()
+            results = await asyncio.gather(*(service.submit("same record", "text") for _ in range(5)))
+            await service.stop()
+            return results, service.batched_records
+        
+        results, batched_records = asyncio.run(scenario())
+        self.assertEqual(sorted(result['status'] for result in results), ['inserted'] + ['redundant'] * 4)
+        self.assertEqual(len({result['entry_id'] for result in results}), 1)
+        self.assertEqual(batched_records, 1)
+        self.assertEqual(len(hashed), 5)  # Once per submit; the batch reuses the queued hash
+    
+    def test_failed_batch_keeps_batcher_running(self):
+        """Test that an error while reading a batch's outcomes fails that batch and later submits still complete"""
+        class ExpiredEntry:
+            @property
+            def id(self):
+                raise SQLAlchemyError("Instance is not bound to a Session")
+        
+        detector = RedundancyDetector(self.db_manager)
+        process_batch = detector.process_batch
+        
+        async def scenario():
+            service = AsyncIngestService(detector, batch_delay_ms=20)
+            await service.start()
+            detector.process_batch = lambda records, content_hashes=None: [(False, ExpiredEntry())] * len(records)
+            failed = await asyncio.wait_for(asyncio.gather(*(service.submit(f"locked {n}", "text") for n in range(3))), 5)
+            detector.process_batch = process_batch
+            stored = await asyncio.wait_for(service.submit("after the failure", "text"), 5)
+            await asyncio.wait_for(service.stop(), 5)
+            return failed, stored
+        
+        failed, stored = asyncio.run(scenario())
+        self.assertEqual([result['status'] for result in failed], ['failed'] * 3)
+        self.assertEqual(stored['status'], 'inserted')
+    
+    def test_cancelled_leader_does_not_cancel_followers(self):
+        """Test that identical records from other clients still get an outcome when the first submitter goes away"""
+        async def scenario():
+            service = AsyncIngestService(RedundancyDetector(self.db_manager), batch_delay_ms=20)
+            await service.start()
+            leader = asyncio.create_task(service.submit("shared record", "text"))
+            await asyncio.sleep(0)
+            followers = [asyncio.create_task(service.submit("shared record", "text")) for _ in range(2)]
+            await asyncio.sleep(0)
+            leader.cancel()
+            results = await asyncio.wait_for(asyncio.gather(*followers), 5)
+            await service.stop()
+            return leader.cancelled(), results
+        
+        leader_cancelled, results = asyncio.run(scenario())
+        self.assertTrue(leader_cancelled)
+        self.assertEqual([result['status'] for result in results], ['redundant', 'redundant'])
+        self.assertIsNotNone(self.db_manager.find_entry_key(RedundancyDetector(self.db_manager).hash_data("shared record")))
+    
+    def test_failed_request_gets_a_response(self):
+        """Test that a request task that raises or is cancelled is answered as failed and the connection goes on"""
+        class RecordingWriter:
+            def __init__(self):
+                self.lines = []
+            
+            def write(self, data):
+                self.lines.append(json.loads(data))
+            
+            async def drain(self):
+                pass
+            
+            def close(self):
+                pass
+            
+            async def wait_closed(self):
+                pass
+        
+        async def scenario():
+            service = AsyncIngestService(RedundancyDetector(self.db_manager))
+            handle_request = service._handle_request
+            
+            async def flaky(line):
+                if b"raises" in line:
+                    raise RuntimeError("request failed")
+                if b"cancelled" in line:
+                    raise asyncio.CancelledError()
+                return await handle_request(line)
+            
+            service._handle_request = flaky
+            reader = asyncio.StreamReader()
+            reader.feed_data(b'"raises"\n"cancelled"\n{"op": "stats"}\n')
+            reader.feed_eof()
+            writer = RecordingWriter()
+            await service.handle_connection(reader, writer)
+            return writer.lines
+        
+        lines = asyncio.run(scenario())
+        self.assertEqual([line['status'] for line in lines], ['failed', 'failed', 'ok'])
+    
+    def test_client_disconnect_cancels_its_requests(self):
+        """Test that a failed response write closes the connection instead of raising"""
+        class ClosedWriter:
+            def __init__(self):
+                self.drains = 0
+                self.closed = False
+            
+            def write(self, data):
+                pass
+            
+            async def drain(self):
+                self.drains += 1
+                raise ConnectionResetError("Connection lost")
+            
+            def close(self):
+                self.closed = True
+            
+            async def wait_closed(self):
+                pass
+        
+        async def scenario():
+            service = AsyncIngestService(RedundancyDetector(self.db_manager), batch_delay_ms=20)
+            await service.start()
+            reader = asyncio.StreamReader()
+            for n in range(5):
+                reader.feed_data(json.dumps({'data_content': f"gone client {n}", 'data_type': "text"}).encode('utf-8') + b"\n")
+            reader.feed_eof()
+            writer = ClosedWriter()
+            await service.handle_connection(reader, writer)
+            await service.stop()
+            return writer
+        
+        writer = asyncio.run(scenario())
+        self.assertEqual(writer.drains, 1)
+        self.assertTrue(writer.closed)
+
+class TestCanonicalMatching(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up two isolated database files"""
+        self.db_paths = []
+        self.db_managers = []
+        for _ in range(2):
+            fd, db_path = tempfile.mkstemp(suffix='.db')
+            os.close(fd)
+            self.db_paths.append(db_path)
+            self.db_managers.append(DatabaseManager(f'sqlite:///{db_path}'))
+        self.original_batch_size = Config.BATCH_SIZE
+        Config.BATCH_SIZE = 4
+    
+    def tearDown(self):
+        """Remove the database files"""
+        Config.BATCH_SIZE = self.original_batch_size
+        for db_manager, db_path in zip(self.db_managers, self.db_paths):
+            db_manager.close()
+            os.remove(db_path)
+    
+    def test_canonical_forms(self):
+        """Test that equivalent spellings share a canonical form and distinct values do not"""
+        self.assertEqual(canonical_form("1.0", "number"), canonical_form("+1e0", "Number"))
+        self.assertEqual(canonical_form("100", "number"), canonical_form("1E2", "number"))
+        self.assertNotEqual(canonical_form("12345678901234567890123456789012345", "number"),
+                           canonical_form("12345678901234567890123456789012346", "number"))
+        self.assertEqual(canonical_form("TRUE", "boolean"), canonical_form("yes", "boolean"))
+        self.assertNotEqual(canonical_form("1", "boolean"), canonical_form("1", "number"))
+        self.assertEqual(canonical_form("2023-01-31", "date"), canonical_form("01/31/2023", "datetime"))
+        self.assertEqual(canonical_form("31-01-2023", "date"), "date:2023-01-31")
+        self.assertEqual(canonical_form("  Hello\tWORLD ", "text"), canonical_form("hello world", "mixed"))
+    
+    def test_canonical_duplicates_match_in_batches_and_sequentially(self):
+        """Test canonical matches against stored entries and inside a chunk, sequentially and batched"""
+        records = [("2023-01-01", "date"), ("1.50", "number"), ("TRUE", "boolean"), ("01/01/2023", "date"),
+                   ("1.5", "number"), ("yes", "boolean"), ("0", "boolean"), ("01-01-2023", "datetime"),
+                   ("Quarterly   Report", "text"), ("quarterly report", "mixed"), ("1.5e0", "number"), ("no", "boolean")]
+        sequential = RedundancyDetector(self.db_managers[0])
+        expected = [(entry.id, entry.data_content) for entry in
+                    (sequential.process_data(content, data_type) for content, data_type in records)]
+        self.assertEqual([content for _, content in expected],
+                         ["2023-01-01", "1.50", "TRUE", "2023-01-01", "1.50", "TRUE", "0", "2023-01-01",
+                          "Quarterly   Report", "Quarterly   Report", "1.50", "0"])
+        
+        results = RedundancyDetector(self.db_managers[1]).process_batch(records)
+        self.assertEqual([(entry.id, entry.data_content) for _, entry in results], expected)
+        self.assertEqual([is_redundant for is_redundant, _ in results], [False, False, False, True, True, True,
+                                                                         False, True, False, True, True, True])
+    
+    def test_backfill_of_entries_without_canonical_hash(self):
+        """Test that a new detector hashes the canonical form of older entries and matches them"""
+        db_manager = self.db_managers[0]
+        detector = RedundancyDetector(db_manager)
+        db_manager.add_data_entry("42.0", "number", detector.hash_data("42.0"))
+        self.assertEqual(db_manager.get_uncanonicalized_entries()[0].data_content, "42.0")
+        
+        detector = RedundancyDetector(db_manager)
+        self.assertEqual(db_manager.get_uncanonicalized_entries(), [])
+        is_redundant, entry = detector.classify_data("42", "number")
+        self.assertTrue(is_redundant)
+        self.assertEqual(entry.data_content, "42.0")
+
+class TestCompaction(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up an isolated database holding duplicates stored without detection"""
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.db_manager = DatabaseManager(f'sqlite:///{self.db_path}')
+        self.detector = RedundancyDetector(self.db_manager, similarity_engine='minhash')
+        rng = random.Random(5)
+        words = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "theta", "kappa", "lambda", "sigma"]
+        article = " ".join(rng.choice(words) for _ in range(60))
+        self.records = [("apple pie", "text"), ("1.50", "number"), ("apple pies", "text"), ("1.5", "number"),
+                        (article, "text"), ("Apple Pie", "text"), ("banana", "text"), ("appl pie", "text"),
+                        (article.replace("kappa", "kapa", 1) + " omega", "text"), ("bananas!!", "text")]
+        rows = []
+        for content, data_type in self.records:
+            row = {'data_content': content, 'data_type': data_type, 'content_hash': self.detector.hash_data(content),
+                   'canonical_hash': self.detector.canonical_hash(content, data_type)}
+            if self.detector.uses_minhash(content, data_type):
+                signature = self.detector.minhasher.signature(content)
+                row['minhash_signature'] = self.detector.minhasher.to_bytes(signature)
+                row['bucket_keys'] = self.detector.minhasher.band_keys(signature)
+            rows.append(row)
+        self.entries = self.db_manager.add_data_entries(rows)
+    
+    def tearDown(self):
+        """Remove the database file"""
+        self.db_manager.close()
+        os.remove(self.db_path)
+    
+    def redundant_ids(self):
+        entries = self.db_manager.get_data_entries_by_ids([entry.id for entry in self.entries])
+        return sorted(entry.id for entry in entries.values() if entry.is_redundant)
+    
+    def test_minhash_pass_stays_within_type_partition(self):
+        """Test that long near-duplicates of different types sharing a bucket are not marked"""
+        ids = [entry.id for entry in self.entries]
+        with self.db_manager.engine.begin() as connection:
+            connection.execute(text("UPDATE data_entries SET data_type = 'mixed' WHERE id = :id"), {'id': ids[8]})
+        stats = Compactor(self.detector, batch_size=2).run()
+        self.assertEqual(stats['minhash'], 0)
+        self.assertNotIn(ids[8], self.redundant_ids())
+    
+    def test_marks_blocked_duplicates(self):
+        """Test that each pass marks all but one member of a cluster and a rerun finds nothing new"""
+        ids = [entry.id for entry in self.entries]
+        stats = Compactor(self.detector, batch_size=2).run()
+        self.assertEqual((stats['canonical'], stats['edit_distance'], stats['minhash']), (2, 2, 1))
+        # 'appl pie' is the shortest of its cluster and survives; 'bananas!!' is 3 edits from 'banana'
+        self.assertEqual(self.redundant_ids(), [ids[0], ids[2], ids[3], ids[5], ids[8]])
+        entries = self.db_manager.get_data_entries_by_ids(ids)
+        self.assertAlmostEqual(entries[ids[0]].similarity_score, 1 - 1 / 9)
+        self.assertAlmostEqual(entries[ids[2]].similarity_score, 0.8)
+        self.assertGreaterEqual(entries[ids[8]].similarity_score, Config.SIMILARITY_THRESHOLD)
+        self.assertEqual(self.db_manager.get_schema_info(CHECKPOINT_KEY), '')
+        
+        stats = Compactor(self.detector, batch_size=2).run()
+        self.assertEqual((stats['canonical'], stats['edit_distance'], stats['minhash']), (0, 0, 0))
+    
+    def test_resumes_from_checkpoint(self):
+        """Test that a run resumed mid edit-distance pass gives the same marks as an uninterrupted one"""
+        ids = [entry.id for entry in self.entries]
+        compactor = Compactor(self.detector, batch_size=2)
+        compactor._canonical_pass(None)
+        # Pretend the run stopped after every entry up to length 9 was handled, leaving 'apple pie' unmarked
+        compactor.save_checkpoint('edit_distance', 9)
+        stats = Compactor(self.detector, batch_size=2).run()
+        self.assertEqual((stats['canonical'], stats['edit_distance']), (0, 1))
+        # 'apple pies' (length 10) is still matched against the reloaded survivors of lengths 8 and 9
+        self.assertEqual(self.redundant_ids(), [ids[2], ids[3], ids[5], ids[8]])
+    
+    def test_minhash_survivor_kept_across_buckets(self):
+        """Test that an entry kept in one bucket is not marked by a later bucket of a chain"""
+        minhasher = self.detector.minhasher
+        base = np.arange(minhasher.num_perm, dtype=np.uint32)
+        first, second = -(1 << 62), -(1 << 62) + 1  # Processed before every real bucket key, on separate pages
+        rows = []
+        for number, (changed, bucket_keys) in enumerate([(slice(0, 10), [second]), (slice(0, 0), [first, second]),
+                                                          (slice(-10, None), [first])]):
+            signature = base.copy()
+            signature[changed] += 1000
+            rows.append({'data_content': f"chained article {number} " * 10, 'data_type': "text",
+                         'content_hash': self.detector.hash_data(f"chained article {number} " * 10),
+                         'minhash_signature': minhasher.to_bytes(signature), 'bucket_keys': bucket_keys})
+        a, b, c = [entry.id for entry in self.db_manager.add_data_entries(rows)]
+        Compactor(self.detector, batch_size=1)._minhash_pass(None)
+        entries = self.db_manager.get_data_entries_by_ids([a, b, c])
+        # c is marked against b in the first bucket, so b survives the second and a is marked against it
+        self.assertEqual([entries[entry_id].is_redundant for entry_id in (a, b, c)], [True, False, True])
+
+class TestTypePartitioning(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up an isolated database file"""
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.db_manager = DatabaseManager(f'sqlite:///{self.db_path}')
+        self.original_partitioning = Config.TYPE_PARTITIONING
+        self.stored = [("apple pie", "text"), ("12345", "number"), ("order 17", "mixed"), ("2023-01-05", "date")]
+        self.queries = [("apple pies", "text"), ("12346", "number"), ("apple pies", "mixed"), ("order 18", "mixed"),
+                        ("2023-01-06", "date"), ("order 18", None)]
+    
+    def tearDown(self):
+        """Remove the database file"""
+        Config.TYPE_PARTITIONING = self.original_partitioning
+        self.db_manager.close()
+        os.remove(self.db_path)
+    
+    def test_fuzzy_matches_stay_within_type(self):
+        """Test that only text/mixed records are fuzzy-matched, against their own type's entries"""
+        Config.TYPE_PARTITIONING = True
+        detector = RedundancyDetector(self.db_manager)
+        for content, data_type in self.stored:
+            detector.process_data(content, data_type)
+        outcomes = [detector.classify_data(content, data_type)[0] for content, data_type in self.queries]
+        self.assertEqual(outcomes, [True, False, False, True, False, True])
+        self.assertEqual(set(detector._fuzzy_indexes), {'text', 'mixed', None})
+        self.assertEqual(len(detector._fuzzy_indexes['text']), 1)
+        
+        scanned = RedundancyDetector(self.db_manager, fuzzy_mode='scan')
+        self.assertEqual([scanned.classify_data(content, data_type)[0] for content, data_type in self.queries], outcomes)
+        batch = RedundancyDetector(self.db_manager).process_batch(self.queries[:5])
+        self.assertEqual([is_redundant for is_redundant, _ in batch], outcomes[:5])
+    
+    def test_unpartitioned_matches_across_types(self):
+        """Test that turning partitioning off compares every record with every entry"""
+        Config.TYPE_PARTITIONING = False
+        detector = RedundancyDetector(self.db_manager)
+        for content, data_type in self.stored:
+            detector.process_data(content, data_type)
+        outcomes = [detector.classify_data(content, data_type)[0] for content, data_type in self.queries]
+        self.assertEqual(outcomes, [True, True, True, True, True, True])
+
+class TestContentBlobs(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up an isolated database file"""
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.db_manager = DatabaseManager(f'sqlite:///{self.db_path}')
+    
+    def tearDown(self):
+        """Remove the database file"""
+        self.db_manager.close()
+        os.remove(self.db_path)
+    
+    def log_row(self, content):
+        return {'operation_type': 'insert', 'data_content': content, 'data_type': 'text',
+                'content_hash': Fingerprinter().hexdigest(content), 'is_redundant': False}
+    
+    def test_logged_payloads_stored_once(self):
+        """Test that repeated long payloads share one compressed blob and read back lazily"""
+        long_content = "the same long payload " * 40
+        rows = [self.log_row(long_content) for _ in range(3)] + [self.log_row("short")]
+        self.assertTrue(self.db_manager.write_metrics([], rows))
+        self.assertTrue(self.db_manager.write_metrics([], [self.log_row(long_content)]))
+        self.assertEqual(rows[0]['data_content'], long_content)  # Left intact for a retried flush
+        
+        blobs, size, stored = self.db_manager.get_blob_totals()
+        self.assertEqual((blobs, size), (1, len(long_content)))
+        self.assertLess(stored, size)
+        logs = self.db_manager.get_processing_logs()
+        self.assertEqual([log.data_content for log in logs], [None, None, None, "short", None])
+        self.assertEqual(list(self.db_manager.get_log_contents(logs).values()), [long_content] * 3 + ["short", long_content])
+        
+        # Rows written inline, as without BLOB_STORE, keep reading back as they are
+        self.db_manager.blob_codec = None
+        self.db_manager.log_processing('insert', long_content, 'text', rows[0]['content_hash'], 0.0, False, False)
+        inline = self.db_manager.get_processing_logs(after_id=logs[-1].id)
+        self.assertEqual(inline[0].data_content, long_content)
+        self.assertEqual(self.db_manager.get_log_contents(inline), {inline[0].id: long_content})
+        self.assertEqual(decode_payload(*BlobCodec('zlib', min_bytes=0).encode("x" * 100)[:2]), "x" * 100)
+    
+    def test_entry_payloads_read_through_data_entries(self):
+        """Test that payloads of stored entries get no blob and resolve through the entry's hash"""
+        entry_content = "a stored entry payload " * 10
+        row = self.log_row(entry_content)
+        self.db_manager.add_data_entry(entry_content, 'text', row['content_hash'])
+        self.assertTrue(self.db_manager.write_metrics([], [row]))
+        self.assertEqual(self.db_manager.get_blob_totals()[0], 0)
+        logs = self.db_manager.get_processing_logs()
+        self.assertIsNone(logs[0].data_content)
+        self.assertEqual(self.db_manager.get_log_contents(logs), {logs[0].id: entry_content})
+    
+    def test_not_null_log_table_upgraded(self):
+        """Test that a processing_logs table with NOT NULL data_content is rebuilt and its '' markers cleared"""
+        long_content = "an old blob-stored payload " * 10
+        row = self.log_row(long_content)
+        self.assertTrue(self.db_manager.write_metrics([], [row]))
+        self.db_manager.close()
+        engine = create_engine(f'sqlite:///{self.db_path}')
+        with engine.begin() as connection:
+            ddl = connection.execute(text("SELECT sql FROM sqlite_master WHERE name = 'processing_logs'")).scalar()
+            connection.execute(text("DROP TABLE processing_logs"))
+            connection.execute(text(ddl.replace("data_content TEXT", "data_content TEXT NOT NULL")))
+            connection.execute(text(
+                "INSERT INTO processing_logs (operation_type, data_content, data_type, content_hash, is_redundant) "
+                "VALUES ('insert', '', 'text', :content_hash, 0)"), {'content_hash': row['content_hash']})
+        engine.dispose()
+        
+        self.db_manager = DatabaseManager(f'sqlite:///{self.db_path}')
+        self.db_manager.upgrade_schema()
+        logs = self.db_manager.get_processing_logs()
+        self.assertIsNone(logs[0].data_content)
+        self.assertEqual(self.db_manager.get_log_contents(logs), {logs[0].id: long_content})
+        self.assertTrue(self.db_manager.write_metrics([], [self.log_row(long_content)]))
+
 if __name__ == '__main__':
     unittest.main()